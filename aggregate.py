@@ -0,0 +1,200 @@
+import statistics
+
+import numpy as np
+
+from montecarlo import replica_rewards
+
+
+class RunningMoments:
+    ''' Running mean and variance of curves of a fixed length (Welford), two
+    running moments can be merged (Chan et al.).
+    '''
+    def __init__(self, length):
+        '''Args:
+            - length (int): the length of the curves
+        '''
+        self.count = 0
+        self.mean = np.zeros(length)
+        self.m2 = np.zeros(length)
+
+    def add(self, curve):
+        '''Args:
+            - curve (ndarray): (length,) a new observation
+        '''
+        self.count += 1
+        delta = curve - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (curve - self.mean)
+
+    def add_batch(self, curves):
+        '''Args:
+            - curves (ndarray): (n, length) n new observations
+        '''
+        batch = RunningMoments(curves.shape[1])
+        batch.count = curves.shape[0]
+        batch.mean = curves.mean(axis=0)
+        batch.m2 = ((curves - batch.mean) ** 2).sum(axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        '''Args:
+            - other (RunningMoments): moments of other observations
+        '''
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + \
+            delta ** 2 * self.count * other.count / count
+        self.count = count
+
+    def variance(self):
+        '''Output:
+            - ndarray: the unbiased variance of the observations
+        '''
+        return self.m2 / max(self.count - 1, 1)
+
+
+class CurveReservoir:
+    ''' Uniform sample of at most *size* curves among all the observed ones,
+    used as a quantile sketch in O(size * length) memory.
+    '''
+    def __init__(self, length, size=100, seed=None):
+        '''Args:
+            - length (int): the length of the curves
+            - size (int): the maximal number of curves kept
+            - seed (int): seed of the sampling
+        '''
+        self.size = size
+        self.count = 0
+        self.curves = np.zeros((0, length))
+        self.rng = np.random.RandomState(seed)
+
+    def add(self, curve):
+        '''Args:
+            - curve (ndarray): (length,) a new observation
+        '''
+        self.count += 1
+        if self.curves.shape[0] < self.size:
+            self.curves = np.vstack((self.curves, curve))
+        else:
+            slot = self.rng.randint(self.count)
+            if slot < self.size:
+                self.curves[slot] = curve
+
+    def merge(self, other):
+        '''Args:
+            - other (CurveReservoir): sample of other observations
+        '''
+        count = self.count + other.count
+        n_kept = min(self.size, self.curves.shape[0] + other.curves.shape[0])
+        # each kept curve comes from a side with a probability proportional
+        # to the number of observations it represents
+        from_self = self.rng.hypergeometric(self.count, other.count, n_kept) \
+            if n_kept else 0
+        from_self = min(max(from_self, n_kept - other.curves.shape[0]),
+                        self.curves.shape[0])
+        keep_self = self.rng.permutation(self.curves.shape[0])[:from_self]
+        keep_other = self.rng.permutation(
+            other.curves.shape[0])[:n_kept - from_self]
+        self.curves = np.vstack((self.curves[keep_self],
+                                 other.curves[keep_other]))
+        self.count = count
+
+    def quantiles(self, q):
+        '''Args:
+            - q (float or list[float]): the quantiles to estimate in [0, 1]
+        Output:
+            - ndarray: the estimated quantiles at every point of the curves
+        '''
+        return np.quantile(self.curves, q, axis=0)
+
+
+class RegretAggregator:
+    ''' Streaming aggregation of the replicas of a routine: running mean and
+    variance of the per-step reward and of the cumulative regret, in O(T)
+    memory whatever the number of replicas.
+    '''
+    def __init__(self, best_arms_mean, t_horizon, quantile_sketch=0,
+                 seed=None):
+        '''Args:
+            - best_arms_mean (list or vector): means of the best arms
+            - t_horizon (int): time steps
+            - quantile_sketch (int): number of regret curves kept to
+            estimate quantiles, no sketch if 0
+            - seed (int): seed of the quantile sketch sampling
+        '''
+        self.best_reward = np.sum(best_arms_mean)
+        self.rewards = RunningMoments(t_horizon)
+        self.regret = RunningMoments(t_horizon)
+        if quantile_sketch:
+            self.sketch = CurveReservoir(t_horizon, quantile_sketch, seed)
+        else:
+            self.sketch = None
+
+    @property
+    def count(self):
+        return self.rewards.count
+
+    def add(self, output):
+        '''Args:
+            - output: the output of a routine, or the (t_horizon,) total
+            rewards of a replica
+        '''
+        rewards = replica_rewards(output)
+        regret = np.cumsum(self.best_reward - rewards)
+        self.rewards.add(rewards)
+        self.regret.add(regret)
+        if self.sketch is not None:
+            self.sketch.add(regret)
+
+    def add_batch(self, rewards):
+        '''Args:
+            - rewards (ndarray): (n_replicas, t_horizon) total rewards, or the
+            (n_replicas, t_horizon, 1) output of a batch routine
+        '''
+        rewards = rewards.reshape(rewards.shape[0], -1)
+        regret = np.cumsum(self.best_reward - rewards, axis=1)
+        self.rewards.add_batch(rewards)
+        self.regret.add_batch(regret)
+        if self.sketch is not None:
+            for curve in regret:
+                self.sketch.add(curve)
+
+    def merge(self, other):
+        '''Combines the partial aggregate of other replicas, e.g. computed by
+        another worker.
+            Args:
+                - other (RegretAggregator): the aggregate to merge
+        '''
+        self.rewards.merge(other.rewards)
+        self.regret.merge(other.regret)
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+
+    def regret_curve(self, level=0.95):
+        '''Mean cumulative regret with a normal confidence band.
+            Args:
+                - level (float): the confidence level of the band
+            Output:
+                - mean, lower, upper (ndarray): the regret and its band
+        '''
+        z = statistics.NormalDist().inv_cdf((1 + level) / 2)
+        half_width = z * np.sqrt(self.regret.variance() /
+                                 max(self.count, 1))
+        mean = self.regret.mean
+        return mean, mean - half_width, mean + half_width
+
+    def quantile_band(self, lower=0.05, upper=0.95):
+        '''Quantiles of the cumulative regret, from the sketch.
+            Args:
+                - lower (float): the lower quantile
+                - upper (float): the upper quantile
+            Output:
+                - lower, upper (ndarray): the regret quantiles
+        '''
+        if self.sketch is None:
+            raise ValueError("the aggregator keeps no quantile sketch")
+        return tuple(self.sketch.quantiles([lower, upper]))
+
@@ -2,6 +2,36 @@ import random
 import numpy as np
 
 
+def alias_table(probabilities):
+    ''' Builds the table of Vose's alias method for a discrete distribution.
+    Drawing an index i uniformly and keeping it with probability
+    alias_probabilities[i] (alias[i] otherwise) samples the distribution.
+        Args:
+            - probabilities (list of float): the probabilities of each point
+        Output:
+            - alias_probabilities (ndarray): probability to keep each index
+            - alias (ndarray): the index used instead of each index
+    '''
+    n_points = len(probabilities)
+    scaled = np.array(probabilities, dtype=float) * n_points
+    alias_probabilities = np.ones(n_points)
+    alias = np.arange(n_points)
+    small = [i for i in range(n_points) if scaled[i] < 1]
+    large = [i for i in range(n_points) if scaled[i] >= 1]
+    while small and large:
+        i = small.pop()
+        j = large.pop()
+        alias_probabilities[i] = scaled[i]
+        alias[i] = j
+        scaled[j] -= 1 - scaled[i]
+        if scaled[j] < 1:
+            small.append(j)
+        else:
+            large.append(j)
+    # remaining entries are 1 up to rounding errors
+    return alias_probabilities, alias
+
+
 class ArmBernoulli:
     ''' Arm to be played in the bandit model with Bernoulli Distribution
     '''
@@ -15,7 +45,13 @@ class ArmBernoulli:
             raise ValueError("The parameter of a Bernoulli distribution must be\
                 between 0 and 1")
 
-    def draw(self):
+    def draw(self, size=None):
+        '''Args:
+            - size (int or tuple of int): shape of the block of samples to
+                draw, a single sample is returned if None
+        '''
+        if size is not None:
+            return (np.random.random(size) < self.p).astype(float)
         if random.random() < self.p:
             return 1
         else:
@@ -28,7 +64,9 @@ class ArmBernoulli:
 class ArmUniform:
     ''' Arm to be played in the bandit model with uniform Distribution
     '''
-    def draw(self):
+    def draw(self, size=None):
+        if size is not None:
+            return np.random.random(size)
         return random.random()
 
     def mean(self):
@@ -59,14 +97,22 @@ class ArmMultinomial:
             raise ValueError("The probabilities of the multinomial have to be bounded\
                 between 0 and 1")
 
-    def draw(self):
-        cumulative_probabilities = np.cumsum(self.probabilities)
-        p = random.random()
-        # We try to get the first index where the cummulative probability is
-        # greater than p
-        i = next(idx for (idx, cumul_proba)
-                 in enumerate(cumulative_probabilities)
-                 if cumul_proba > p)
+        self.alias_probabilities, self.alias = alias_table(self.probabilities)
+
+    def draw(self, size=None):
+        '''Sample with the alias method : O(1) per sample.
+            Args:
+            - size (int or tuple of int): shape of the block of samples to
+                draw, a single sample is returned if None
+        '''
+        n_points = len(self.points)
+        if size is not None:
+            i = np.random.randint(0, n_points, size=size)
+            keep = np.random.random(size) < self.alias_probabilities[i]
+            return self.points[np.where(keep, i, self.alias[i])]
+        i = random.randrange(n_points)
+        if random.random() >= self.alias_probabilities[i]:
+            i = self.alias[i]
         return self.points[i]
 
     def mean(self):
@@ -84,8 +130,99 @@ class ArmBeta:
             raise ValueError("The paramaters of the beta distribution have to \
                 be positive")
 
-    def draw(self):
+    def draw(self, size=None):
+        '''Args:
+            - size (int or tuple of int): shape of the block of samples to
+                draw, a single sample is returned if None
+        '''
+        if size is not None:
+            return np.random.beta(self.alpha, self.beta, size=size)
         return random.betavariate(self.alpha, self.beta)
 
     def mean(self):
         return self.alpha / (self.alpha + self.beta)
+
+
+# arm classes an ArmBank draws, subclasses included, by kind code
+BANK_KINDS = (ArmBernoulli, ArmUniform, ArmMultinomial, ArmBeta)
+BERNOULLI, UNIFORM, MULTINOMIAL, BETA = range(len(BANK_KINDS))
+
+
+def _bank_kind(arm):
+    for kind, arm_class in enumerate(BANK_KINDS):
+        if isinstance(arm, arm_class):
+            return kind
+    raise ValueError("an ArmBank cannot draw %s arms" % type(arm).__name__)
+
+
+class ArmBank:
+    ''' Set of arms whose parameters are stored in arrays so that any
+    collection of arms can be drawn in a single call.
+    '''
+    def __init__(self, arms):
+        '''Args:
+            - arms (list of arms): ArmBernoulli, ArmUniform, ArmMultinomial or
+                ArmBeta instances (or of their subclasses), arms[k] is drawn
+                for the arm id k
+        '''
+        self.arms = list(arms)
+        n_arms = len(self.arms)
+        self.kinds = np.array([_bank_kind(arm) for arm in self.arms],
+                              dtype='int')
+        self.p = np.array([getattr(arm, 'p', 0.) for arm in self.arms])
+        self.alpha = np.array([getattr(arm, 'alpha', 1.) for arm in self.arms])
+        self.beta = np.array([getattr(arm, 'beta', 1.) for arm in self.arms])
+        # multinomial arms share padded alias tables
+        n_points = max([len(getattr(arm, 'points', ())) for arm in self.arms] +
+                       [1])
+        self.n_points = np.ones(n_arms, dtype='int')
+        self.points = np.zeros((n_arms, n_points))
+        self.alias_probabilities = np.ones((n_arms, n_points))
+        self.alias = np.zeros((n_arms, n_points), dtype='int')
+        for k, arm in enumerate(self.arms):
+            if self.kinds[k] == MULTINOMIAL:
+                n = len(arm.points)
+                self.n_points[k] = n
+                self.points[k, :n] = arm.points
+                self.alias_probabilities[k, :n] = arm.alias_probabilities
+                self.alias[k, :n] = arm.alias
+        self.bernoulli_only = bool(np.all(self.kinds == BERNOULLI))
+
+    @classmethod
+    def bernoulli(cls, means):
+        '''Args:
+            - means (list of float): the parameters of the Bernoulli arms
+        '''
+        return cls([ArmBernoulli(mean) for mean in means])
+
+    def draw(self, arm_ids):
+        ''' Draws once each requested arm.
+            Args:
+                - arm_ids (ndarray of int): the arms to draw, of any shape
+            Output:
+                - ndarray: the rewards, of the same shape as arm_ids
+        '''
+        arm_ids = np.asarray(arm_ids)
+        u = np.random.random(arm_ids.shape)
+        if self.bernoulli_only:
+            return (u < self.p[arm_ids]).astype(float)
+        kinds = self.kinds[arm_ids]
+        rewards = np.where(u < self.p[arm_ids], 1., 0.)
+        uniform = kinds == UNIFORM
+        rewards[uniform] = u[uniform]
+        beta = kinds == BETA
+        if beta.any():
+            rewards[beta] = np.random.beta(self.alpha[arm_ids[beta]],
+                                           self.beta[arm_ids[beta]])
+        multinomial = kinds == MULTINOMIAL
+        if multinomial.any():
+            ids = arm_ids[multinomial]
+            i = (u[multinomial] * self.n_points[ids]).astype('int')
+            keep = np.random.random(ids.shape) < \
+                self.alias_probabilities[ids, i]
+            i = np.where(keep, i, self.alias[ids, i])
+            rewards[multinomial] = self.points[ids, i]
+        return rewards
+
+    def means(self):
+        return np.array([arm.mean() for arm in self.arms])
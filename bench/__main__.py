@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import sys
+
+from .head2head import head2head, load_scenarios
+from .latency import latency
+from .scaling import SWEEPS, scaling
+
+DEFAULT_SCENARIOS = os.path.join(os.path.dirname(__file__), 'scenarios.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    h2h = commands.add_parser(
+        'head2head', help="time and compare the 8 algorithm variants")
+    h2h.add_argument('--config', default=DEFAULT_SCENARIOS,
+                     help="json file with the scenario definitions")
+    h2h.add_argument('--variants', nargs='+',
+                     help="labels of the variants to run, e.g. 'mega ucb'")
+    h2h.add_argument('--seed', type=int, default=0)
+    h2h.add_argument('--common-random-numbers', action='store_true',
+                     help="share the reward tape of each replica between "
+                     "the variants and report their paired regret gaps")
+    h2h.add_argument('--width', type=float,
+                     help="run replicas until the 95%% confidence interval "
+                     "on the final regret is narrower than this, instead of "
+                     "mc_horizon replicas")
+    h2h.add_argument('--min-replicas', type=int, default=10)
+    h2h.add_argument('--max-replicas', type=int, default=1000,
+                     help="budget of replicas per variant with --width")
+    h2h.add_argument('--output', help="json file to write the results to")
+
+    scale = commands.add_parser(
+        'scaling', help="fit the scaling exponents of the routines and fail "
+        "on complexity regressions")
+    scale.add_argument('--variants', nargs='+',
+                       help="labels of the variants to sweep")
+    scale.add_argument('--dimensions', nargs='+', choices=list(SWEEPS))
+    scale.add_argument('--tolerance', type=float, default=0.15,
+                       help="allowed excess over the expected exponent")
+    scale.add_argument('--repeats', type=int, default=3)
+    scale.add_argument('--output', help="json file to write the results to")
+
+    lat = commands.add_parser(
+        'latency', help="time the decisions of the online policies")
+    lat.add_argument('--variants', nargs='+',
+                     help="labels of the variants to time")
+    lat.add_argument('--n-arms', type=int, default=8)
+    lat.add_argument('--n-users', type=int, default=3)
+    lat.add_argument('--calls', type=int, default=10000,
+                     help="number of timed decisions per policy")
+    lat.add_argument('--seed', type=int, default=0)
+    lat.add_argument('--output', help="json file to write the results to")
+
+    args = parser.parse_args()
+    failed = False
+    if args.command == 'head2head':
+        report = head2head(load_scenarios(args.config),
+                           variants=args.variants, seed=args.seed,
+                           common_random_numbers=args.common_random_numbers,
+                           width=args.width, min_replicas=args.min_replicas,
+                           max_replicas=args.max_replicas)
+    elif args.command == 'scaling':
+        report = scaling(variants=args.variants, dimensions=args.dimensions,
+                         tolerance=args.tolerance, repeats=args.repeats)
+        failed = not all(result['ok'] for result in report)
+    elif args.command == 'latency':
+        report = latency(variants=args.variants, n_arms=args.n_arms,
+                         n_users=args.n_users, n_calls=args.calls,
+                         seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
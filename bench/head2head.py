@@ -0,0 +1,213 @@
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from montecarlo import (confidence_width, paired_gap, replica_decisions,
+                        replica_rewards, replica_seeds, replica_tape,
+                        seed_replica, variance_reduction)
+from tdfs.routines import tdfs_routine
+from rho_rand.routines import rho_rand_routine
+from mega.routines import mega_routine
+from musical_chairs.routines import mc_routine
+
+
+def _tdfs(scenario, alg, **kwargs):
+    return tdfs_routine(scenario['n_users'], scenario['n_arms'],
+                        scenario['t_horizon'], scenario['arm_means'], alg=alg,
+                        **kwargs)
+
+
+def _rho_rand(scenario, alg, **kwargs):
+    return rho_rand_routine(scenario['n_users'], scenario['n_arms'],
+                            scenario['t_horizon'], scenario['arm_means'],
+                            alg=alg, **kwargs)
+
+
+def _mega(scenario, alg, **kwargs):
+    return mega_routine(scenario['n_users'], scenario['mega_params'],
+                        scenario['n_arms'], scenario['t_horizon'],
+                        scenario['arm_means'], alg=alg, **kwargs)
+
+
+def _musical_chairs(scenario, alg, **kwargs):
+    return mc_routine(scenario['n_users'], scenario['mc_params'],
+                      scenario['n_arms'], scenario['t_horizon'],
+                      scenario['arm_means'], **kwargs)
+
+
+# the 8 algorithm variants compared in head2head.ipynb
+VARIANTS = [
+    ("tdfs ucb", _tdfs, 'ucb'),
+    ("rho_rand ucb", _rho_rand, 'ucb'),
+    ("mega eps", _mega, 'eps'),
+    ("mega ucb", _mega, 'ucb'),
+    ("tdfs ts", _tdfs, 'ts'),
+    ("mega ts", _mega, 'ts'),
+    ("rho_rand ts", _rho_rand, 'ts'),
+    ("musical chairs", _musical_chairs, None),
+]
+
+
+def load_scenarios(path):
+    '''Reads the scenario definitions of a benchmark.
+        Args:
+            - path (str): json file with a "scenarios" list, each scenario
+            defines name, n_users, n_arms, t_horizon, arm_means, mega_params,
+            mc_params and mc_horizon (number of replicas)
+        Output:
+            - list[dict]: the scenarios
+    '''
+    with open(path) as f:
+        return json.load(f)['scenarios']
+
+
+def run_variant(scenario, run, alg, seed=None, common_random_numbers=False,
+                width=None, min_replicas=10, max_replicas=1000):
+    '''Runs the replicas of one variant on one scenario, mc_horizon of them
+    or, given a width, as many as needed to estimate the final regret.
+        Args:
+            - scenario (dict): the scenario definition
+            - run (function): the variant runner, one of VARIANTS
+            - alg (str): the decision algorithm of the variant
+            - seed (int): master seed of the replicas
+            - common_random_numbers (bool): the replica r of every variant
+            reads the same reward tape and draws its decisions from the same
+            stream, see montecarlo.replica_tape and replica_decisions
+            - width (float): replicas are run until the 95% confidence
+            interval on the mean final regret is narrower than width,
+            mc_horizon replicas are run if None
+            - min_replicas (int): replicas run before checking the width
+            - max_replicas (int): the budget of replicas when width is given
+        Output:
+            - dict: timings, peak memory, number of replicas, final regret of
+            each replica and its statistics and the time and calls of each
+            phase of a step
+    '''
+    t_horizon = scenario['t_horizon']
+    n_replicas = scenario['mc_horizon'] if width is None else max_replicas
+    best_arms_mean = np.sort(scenario['arm_means'])[-scenario['n_users']:]
+    seeds = replica_seeds(seed, n_replicas)
+    final_regrets = []
+    start = time.perf_counter()
+    for replica in range(n_replicas):
+        kwargs = {}
+        if common_random_numbers:
+            seed_replica(replica_decisions(seeds[replica]))
+            kwargs['tape'] = replica_tape(seeds[replica],
+                                          scenario['arm_means'])
+        else:
+            seed_replica(seeds[replica])
+        rewards = replica_rewards(run(scenario, alg, **kwargs))
+        final_regrets.append(np.sum(best_arms_mean.sum() - rewards))
+        if width is not None and len(final_regrets) >= min_replicas and \
+                confidence_width(final_regrets) <= width:
+            break
+    wall_time = time.perf_counter() - start
+    final_regrets = np.array(final_regrets)
+    n_replicas = len(final_regrets)
+    # the memory is measured apart so that tracing does not bias timings
+    tracemalloc.start()
+    seed_replica(seeds[0])
+    run(scenario, alg)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # the phases are profiled apart as well
+    seed_replica(seeds[0])
+    _, profile = run(scenario, alg, profile=True)
+    return {
+        'wall_time': wall_time,
+        'time_per_step': wall_time / (n_replicas * t_horizon),
+        'peak_memory': peak_memory,
+        'final_regret_mean': float(final_regrets.mean()),
+        'final_regret_std': float(final_regrets.std()),
+        'final_regret_min': float(final_regrets.min()),
+        'final_regret_max': float(final_regrets.max()),
+        'final_regret_ci_width': confidence_width(final_regrets),
+        'n_replicas': n_replicas,
+        'final_regrets': final_regrets.tolist(),
+        'phases': profile.as_dict(),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def head2head(scenarios, variants=None, seed=None,
+              common_random_numbers=False, width=None, min_replicas=10,
+              max_replicas=1000):
+    '''Runs every variant on every scenario.
+        Args:
+            - scenarios (list[dict]): the scenario definitions
+            - variants (list[str]): labels of the variants to run, all if None
+            - seed (int): master seed of the replicas of each variant
+            - common_random_numbers (bool): the variants share the reward
+            tape and the decision stream of each replica, and the final
+            regret of each variant is compared to the one of the first
+            variant replica by replica, with the variance reduction achieved
+            - width, min_replicas, max_replicas: adaptive number of
+            replicas, see run_variant
+        Output:
+            - dict: the machine-readable results, with the machine and commit
+    '''
+    results = []
+    for scenario in scenarios:
+        reference = None
+        for label, run, alg in VARIANTS:
+            if variants is not None and label not in variants:
+                continue
+            result = run_variant(scenario, run, alg, seed=seed,
+                                 common_random_numbers=common_random_numbers,
+                                 width=width, min_replicas=min_replicas,
+                                 max_replicas=max_replicas)
+            result.update(scenario=scenario['name'], variant=label)
+            results.append(result)
+            if common_random_numbers:
+                if reference is None:
+                    reference = result
+                # the first replicas are the same for every variant
+                n_paired = min(result['n_replicas'],
+                               reference['n_replicas'])
+                regrets = result['final_regrets'][:n_paired]
+                reference_regrets = reference['final_regrets'][:n_paired]
+                gap, stderr = paired_gap(regrets, reference_regrets)
+                result.update(reference=reference['variant'],
+                              paired_gap_mean=gap, paired_gap_stderr=stderr,
+                              variance_reduction=variance_reduction(
+                                  regrets, reference_regrets))
+            print("{:<24} {:<16} {:>9.3f}s {:>9.2f}us/step {:>9.1f}kB "
+                  "regret {:>8.1f} +- {:.1f} ({} replicas)".format(
+                      scenario['name'], label, result['wall_time'],
+                      result['time_per_step'] * 1e6,
+                      result['peak_memory'] / 1024,
+                      result['final_regret_mean'],
+                      result['final_regret_std'], result['n_replicas']))
+            if common_random_numbers and result is not reference:
+                print("{:<24} {:<16} paired gap to {} {:>+8.1f} +- {:.1f} "
+                      "(variance reduced by {:.0%})"
+                      .format('', '', reference['variant'],
+                              result['paired_gap_mean'],
+                              result['paired_gap_stderr'],
+                              result['variance_reduction']))
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'commit': _git_commit(),
+        'machine': platform.platform(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': seed,
+        'common_random_numbers': common_random_numbers,
+        'width': width,
+        'results': results,
+    }
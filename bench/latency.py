@@ -0,0 +1,136 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+import registry
+from .scaling import BASE_SCENARIO
+
+
+def make_policy(name, alg, n_arms, n_users, params=None):
+    '''Builds the online policy of a node.
+        Args:
+            - name (str): the algorithm, 'tdfs', 'rho_rand' or 'mega'
+            - alg (str): the decision algorithm
+            - n_arms (int): number of arms
+            - n_users (int): number of nodes
+            - params (dict): the mega params, the ones of the scaling
+            benchmark if None
+        Output:
+            - Policy: the policy
+    '''
+    policy = registry.get(name, alg, kind='policy')
+    if name == 'mega':
+        return policy(n_arms, params or BASE_SCENARIO['mega_params'])
+    return policy(n_arms, n_users)
+
+
+def _percentiles(times_ns):
+    times = times_ns / 1e3
+    return {
+        'mean_us': float(times.mean()),
+        'median_us': float(np.median(times)),
+        'p99_us': float(np.percentile(times, 99)),
+    }
+
+
+def measure_latency(policy, arm_means, n_calls=10000, warmup=1000,
+                    collision_rate=0.1, seed=0):
+    '''Times every select and update call of a policy fed with Bernoulli
+    rewards and random collisions, generated before the timed loop.
+        Args:
+            - policy (Policy): the policy
+            - arm_means (list[float]): the means of the arms
+            - n_calls (int): number of timed decisions
+            - warmup (int): decisions run first, e.g. to compile the jit
+            kernels
+            - collision_rate (float): probability of a collision
+            - seed (int): seed of the feedback and of np.random
+        Output:
+            - dict: mean, median and 99th percentile latency of select and
+            update, mean latency of snapshot and restore, and memory kept
+            allocated by the calls
+    '''
+    np.random.seed(seed)
+    arm_means = np.asarray(arm_means, dtype=float)
+    n_steps = warmup + n_calls
+    uniforms = np.random.random(n_steps).tolist()
+    collisions = (np.random.random(n_steps) < collision_rate).tolist()
+    means = arm_means.tolist() + [0.]
+
+    def feedback(step, arm):
+        # a node sitting out (arm -1) gets nothing
+        return (1. if uniforms[step] < means[arm] else 0.), collisions[step]
+
+    for step in range(warmup):
+        policy.update(*feedback(step, policy.select()))
+    select_ns = np.zeros(n_calls, dtype=np.int64)
+    update_ns = np.zeros(n_calls, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(n_calls):
+        start = clock()
+        arm = policy.select()
+        select_ns[i] = clock() - start
+        reward, collided = feedback(warmup + i, arm)
+        start = clock()
+        policy.update(reward, collided)
+        update_ns[i] = clock() - start
+    snapshot = policy.snapshot()
+    start = clock()
+    for _ in range(1000):
+        policy.snapshot()
+    snapshot_ns = (clock() - start) / 1000
+    start = clock()
+    for _ in range(1000):
+        policy.restore(snapshot)
+    restore_ns = (clock() - start) / 1000
+    # the memory is measured apart so that tracing does not bias timings
+    tracemalloc.start()
+    memory_start = tracemalloc.get_traced_memory()[0]
+    for i in range(min(n_calls, 1000)):
+        policy.update(*feedback(warmup + i, policy.select()))
+    memory_kept = tracemalloc.get_traced_memory()[0] - memory_start
+    tracemalloc.stop()
+    return {
+        'select': _percentiles(select_ns),
+        'update': _percentiles(update_ns),
+        'snapshot_us': snapshot_ns / 1e3,
+        'restore_us': restore_ns / 1e3,
+        'state_bytes': policy.state.nbytes,
+        'memory_kept': memory_kept,
+    }
+
+
+def latency(variants=None, n_arms=8, n_users=3, n_calls=10000, seed=0):
+    '''Measures the per-decision latency of the online policy of every
+    variant.
+        Args:
+            - variants (list[str]): labels of the variants, all the ones
+            with a policy if None
+            - n_arms (int): number of arms, with means spread in [0.1, 0.9]
+            - n_users (int): number of nodes the policies expect
+            - n_calls (int): number of timed decisions
+            - seed (int): seed of the feedback
+        Output:
+            - list[dict]: the latencies of each variant
+    '''
+    arm_means = np.linspace(0.1, 0.9, n_arms)
+    results = []
+    for label, name, alg in registry.variants():
+        if variants is not None and label not in variants:
+            continue
+        if variants is None and 'policy' not in registry.ALGORITHMS[name]:
+            continue
+        policy = make_policy(name, alg, n_arms, n_users)
+        result = measure_latency(policy, arm_means, n_calls=n_calls,
+                                 seed=seed)
+        result.update(variant=label, n_arms=n_arms, n_users=n_users)
+        results.append(result)
+        print("{:<16} select {:>7.2f}us (p99 {:>7.2f}us) update {:>7.2f}us "
+              "(p99 {:>7.2f}us) snapshot {:>5.2f}us restore {:>5.2f}us"
+              .format(label, result['select']['median_us'],
+                      result['select']['p99_us'],
+                      result['update']['median_us'],
+                      result['update']['p99_us'], result['snapshot_us'],
+                      result['restore_us']))
+    return results
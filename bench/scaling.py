@@ -0,0 +1,148 @@
+import time
+
+import numpy as np
+
+from montecarlo import replica_seeds, seed_replica
+from .head2head import VARIANTS
+
+# the scenario every sweep starts from
+BASE_SCENARIO = {
+    'n_users': 3,
+    'n_arms': 32,
+    't_horizon': 2000,
+    'mega_params': {
+        'c': 0.1,
+        'd': 0.05,
+        'alpha': 0.5,
+        'beta': 0.8,
+        'persistence_proba_init': 0.6
+    },
+    'mc_params': {'t0': 100, 't1': 400},
+}
+
+# values taken by each swept dimension, over two orders of magnitude or more,
+# the others keep their base value
+SWEEPS = {
+    't_horizon': [500, 2000, 8000, 32000, 128000],
+    'n_users': [2, 8, 32, 128],
+    'n_arms': [8, 32, 128, 512, 2048],
+}
+
+# base values changed for a sweep: room for 128 users, and a horizon long
+# enough for the users to leave the initial exploration of 2048 arms
+SWEEP_BASES = {
+    'n_users': {'n_arms': 256},
+    'n_arms': {'t_horizon': 20000},
+}
+
+# scaling exponent of the run time of every variant along each dimension,
+# fitted on the sweeps above. Every routine is linear in the horizon. A step
+# costs less than linear in the users over this range, the fixed cost of the
+# step still weighing at 2 users. The UCB and Thompson rankings of tdfs and
+# rho_rand and the Thompson samples of mega grow with the arms, against a
+# constant step of mega ucb and eps and of musical chairs, whose users
+# settle on an arm
+EXPECTED_EXPONENTS = {
+    "tdfs ucb": {'t_horizon': 1., 'n_users': 0.7, 'n_arms': 0.4},
+    "rho_rand ucb": {'t_horizon': 1., 'n_users': 0.8, 'n_arms': 0.4},
+    "mega eps": {'t_horizon': 1., 'n_users': 0.9, 'n_arms': 0.1},
+    "mega ucb": {'t_horizon': 1., 'n_users': 0.9, 'n_arms': 0.1},
+    "tdfs ts": {'t_horizon': 1., 'n_users': 0.9, 'n_arms': 0.45},
+    "mega ts": {'t_horizon': 1., 'n_users': 0.95, 'n_arms': 0.4},
+    "rho_rand ts": {'t_horizon': 1., 'n_users': 0.85, 'n_arms': 0.45},
+    "musical chairs": {'t_horizon': 1., 'n_users': 0.55, 'n_arms': 0.},
+}
+
+DEFAULT_VARIANTS = ["tdfs ucb", "rho_rand ucb", "mega ucb", "musical chairs"]
+
+
+def make_scenario(**kwargs):
+    '''Builds a scenario from the base one.
+        Args:
+            - kwargs: the values overriding the base scenario
+        Output:
+            - dict: the scenario, with arm means spread in [0.1, 0.9]
+    '''
+    scenario = dict(BASE_SCENARIO, **kwargs)
+    scenario['arm_means'] = list(np.linspace(0.1, 0.9, scenario['n_arms']))
+    return scenario
+
+
+def measure(run, alg, scenario, repeats=3, seed=0):
+    '''Times a variant on a scenario.
+        Args:
+            - run (function): the variant runner, one of VARIANTS
+            - alg (str): the decision algorithm of the variant
+            - scenario (dict): the scenario definition
+            - repeats (int): number of runs, the fastest one is kept
+            - seed (int): master seed of the runs
+        Output:
+            - float: the run time in seconds
+    '''
+    times = []
+    for seed_sequence in replica_seeds(seed, repeats):
+        seed_replica(seed_sequence)
+        start = time.perf_counter()
+        run(scenario, alg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def fit_exponent(sizes, times):
+    '''Fits times ~ sizes ** exponent in log-log scale.
+        Args:
+            - sizes (list[float]): the values of the swept dimension
+            - times (list[float]): the measured run times
+        Output:
+            - float: the empirical scaling exponent
+    '''
+    return np.polyfit(np.log(sizes), np.log(times), 1)[0]
+
+
+def scaling(variants=None, dimensions=None, tolerance=0.15, repeats=3,
+            sweeps=SWEEPS):
+    '''Sweeps every dimension for every variant and checks the fitted
+    exponents against EXPECTED_EXPONENTS.
+        Args:
+            - variants (list[str]): labels of the variants, DEFAULT_VARIANTS
+            if None
+            - dimensions (list[str]): the swept dimensions, all if None
+            - tolerance (float): allowed excess over the expected exponent
+            - repeats (int): number of runs of each point
+            - sweeps (dict): values taken by each dimension
+        Output:
+            - list[dict]: one result per (variant, dimension), with the fitted
+            exponent and whether it is within the expected class
+    '''
+    if variants is None:
+        variants = DEFAULT_VARIANTS
+    if dimensions is None:
+        dimensions = list(sweeps)
+    results = []
+    for label, run, alg in VARIANTS:
+        if label not in variants:
+            continue
+        for dimension in dimensions:
+            sizes = sweeps[dimension]
+            base = SWEEP_BASES.get(dimension, {})
+            times = [measure(run, alg,
+                             make_scenario(**dict(base, **{dimension: size})),
+                             repeats=repeats)
+                     for size in sizes]
+            exponent = fit_exponent(sizes, times)
+            expected = EXPECTED_EXPONENTS[label][dimension]
+            result = {
+                'variant': label,
+                'dimension': dimension,
+                'sizes': sizes,
+                'times': times,
+                'exponent': float(exponent),
+                'expected_exponent': expected,
+                'ok': bool(exponent <= expected + tolerance),
+            }
+            results.append(result)
+            print("{:<16} {:<10} exponent {:5.2f} (expected {:.2f}, at most "
+                  "{:.2f}) {}".format(label, dimension, exponent, expected,
+                                     expected + tolerance,
+                                     "ok" if result['ok'] else "REGRESSION"))
+    return results
@@ -0,0 +1,93 @@
+import gzip
+import os
+import pickle
+import random
+
+import numpy as np
+
+
+class Checkpoint:
+    ''' Compact on-disk snapshot of a running routine: users, arms, random
+    states and routine-specific state. A routine given a checkpoint resumes
+    from it when the file exists, and can continue it to a longer horizon
+    without recomputing the prefix.
+    '''
+    def __init__(self, path, every=None):
+        '''Args:
+            - path (str): the checkpoint file
+            - every (int): number of time steps between two snapshots, the
+            state is only saved at the end of the run if None
+        '''
+        self.path = path
+        self.every = every
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def due(self, t):
+        '''Args:
+            - t (int): the time step that just ended
+        Output:
+            - bool: whether a snapshot has to be taken after t
+        '''
+        return bool(self.every) and (t + 1) % self.every == 0
+
+    def save(self, state):
+        '''Writes the state along with the random and np.random states.
+            Args:
+                - state (dict): the routine state, with routine, args and the
+                next time step t
+        '''
+        state = dict(state, random_state=random.getstate(),
+                     np_random_state=np.random.get_state())
+        tmp_path = self.path + '.tmp'
+        with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def load(self, routine, args):
+        '''Reads the state of a routine and restores the random states.
+            Args:
+                - routine (str): the name of the routine
+                - args (dict): the arguments the run depends on, they must
+                match the ones of the checkpoint
+            Output:
+                - dict: the state, None if there is no checkpoint
+        '''
+        if not self.exists():
+            return None
+        with gzip.open(self.path, 'rb') as f:
+            state = pickle.load(f)
+        if state['routine'] != routine or state['args'] != args:
+            raise ValueError("checkpoint {} was taken by {} with {}".format(
+                self.path, state['routine'], state['args']))
+        random.setstate(state['random_state'])
+        np.random.set_state(state['np_random_state'])
+        return state
+
+
+def resize(array, t_horizon, axis=-1):
+    '''Fits the time axis of an array to a new horizon, padding with zeros
+    or truncating.
+        Args:
+            - array (ndarray): the array
+            - t_horizon (int): the new horizon
+            - axis (int): the time axis
+        Output:
+            - ndarray: the resized array
+    '''
+    array = np.moveaxis(array, axis, -1)
+    resized = np.zeros(array.shape[:-1] + (t_horizon,), dtype=array.dtype)
+    length = min(t_horizon, array.shape[-1])
+    resized[..., :length] = array[..., :length]
+    return np.moveaxis(resized, -1, axis)
+
+
+def routine_args(arm_means, **kwargs):
+    '''Args:
+            - arm_means (list[float]): the means of the arms
+            - kwargs: the other arguments of the run
+        Output:
+            - dict: the arguments, comparable with the ones of a checkpoint
+    '''
+    return dict(kwargs, arm_means=[float(mean) for mean in arm_means])
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+def arm_occupancy(choices, n_arms):
+    '''Counts the users on each arm with a single bincount.
+        Args:
+            - choices (ndarray): (..., n_users) the arm chosen by each user,
+            -1 if a user chose no arm
+            - n_arms (int): number of arms
+        Output:
+            - ndarray: (..., n_arms) the number of users on each arm
+    '''
+    choices = np.asarray(choices)
+    if choices.ndim == 1:
+        return np.bincount(choices[choices >= 0], minlength=n_arms)
+    n_rows = int(np.prod(choices.shape[:-1]))
+    flat = choices.reshape(n_rows, choices.shape[-1])
+    valid = flat >= 0
+    index = (flat + n_arms * np.arange(n_rows)[:, None])[valid]
+    counts = np.bincount(index, minlength=n_rows * n_arms)
+    return counts.reshape(choices.shape[:-1] + (n_arms,))
+
+
+def collided_users(choices, n_arms):
+    '''Detects the users sharing their arm, in O(n_users + n_arms) for each
+    row of choices.
+        Args:
+            - choices (ndarray): (..., n_users) the arm chosen by each user,
+            -1 if a user chose no arm. Leading axes are e.g. replicas
+            - n_arms (int): number of arms
+        Output:
+            - occupancy (ndarray): (..., n_arms) number of users on each arm
+            - collided (ndarray): (..., n_users) True for the users sharing
+            their arm
+    '''
+    choices = np.asarray(choices)
+    valid = choices >= 0
+    if choices.ndim == 1:
+        occupancy = np.bincount(choices[valid], minlength=n_arms)
+        # -1 choices read the last arm but are masked out
+        return occupancy, valid & (occupancy[choices] > 1)
+    occupancy = arm_occupancy(choices, n_arms)
+    collided = valid & (np.take_along_axis(occupancy, choices, axis=-1) > 1)
+    return occupancy, collided
+
+
+def resolve_collisions(choices, n_arms):
+    '''Detects the collisions between users and the winner of every arm.
+        Args:
+            - choices (ndarray): (..., n_users) the arm chosen by each user,
+            -1 if a user chose no arm. Leading axes are e.g. replicas
+            - n_arms (int): number of arms
+        Output:
+            - occupancy (ndarray): (..., n_arms) number of users on each arm
+            - collided (ndarray): (..., n_users) True for the users sharing
+            their arm
+            - winners (ndarray): (..., n_arms) the user alone on each arm,
+            -1 if the arm is free or collided
+    '''
+    choices = np.asarray(choices)
+    occupancy, collided = collided_users(choices, n_arms)
+    winners = np.full(occupancy.shape, -1)
+    n_rows = int(np.prod(choices.shape[:-1]))
+    flat = choices.reshape(n_rows, choices.shape[-1])
+    rows, users = np.nonzero(((choices >= 0) & ~collided).reshape(flat.shape))
+    winners.reshape(n_rows, n_arms)[rows, flat[rows, users]] = users
+    return occupancy, collided, winners
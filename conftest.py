@@ -0,0 +1 @@
+# makes the top-level modules importable when pytest is run from anywhere
@@ -0,0 +1,127 @@
+import warnings
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# 'numpy' runs the routines as they are, 'jit_distributional' runs their
+# time loop in a kernel compiled with numba. The kernels draw their random
+# numbers in another order than the routines: the two backends agree in
+# distribution, not run by run for a given seed, hence the explicit name.
+JIT_BACKEND = 'jit_distributional'
+BACKENDS = ('numpy', JIT_BACKEND)
+
+
+def jit(function):
+    '''Compiles a kernel with numba in nopython mode, the function is returned
+    as is when numba is not installed.
+        Args:
+            - function (callable): a kernel only using arrays, scalars and the
+            np.random functions supported by numba.
+        Output:
+            - callable: the compiled (or plain) kernel.
+    '''
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+
+def use_jit(backend, checkpoint=None, tape=None, n_users=None,
+            n_arms=None):
+    '''Args:
+            - backend (str): 'numpy' or 'jit_distributional'.
+            - checkpoint (Checkpoint): the checkpoint of the routine, if any.
+            - tape (RewardTape): the reward tape of the routine, if any.
+            - n_users, n_arms (int): the size of the problem, the kernels
+            need n_users <= n_arms.
+        Output:
+            - bool: whether the kernel of the routine has to be run. The
+            kernel does not support checkpoints, reward tapes nor more users
+            than arms, and it needs numba: otherwise the backend warns and
+            falls back to the numpy routine. The kernels only agree with the
+            numpy routines in distribution, not for a given seed.
+    '''
+    if backend not in BACKENDS:
+        raise ValueError("backend must be one of %s" % (BACKENDS,))
+    if backend != JIT_BACKEND:
+        return False
+    if checkpoint is not None:
+        unsupported = "with a checkpoint"
+    elif tape is not None:
+        unsupported = "with a reward tape"
+    elif n_users is not None and n_arms is not None and n_users > n_arms:
+        unsupported = "with more users than arms"
+    elif numba is None:
+        unsupported = "without numba"
+    else:
+        return True
+    warnings.warn("the %s backend cannot run %s, it falls back to the numpy "
+                  "routine" % (JIT_BACKEND, unsupported), RuntimeWarning)
+    return False
+
+
+def run_kernel(kernel, *args):
+    '''Runs a kernel whose first argument seeds its random stream. The seed
+    is drawn from np.random, so that np.random.seed fixes the results of the
+    kernel whether it is compiled or not, these results only match the ones of
+    the numpy routine in distribution. A compiled kernel has its own random
+    state, the global one is restored after a plain Python run to match it.
+        Args:
+            - kernel (callable): the kernel.
+            - args: the other arguments of the kernel.
+        Output:
+            - the output of the kernel.
+    '''
+    seed = np.random.randint(2 ** 31 - 1)
+    if numba is not None:
+        return kernel(seed, *args)
+    state = np.random.get_state()
+    try:
+        return kernel(seed, *args)
+    finally:
+        np.random.set_state(state)
+
+
+@jit
+def best_arms(stats, m, out, taken):
+    '''Fills out[:m] with the indices of the m largest stats in decreasing
+    order, ties being broken by the lowest index.
+        Args:
+            - stats (ndarray): (n_arms) statistics of the arms, without NaN.
+            - m (int): number of arms to rank.
+            - out (ndarray): (>= m) int array receiving the ranking.
+            - taken (ndarray): (n_arms) bool scratch array.
+    '''
+    taken[:] = False
+    for rank in range(m):
+        best = -1
+        for k in range(stats.shape[0]):
+            if not taken[k] and (best == -1 or stats[k] > stats[best]):
+                best = k
+        taken[best] = True
+        out[rank] = best
+
+
+@jit
+def uniform_pick(mask):
+    '''Args:
+            - mask (ndarray): (n_arms) bool mask of the arms to choose from.
+        Output:
+            - int: an arm drawn uniformly in the mask, -1 if it is empty.
+    '''
+    count = 0
+    for k in range(mask.shape[0]):
+        if mask[k]:
+            count += 1
+    if count == 0:
+        return -1
+    index = int(np.random.random() * count)
+    for k in range(mask.shape[0]):
+        if mask[k]:
+            if index == 0:
+                return k
+            index -= 1
+    return -1
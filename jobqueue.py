@@ -0,0 +1,581 @@
+import argparse
+import io
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+import numpy as np
+
+import registry
+from aggregate import RegretAggregator
+from montecarlo import (confidence_width, final_regret, replica_rewards,
+                        seed_replica)
+from sweep import expand_grid, routine_arguments
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    replica_start INTEGER NOT NULL,
+    replica_stop INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result BLOB,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS units_status ON units (status, id);
+CREATE INDEX IF NOT EXISTS units_experiment ON units (experiment, id);
+'''
+
+# status of a unit: waiting for a worker, leased to a worker, its result is
+# stored, or it failed max_attempts times
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+
+class JobQueue:
+    ''' Queue of experiment work units stored in a SQLite file, shared by a
+    coordinator and worker daemons without any broker. A unit is a range of
+    replicas of one algorithm variant on one scenario, and its result is the
+    compact aggregate of its replicas (see RegretAggregator).
+    A worker leases the units it runs and renews the lease while it runs
+    them, the units of a worker which died are leased again once their lease
+    expired. The file must be on a filesystem with working locks for the
+    workers of other nodes.
+    '''
+    def __init__(self, path, lease=300., max_attempts=3, timeout=60.):
+        '''Args:
+            - path (str): the SQLite file, created if needed
+            - lease (float): seconds a unit stays leased to a worker without
+            being renewed
+            - max_attempts (int): number of times a unit is run before it is
+            marked as failed
+            - timeout (float): seconds to wait for the lock of the file
+        '''
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # transactions are explicit, see _transaction
+        connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                     isolation_level=None)
+        return _Connection(connection)
+
+    def submit(self, experiment, scenarios, variants=None, seed=0,
+               n_replicas=None, unit_size=10, grid=None):
+        '''Splits an experiment in work units.
+            Args:
+                - experiment (str): name of the experiment
+                - scenarios (list[dict]): scenario definitions, as in
+                bench/scenarios.json
+                - variants (list[str]): labels of the variants, e.g.
+                'mega ucb', see registry.variants, all of them if None
+                - seed (int): master seed, the replica r is seeded like the
+                replica r of montecarlo.run_replicas
+                - n_replicas (int): replicas per scenario, variant and grid
+                point, the mc_horizon of the scenario if None
+                - unit_size (int): replicas per unit
+                - grid (dict): the values taken by swept parameters of the
+                routines, e.g. {'c': [0.1, 0.2]}, see sweep.expand_grid
+            Output:
+                - int: the number of units added
+        '''
+        labels = {label: (name, alg)
+                  for label, name, alg in registry.variants()}
+        if variants is None:
+            variants = list(labels)
+        for label in variants:
+            if label not in labels:
+                raise ValueError("unknown variant %r, expected one of %s" %
+                                 (label, sorted(labels)))
+        points = expand_grid(grid) if grid else [{}]
+        rows = []
+        for scenario in scenarios:
+            total = scenario['mc_horizon'] if n_replicas is None \
+                else n_replicas
+            for label in variants:
+                name, alg = labels[label]
+                for point in points:
+                    spec = dict(scenario=scenario, variant=label,
+                                algorithm=name, alg=alg, point=point)
+                    # fail now rather than in every worker
+                    unit_arguments(spec)
+                    spec = json.dumps(spec, sort_keys=True)
+                    for start in range(0, total, unit_size):
+                        rows.append((experiment, spec, seed, start,
+                                     min(start + unit_size, total),
+                                     time.time()))
+        with self._connect() as connection:
+            with connection.transaction():
+                connection.executemany(
+                    'INSERT INTO units (experiment, spec, seed, '
+                    'replica_start, replica_stop, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def claim(self, worker):
+        '''Leases the next unit to run, a pending one or one whose lease
+        expired.
+            Args:
+                - worker (str): name of the worker
+            Output:
+                - dict: id, spec (dict), seed, replica_start and
+                replica_stop of the unit, None if no unit is available
+        '''
+        now = time.time()
+        with self._connect() as connection:
+            with connection.transaction():
+                # units leased by a lost worker are run again or given up
+                connection.execute(
+                    "UPDATE units SET status = 'failed', updated = ?, "
+                    "error = coalesce(error, 'lease expired') "
+                    "WHERE status = 'running' AND lease_expires < ? "
+                    "AND attempts >= ?", (now, now, self.max_attempts))
+                row = connection.execute(
+                    "SELECT id, spec, seed, replica_start, replica_stop "
+                    "FROM units WHERE status = 'pending' OR "
+                    "(status = 'running' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                connection.execute(
+                    "UPDATE units SET status = 'running', worker = ?, "
+                    "lease_expires = ?, attempts = attempts + 1, "
+                    "updated = ? WHERE id = ?",
+                    (worker, now + self.lease, now, row[0]))
+        unit_id, spec, seed, start, stop = row
+        return dict(id=unit_id, spec=json.loads(spec), seed=seed,
+                    replica_start=start, replica_stop=stop)
+
+    def renew(self, unit_id, worker):
+        '''Extends the lease of a unit.
+            Output:
+                - bool: False if the unit is no longer leased to the worker
+        '''
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE units SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (now + self.lease, now, unit_id, worker))
+            return cursor.rowcount == 1
+
+    def complete(self, unit_id, worker, result):
+        '''Stores the result of a unit, unless another worker already did.
+            Args:
+                - unit_id (int): the unit
+                - worker (str): name of the worker
+                - result (bytes): the packed result, see pack_result
+        '''
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE units SET status = 'done', result = ?, worker = ?, "
+                "error = NULL, updated = ? WHERE id = ? AND status != 'done'",
+                (result, worker, time.time(), unit_id))
+
+    def fail(self, unit_id, worker, error):
+        '''Gives the unit back to the queue after an error, it is failed
+        after max_attempts attempts.
+            Args:
+                - error (str): the error, kept for the report
+        '''
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE units SET status = CASE WHEN attempts >= ? "
+                "THEN 'failed' ELSE 'pending' END, error = ?, "
+                "lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (self.max_attempts, error, time.time(), unit_id, worker))
+
+    def retry_failed(self, experiment=None):
+        '''Gives the failed units another max_attempts attempts.
+            Output:
+                - int: the number of units put back in the queue
+        '''
+        query = "UPDATE units SET status = 'pending', attempts = 0 " \
+            "WHERE status = 'failed'"
+        args = ()
+        if experiment is not None:
+            query += " AND experiment = ?"
+            args = (experiment,)
+        with self._connect() as connection:
+            return connection.execute(query, args).rowcount
+
+    def progress(self, experiment=None):
+        '''Output:
+                - dict: number of units and of replicas of each status, and
+                the workers running units
+        '''
+        query = "SELECT status, count(*), " \
+            "sum(replica_stop - replica_start) FROM units"
+        args = ()
+        if experiment is not None:
+            query += " WHERE experiment = ?"
+            args = (experiment,)
+        with self._connect() as connection:
+            rows = connection.execute(query + " GROUP BY status",
+                                      args).fetchall()
+            workers = connection.execute(
+                "SELECT DISTINCT worker FROM units WHERE status = 'running' "
+                "AND lease_expires >= ?", (time.time(),)).fetchall()
+        report = {status: dict(units=0, replicas=0) for status in STATUSES}
+        for status, units, replicas in rows:
+            report[status] = dict(units=units, replicas=replicas)
+        report['workers'] = sorted(worker for worker, in workers)
+        return report
+
+    def errors(self, experiment=None):
+        '''Output:
+                - list[(int, str, str)]: id, status and last error of the
+                units which raised an error
+        '''
+        query = "SELECT id, status, error FROM units WHERE error IS NOT NULL"
+        args = ()
+        if experiment is not None:
+            query += " AND experiment = ?"
+            args = (experiment,)
+        with self._connect() as connection:
+            return connection.execute(query + " ORDER BY id",
+                                      args).fetchall()
+
+    def results(self, experiment):
+        '''Merges the results of the done units of an experiment.
+            Args:
+                - experiment (str): name of the experiment
+            Output:
+                - list[dict]: for each scenario, variant and grid point in
+                submission order, its spec, the merged RegretAggregator, the
+                final regret of each done replica by replica index and the
+                number of replicas still missing
+        '''
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT spec, replica_start, replica_stop, status, result "
+                "FROM units WHERE experiment = ? ORDER BY id",
+                (experiment,)).fetchall()
+        merged = {}
+        for spec, start, stop, status, result in rows:
+            if spec not in merged:
+                merged[spec] = dict(spec=json.loads(spec), aggregator=None,
+                                    final_regrets={}, missing=0)
+            entry = merged[spec]
+            if status != 'done':
+                entry['missing'] += stop - start
+                continue
+            aggregator, final_regrets = unpack_result(result)
+            if entry['aggregator'] is None:
+                entry['aggregator'] = aggregator
+            else:
+                entry['aggregator'].merge(aggregator)
+            entry['final_regrets'].update(zip(range(start, stop),
+                                              final_regrets))
+        return list(merged.values())
+
+
+class _Connection:
+    ''' SQLite connection closed at the end of a with block.
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+    def execute(self, *args):
+        return self.connection.execute(*args)
+
+    def executemany(self, *args):
+        return self.connection.executemany(*args)
+
+    def executescript(self, script):
+        return self.connection.executescript(script)
+
+    def transaction(self):
+        return _Transaction(self.connection)
+
+
+class _Transaction:
+    ''' Write transaction taking the lock of the file as it starts, so that
+    two workers never claim the same unit.
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, *exc_info):
+        self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+def pack_result(aggregator, final_regrets):
+    '''Args:
+            - aggregator (RegretAggregator): aggregate of the replicas of a
+            unit, without quantile sketch
+            - final_regrets (ndarray): final regret of each replica
+        Output:
+            - bytes: the compact result stored in the queue
+    '''
+    buffer = io.BytesIO()
+    np.savez(buffer, best_reward=aggregator.best_reward,
+             rewards_mean=aggregator.rewards.mean,
+             rewards_m2=aggregator.rewards.m2,
+             regret_mean=aggregator.regret.mean,
+             regret_m2=aggregator.regret.m2,
+             final_regrets=np.asarray(final_regrets, dtype=float))
+    return buffer.getvalue()
+
+
+def unpack_result(result):
+    '''Args:
+            - result (bytes): a result packed by pack_result
+        Output:
+            - aggregator (RegretAggregator): aggregate of the replicas
+            - final_regrets (ndarray): final regret of each replica
+    '''
+    arrays = np.load(io.BytesIO(result))
+    final_regrets = arrays['final_regrets']
+    aggregator = RegretAggregator([float(arrays['best_reward'])],
+                                  len(arrays['regret_mean']))
+    for moments, name in ((aggregator.rewards, 'rewards'),
+                          (aggregator.regret, 'regret')):
+        moments.count = len(final_regrets)
+        moments.mean = arrays[name + '_mean']
+        moments.m2 = arrays[name + '_m2']
+    return aggregator, final_regrets
+
+
+def unit_arguments(spec):
+    '''Keyword arguments of the routine of a unit.
+        Args:
+            - spec (dict): scenario, algorithm, alg and grid point of the unit
+        Output:
+            - routine (function): the routine
+            - routine_args (dict): its keyword arguments, alg included
+    '''
+    scenario = dict(spec['scenario'])
+    if spec['algorithm'] == 'mega':
+        scenario['params'] = scenario['mega_params']
+    elif spec['algorithm'] == 'musical_chairs':
+        scenario['params'] = scenario['mc_params']
+    registry.check_alg(spec['algorithm'], spec['alg'])
+    routine = registry.implementation(spec['algorithm'])
+    routine_args = routine_arguments(routine, scenario, spec['point'])
+    if spec['alg'] is not None:
+        routine_args['alg'] = spec['alg']
+    return routine, routine_args
+
+
+def run_unit(unit):
+    '''Runs the replicas of a unit.
+        Args:
+            - unit (dict): a unit claimed from a JobQueue
+        Output:
+            - bytes: its packed result, see pack_result
+    '''
+    routine, routine_args = unit_arguments(unit['spec'])
+    best_arms_mean = np.sort(routine_args['arm_means'])[
+        -routine_args['n_users']:]
+    aggregator = RegretAggregator(best_arms_mean, routine_args['t_horizon'])
+    final_regrets = []
+    for replica in range(unit['replica_start'], unit['replica_stop']):
+        # the stream montecarlo.replica_seeds gives to the replica
+        seed_replica(np.random.SeedSequence(unit['seed'],
+                                            spawn_key=(replica,)))
+        rewards = replica_rewards(routine(**routine_args))
+        aggregator.add(rewards)
+        final_regrets.append(final_regret(rewards, routine_args))
+    return pack_result(aggregator, final_regrets)
+
+
+class _Heartbeat(threading.Thread):
+    ''' Renews the lease of the unit a worker runs.
+    '''
+    def __init__(self, queue, unit_id, worker):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.unit_id = unit_id
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease / 3):
+            self.queue.renew(self.unit_id, self.worker)
+
+
+def work(queue, worker=None, poll=5., exit_when_empty=False, max_units=None):
+    '''Worker daemon: runs the units of the queue one after the other.
+        Args:
+            - queue (JobQueue): the queue
+            - worker (str): name of the worker, host:pid if None
+            - poll (float): seconds between two claims when the queue is
+            empty
+            - exit_when_empty (bool): return once no unit is pending or
+            running instead of waiting for new ones
+            - max_units (int): return after this number of units
+        Output:
+            - int: the number of units run
+    '''
+    if worker is None:
+        worker = '%s:%d' % (socket.gethostname(), os.getpid())
+    n_units = 0
+    while max_units is None or n_units < max_units:
+        unit = queue.claim(worker)
+        if unit is None:
+            progress = queue.progress()
+            if exit_when_empty and not progress['pending']['units'] and \
+                    not progress['running']['units']:
+                break
+            time.sleep(poll)
+            continue
+        heartbeat = _Heartbeat(queue, unit['id'], worker)
+        heartbeat.start()
+        try:
+            result = run_unit(unit)
+        except Exception:
+            queue.fail(unit['id'], worker, traceback.format_exc())
+        else:
+            queue.complete(unit['id'], worker, result)
+        finally:
+            heartbeat.stopped.set()
+        n_units += 1
+    return n_units
+
+
+def summary(queue, experiment, level=0.95):
+    '''Output:
+            - list[dict]: scenario, variant, grid point, number of replicas
+            and statistics of the final regret of each entry of
+            JobQueue.results
+    '''
+    report = []
+    for entry in queue.results(experiment):
+        spec = entry['spec']
+        final_regrets = np.array(list(entry['final_regrets'].values()))
+        report.append({
+            'scenario': spec['scenario']['name'],
+            'variant': spec['variant'],
+            'point': spec['point'],
+            'n_replicas': len(final_regrets),
+            'missing_replicas': entry['missing'],
+            'final_regret_mean': float(final_regrets.mean())
+            if len(final_regrets) else None,
+            'final_regret_ci_width': confidence_width(final_regrets, level),
+        })
+    return report
+
+
+def _print_progress(progress):
+    done, total = progress['done'], {
+        key: sum(progress[status][key] for status in STATUSES)
+        for key in ('units', 'replicas')}
+    print("{}/{} units done ({}/{} replicas), {} pending, {} running on {} "
+          "workers, {} failed".format(
+              done['units'], total['units'], done['replicas'],
+              total['replicas'], progress['pending']['units'],
+              progress['running']['units'], len(progress['workers']),
+              progress['failed']['units']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jobqueue')
+    parser.add_argument('database', help="SQLite file of the queue")
+    parser.add_argument('--lease', type=float, default=300.,
+                        help="seconds before the unit of a silent worker "
+                        "is run again")
+    parser.add_argument('--max-attempts', type=int, default=3)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    submit = commands.add_parser(
+        'submit', help="split the scenarios of a config file in units")
+    submit.add_argument('experiment')
+    submit.add_argument('--config', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'bench',
+        'scenarios.json'), help="json file with the scenario definitions")
+    submit.add_argument('--variants', nargs='+')
+    submit.add_argument('--seed', type=int, default=0)
+    submit.add_argument('--replicas', type=int,
+                        help="replicas per variant, mc_horizon if not set")
+    submit.add_argument('--unit-size', type=int, default=10)
+    submit.add_argument('--grid', type=json.loads,
+                        help="swept parameters, e.g. '{\"c\": [0.1, 0.2]}'")
+
+    worker = commands.add_parser('worker', help="run units until stopped")
+    worker.add_argument('--name', help="name of the worker, host:pid if "
+                        "not set")
+    worker.add_argument('--poll', type=float, default=5.)
+    worker.add_argument('--exit-when-empty', action='store_true')
+
+    progress = commands.add_parser('progress', help="report the progress")
+    progress.add_argument('--experiment')
+    progress.add_argument('--wait', type=float,
+                          help="report every WAIT seconds until no unit is "
+                          "pending or running")
+
+    results = commands.add_parser(
+        'results', help="merge the results of an experiment")
+    results.add_argument('experiment')
+    results.add_argument('--output', help="json file to write them to")
+
+    retry = commands.add_parser('retry', help="run the failed units again")
+    retry.add_argument('--experiment')
+
+    args = parser.parse_args(argv)
+    queue = JobQueue(args.database, lease=args.lease,
+                     max_attempts=args.max_attempts)
+    if args.command == 'submit':
+        from bench.head2head import load_scenarios
+        n_units = queue.submit(args.experiment, load_scenarios(args.config),
+                               variants=args.variants, seed=args.seed,
+                               n_replicas=args.replicas,
+                               unit_size=args.unit_size, grid=args.grid)
+        print("{} units submitted".format(n_units))
+    elif args.command == 'worker':
+        work(queue, worker=args.name, poll=args.poll,
+             exit_when_empty=args.exit_when_empty)
+    elif args.command == 'progress':
+        while True:
+            report = queue.progress(args.experiment)
+            _print_progress(report)
+            if args.wait is None or not (report['pending']['units'] or
+                                         report['running']['units']):
+                break
+            time.sleep(args.wait)
+        for unit_id, status, error in queue.errors(args.experiment):
+            print("unit {} ({}): {}".format(
+                unit_id, status, error.strip().splitlines()[-1]))
+    elif args.command == 'results':
+        report = summary(queue, args.experiment)
+        for entry in report:
+            print("{:<24} {:<16} {} regret {} ({} replicas, {} missing)"
+                  .format(entry['scenario'], entry['variant'],
+                          json.dumps(entry['point']),
+                          entry['final_regret_mean'], entry['n_replicas'],
+                          entry['missing_replicas']))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=4)
+    elif args.command == 'retry':
+        print("{} units put back".format(
+            queue.retry_failed(args.experiment)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
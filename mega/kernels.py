@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+from jit import jit, uniform_pick
+
+# algorithm codes of the kernel
+ALGS = {'eps': 0, 'ucb': 1, 'ts': 2}
+
+
+@jit
+def _masked_argmax(available, stats):
+    '''
+    np.argmax(available * stats) for one user
+    '''
+    best = 0
+    best_value = -np.inf
+    for k in range(stats.shape[0]):
+        value = stats[k] if available[k] else 0.
+        if value > best_value:
+            best, best_value = k, value
+    return best
+
+
+@jit
+def mega_kernel(seed, arm_means, n_users, t_horizon, alg, c, d, alpha, beta,
+                persistence_proba_init):
+    '''
+    time loop of mega_routine with the users stored as arrays
+    Args :
+           - seed (int) seed of the random stream of the kernel
+           - arm_means (np array : n_arms) means of the Bernoulli arms
+           - n_users (int) number of secondary users
+           - t_horizon (int) time steps
+           - alg (int) ALGS code of the algorithm
+           - c, d, alpha, beta, persistence_proba_init (float) mega params
+    Outputs : rewards (np array : n_users x t_horizon) reward of each user
+              collisions (np array : n_users x t_horizon) collision flags
+    '''
+    np.random.seed(seed)
+    n_arms = arm_means.shape[0]
+    persistence_proba = np.full(n_users, persistence_proba_init, dtype=float)
+    # an arm k is available for user i if t >= available_arms[i, k]
+    available_arms = np.zeros((n_users, n_arms))
+    arms_rew = np.zeros((n_users, n_arms))
+    arms_rew_b = np.zeros((n_users, n_arms))
+    draws = np.zeros((n_users, n_arms))
+    collided = np.zeros(n_users, dtype=np.bool_)
+    arm = np.full(n_users, -1, dtype=np.int64)
+    # arm of each user (-1 : no arm) and number of users on each arm
+    occupation = np.full(n_users, -1, dtype=np.int64)
+    occupancy = np.zeros(n_arms, dtype=np.int64)
+    available = np.zeros(n_arms, dtype=np.bool_)
+    stats = np.zeros(n_arms)
+    rewards = np.zeros((n_users, t_horizon))
+    collisions = np.zeros((n_users, t_horizon), dtype=np.uint8)
+    for t in range(1, t_horizon):
+        # update collision status
+        for i in range(n_users):
+            if not collided[i]:
+                # increase its persistence probability
+                persistence_proba[i] = persistence_proba[i] * alpha + alpha
+                continue
+            collisions[i, t-1] = 1
+            if np.random.random() < persistence_proba[i]:
+                # the users persists !
+                continue
+            # the user drops and marks its arm as unavailable
+            persistence_proba[i] = persistence_proba_init
+            available_arms[i, arm[i]] = t + t ** beta * np.random.random()
+            collided[i] = False
+            occupation[i] = -1
+            occupancy[arm[i]] -= 1
+            if occupancy[arm[i]] == 1:
+                for j in range(n_users):
+                    if occupation[j] == arm[i]:
+                        collided[j] = False
+                        break
+
+        # non collided users make a move
+        for i in range(n_users):
+            if collided[i]:
+                continue
+            previous_arm = arm[i]
+            for k in range(n_arms):
+                available[k] = available_arms[i, k] < t
+            if alg == 0:
+                eps = min(1., c * n_arms ** 2 / (d ** 2 * (n_arms - 1) * t))
+                if np.random.random() <= eps:
+                    arm[i] = uniform_pick(available)
+                else:
+                    for k in range(n_arms):
+                        stats[k] = arms_rew[i, k] / max(draws[i, k], 1.)
+                    arm[i] = _masked_argmax(available, stats)
+            elif alg == 1:
+                initialization = False
+                for k in range(n_arms):
+                    if draws[i, k] == 0:
+                        initialization = True
+                if initialization:
+                    # choose uniformly between arms never tried
+                    for k in range(n_arms):
+                        available[k] = available[k] and draws[i, k] == 0
+                    arm[i] = uniform_pick(available)
+                else:
+                    for k in range(n_arms):
+                        stats[k] = arms_rew[i, k] / draws[i, k] + math.sqrt(
+                            math.log(t) / (2 * draws[i, k]))
+                    arm[i] = _masked_argmax(available, stats)
+            else:
+                for k in range(n_arms):
+                    stats[k] = np.random.beta(
+                        arms_rew_b[i, k] + 1,
+                        draws[i, k] - arms_rew_b[i, k] + 1)
+                arm[i] = _masked_argmax(available, stats)
+            # if an arm has changed reset persistence proba
+            if arm[i] != previous_arm:
+                persistence_proba[i] = persistence_proba_init
+            occupation[i] = arm[i]
+
+        # reward and collisions, users without available arm sit out
+        occupancy[:] = 0
+        for i in range(n_users):
+            if occupation[i] >= 0:
+                occupancy[occupation[i]] += 1
+        for i in range(n_users):
+            if occupation[i] < 0:
+                continue
+            if occupancy[occupation[i]] > 1:
+                collided[i] = True
+                continue
+            reward = 0.
+            if np.random.random() < arm_means[arm[i]]:
+                reward = 1.
+            arms_rew[i, arm[i]] += reward
+            if alg == 2:
+                arms_rew_b[i, arm[i]] += reward
+            draws[i, arm[i]] += 1
+            rewards[i, t] = reward
+    return rewards, collisions
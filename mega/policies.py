@@ -0,0 +1,136 @@
+import math
+
+import numpy as np
+
+from jit import jit, uniform_pick
+from online import Policy
+from registry import check_alg
+from .kernels import ALGS, _masked_argmax
+
+# positions of the scalars in the state of a MEGAPolicy
+T, ARM, COLLIDED, PERSISTENCE = range(4)
+# rows of the per-arm statistics
+ARMS_REW, ARMS_REW_B, DRAWS, AVAILABLE_ARMS = range(4)
+
+
+@jit
+def mega_select(scalars, arm_stats, alg, c, d, alpha, beta,
+                persistence_proba_init, stats, available):
+    '''
+    arm of a mega user at its current time step : after a collision it
+    persists on its arm or drops it and marks it as unavailable for a while,
+    as in mega_routine
+    Args :
+           - scalars (np array) the scalars of the state, see T
+           - arm_stats (np array : 4 x n_arms) statistics of the user, see
+           ARMS_REW
+           - alg (int) ALGS code of the algorithm
+           - c, d, alpha, beta, persistence_proba_init (float) mega params
+           - stats, available (np array : n_arms) scratch arrays
+    Outputs : arm (int) the arm to play, -1 if no arm is available
+    '''
+    t = scalars[T]
+    arm = int(scalars[ARM])
+    if not scalars[COLLIDED]:
+        # increase its persistence probability
+        scalars[PERSISTENCE] = scalars[PERSISTENCE] * alpha + alpha
+    elif np.random.random() < scalars[PERSISTENCE]:
+        # the user persists !
+        return arm
+    else:
+        # the user drops and marks its arm as unavailable
+        scalars[PERSISTENCE] = persistence_proba_init
+        arm_stats[AVAILABLE_ARMS, arm] = t + t ** beta * np.random.random()
+        scalars[COLLIDED] = 0.
+    arms_rew = arm_stats[ARMS_REW]
+    draws = arm_stats[DRAWS]
+    n_arms = draws.shape[0]
+    for k in range(n_arms):
+        available[k] = arm_stats[AVAILABLE_ARMS, k] < t
+    previous_arm = arm
+    if alg == 0:
+        eps = min(1., c * n_arms ** 2 / (d ** 2 * (n_arms - 1) * t))
+        if np.random.random() <= eps:
+            arm = uniform_pick(available)
+        else:
+            for k in range(n_arms):
+                stats[k] = arms_rew[k] / max(draws[k], 1.)
+            arm = _masked_argmax(available, stats)
+    elif alg == 1:
+        initialization = False
+        for k in range(n_arms):
+            if draws[k] == 0:
+                initialization = True
+        if initialization:
+            # choose uniformly between arms never tried
+            for k in range(n_arms):
+                available[k] = available[k] and draws[k] == 0
+            arm = uniform_pick(available)
+        else:
+            for k in range(n_arms):
+                stats[k] = arms_rew[k] / draws[k] + math.sqrt(
+                    math.log(t) / (2 * draws[k]))
+            arm = _masked_argmax(available, stats)
+    else:
+        arms_rew_b = arm_stats[ARMS_REW_B]
+        for k in range(n_arms):
+            stats[k] = np.random.beta(arms_rew_b[k] + 1,
+                                      draws[k] - arms_rew_b[k] + 1)
+        arm = _masked_argmax(available, stats)
+    # if an arm has changed reset persistence proba
+    if arm != previous_arm:
+        scalars[PERSISTENCE] = persistence_proba_init
+    scalars[ARM] = arm
+    return arm
+
+
+@jit
+def mega_update(scalars, arm_stats, alg, reward, collided):
+    '''
+    feedback of the arm played at the current time step, a colliding user
+    decides at the next step whether it persists
+    '''
+    arm = int(scalars[ARM])
+    if arm >= 0:
+        # a clean play ends the collision the user persisted through
+        scalars[COLLIDED] = 1. if collided else 0.
+        if not collided:
+            arm_stats[ARMS_REW, arm] += reward
+            if alg == 2 and np.random.random() < reward:
+                # binary rewards of the beta posterior
+                arm_stats[ARMS_REW_B, arm] += 1
+            arm_stats[DRAWS, arm] += 1
+    scalars[T] += 1
+
+
+class MEGAPolicy(Policy):
+    '''
+    MEGA policy of one node : epsilon greedy, UCB or Thompson sampling
+    decisions with persistence on collisions and unavailable arms
+    '''
+    n_scalars = 4
+    n_arm_stats = 4
+
+    def __init__(self, n_arms, params, alg='ucb'):
+        '''
+        Args :
+               - n_arms (int) number of arms
+               - params (dict) c, d, alpha, beta and persistence_proba_init
+               - alg (str) 'eps', 'ucb' or 'ts'
+        '''
+        check_alg('mega', alg)
+        super().__init__(n_arms)
+        self.alg = ALGS[alg]
+        self.params = (params['c'], params['d'], params['alpha'],
+                       params['beta'], params['persistence_proba_init'])
+        # mega_routine starts at t = 1
+        self.scalars[T] = 1
+        self.scalars[ARM] = -1
+        self.scalars[PERSISTENCE] = params['persistence_proba_init']
+
+    def select(self):
+        return mega_select(self.scalars, self.arm_stats, self.alg,
+                           *self.params, self.stats, self.taken)
+
+    def update(self, reward, collided):
+        mega_update(self.scalars, self.arm_stats, self.alg, reward, collided)
@@ -1,36 +1,131 @@
 import numpy as np
 import random
 
-from arms import ArmBernoulli
-from .users import SecondaryUser, UCBUser, TSUser
+from arms import ArmBernoulli, ArmBank
+from checkpoint import resize, routine_args
+from collisions import arm_occupancy, collided_users
+from jit import run_kernel, use_jit
+from profiling import NULL_PROFILE, as_profile, with_profile
+from registry import check_alg, user_class
+from streaming import chunked, time_steps
+from tapes import tape_arms
+from thompson import thompson_choices
+from . import kernels
 
 
-def mega_routine(n_users, params, n_arms, t_horizon, arm_means, alg='ucb'):
+def mega_routine(n_users, params, n_arms, t_horizon, arm_means, alg='ucb',
+                 checkpoint=None, backend='numpy', profile=False, tape=None):
+    '''
+    MEGA simulation
+    Args :
+           - n_users (int) number of secondary users
+           - params (dict) c, d, alpha, beta and persistence_proba_init
+           - n_arms (int) number of arms
+           - t_horizon (int) time steps
+           - arm_means (list) means of the Bernoulli arms
+           - alg (str) 'eps', 'ucb' or 'ts'
+           - checkpoint (Checkpoint) where the run is saved. If it exists
+           the run resumes from it, possibly up to a longer horizon
+           - backend (str) 'numpy', or 'jit_distributional' to run the time
+           loop in a kernel compiled with numba, which only matches the numpy
+           routine in distribution, see jit.py
+           - profile (bool or Profile) accumulate the wall time and calls of
+           the phases of the steps, see profiling.py
+           - tape (RewardTape) rewards of the successive pulls of each arm,
+           shared with the other algorithms of a replica, see tapes.py. A
+           resumed run must be given the same tape
+    Outputs : rewards (np array : n_users x t_horizon) reward of each user
+              collisions (np array : n_users x t_horizon) collision flags
+              profile (Profile) only if profile is enabled, the routine
+              then returns ((rewards, collisions), profile)
+    '''
+    check_alg('mega', alg)
+    profile = as_profile(profile)
+    if use_jit(backend, checkpoint=checkpoint, tape=tape):
+        with profile.phase('kernel'):
+            output = run_kernel(
+                kernels.mega_kernel,
+                np.asarray(arm_means[:n_arms], dtype=float), n_users,
+                t_horizon, kernels.ALGS[alg], params['c'], params['d'],
+                params['alpha'], params['beta'],
+                params['persistence_proba_init'])
+        return with_profile(output, profile)
+    args = routine_args(arm_means, n_users=n_users, n_arms=n_arms, alg=alg,
+                        params=dict(params))
+    state = checkpoint.load('mega', args) if checkpoint is not None else None
+    if state is not None:
+        arms = state['arms'] if tape is None else \
+            tape_arms(tape, arm_means, len(arm_means), state['arms'])
+        return with_profile(_mega_loop(
+            state['users'], arms,
+            resize(state['rewards'], t_horizon),
+            resize(state['collisions'], t_horizon), state['occupation'],
+            state['occupancy'], state['t'], checkpoint, args, profile),
+            profile)
 
-    arms = [ArmBernoulli(mean) for mean in arm_means]
+    if tape is None:
+        arms = [ArmBernoulli(mean) for mean in arm_means]
+    else:
+        arms = tape_arms(tape, arm_means, len(arm_means))
 
-    algMap = {
-        "ucb": UCBUser,
-        "ts": TSUser,
-        "eps": SecondaryUser
-    }
-    if alg not in algMap:
-        print("alg must be one of", algMap.keys())
-    users = [algMap[alg](n_arms, params) for i in range(n_users)]
+    user = user_class('mega', alg)
+    users = [user(n_arms, params) for i in range(n_users)]
     # global statistics
     rewards = np.zeros((n_users, t_horizon))
     collisions = np.zeros((n_users, t_horizon), dtype=np.uint8)
-    occupation = np.zeros(n_users)
-    # main loop
-    for t in range(1, t_horizon):
-        # update collision status
+    # arm of each user (-1 : no arm) and number of users on each arm
+    occupation = np.full(n_users, -1)
+    occupancy = np.zeros(n_arms, dtype='int')
+    return with_profile(_mega_loop(users, arms, rewards, collisions,
+                                   occupation, occupancy, 1, checkpoint,
+                                   args, profile), profile)
+
+
+def _mega_loop(users, arms, rewards, collisions, occupation, occupancy,
+               t_start, checkpoint, args, profile=NULL_PROFILE):
+    '''
+    main loop of mega_routine, from t_start to the end of rewards
+    '''
+    t_horizon = rewards.shape[1]
+
+    def save(t):
+        checkpoint.save(dict(routine='mega', args=args, t=t, arms=arms,
+                             users=users, occupation=occupation,
+                             occupancy=occupancy, rewards=rewards[:, :t],
+                             collisions=collisions[:, :t]))
+
+    for t in range(t_start, t_horizon):
+        rewards[:, t], collisions[:, t-1], occupancy = _mega_step(
+            users, arms, occupation, occupancy, t, profile)
+        if checkpoint is not None and checkpoint.due(t):
+            with profile.phase('checkpoint'):
+                save(t + 1)
+    if checkpoint is not None and t_horizon > t_start:
+        with profile.phase('checkpoint'):
+            save(t_horizon)
+    return rewards, collisions
+
+
+def _mega_step(users, arms, occupation, occupancy, t, profile=NULL_PROFILE):
+    '''
+    play the time step t of mega_routine, occupation is updated in place and
+    the cost of the phases is accumulated in profile
+    Outputs : rewards (np array : n_users) reward of each user at t
+              collisions (np array : n_users) users marked as collided at t-1
+              occupancy (np array : n_arms) number of users on each arm
+    '''
+    n_arms = occupancy.shape[0]
+    collisions = np.zeros(len(users), dtype=np.uint8)
+    rewards = np.zeros(len(users))
+    # update collision status
+    with profile.phase('persistence'):
         for i, user in enumerate(users):
             if not user.collided:
                 # increase its persistence probability
                 user.persistence_proba *= user.params['alpha']
                 user.persistence_proba += user.params['alpha']
             else:
-                collisions[i, t-1] = 1
+                collisions[i] = 1
                 if random.random() < user.persistence_proba:
                     # the users persists !
                     user.previous_arm = user.arm
@@ -44,21 +139,205 @@ def mega_routine(n_users, params, n_arms, t_horizon, arm_means, alg='ucb'):
                     # check if conflict is resolved
                     user.collided = False
                     occupation[i] = -1
-                    if (occupation == user.arm).sum() == 1:
-                        users[np.where(
-                            occupation == user.arm)[0][0]].collided = False
+                    occupancy[user.arm] -= 1
+                    if occupancy[user.arm] == 1:
+                        users[np.flatnonzero(
+                            occupation == user.arm)[0]].collided = False
 
-        # non collided users make a move
+    # non collided users make a move
+    with profile.phase('decisions'):
         for i, user in enumerate(users):
             if not user.collided:
                 # update users whishes
                 occupation[i] = user.decision(t)
 
-        # reward and collisions
-        for i, user in enumerate(users):
-            if (occupation == user.arm).sum() > 1:
-                user.collided = True
+    # reward and collisions, users without available arm sit out
+    with profile.phase('collisions'):
+        occupancy, collided = collided_users(occupation, n_arms)
+        for i in np.flatnonzero(collided):
+            users[i].collided = True
+    drawing = np.flatnonzero(~collided & (occupation >= 0))
+    with profile.phase('draws'):
+        for i in drawing:
+            rewards[i] = arms[users[i].arm].draw()
+    with profile.phase('updates'):
+        for i in drawing:
+            users[i].update(rewards[i])
+    return rewards, collisions, occupancy
 
-            else:
-                rewards[i, t] = user.draw_from_arm(arms[user.arm])
+
+def mega_stream(n_users, params, n_arms, arm_means, t_horizon=None,
+                alg='ucb', chunk_size=1000):
+    '''
+    MEGA simulation played step by step, the results being handed out in
+    chunks as the run goes instead of at the end of the horizon. The
+    collision flags of a step are only known at the next step, a chunk is
+    thus handed out one step after its last reward.
+    Args :
+           - n_users (int) number of secondary users
+           - params (dict) c, d, alpha, beta and persistence_proba_init
+           - n_arms (int) number of arms
+           - arm_means (list) means of the Bernoulli arms
+           - t_horizon (int) time steps, endless run if None
+           - alg (str) 'eps', 'ucb' or 'ts'
+           - chunk_size (int) number of time steps per chunk
+    Outputs : chunks (generator) yields (t_start, rewards, collisions), the
+              columns t_start to t_start + chunk_size of the mega_routine
+              outputs (np arrays : n_users x chunk_size)
+    '''
+    user = user_class('mega', alg)
+    arms = [ArmBernoulli(mean) for mean in arm_means]
+    users = [user(n_arms, params) for i in range(n_users)]
+
+    def steps():
+        occupation = np.full(n_users, -1)
+        occupancy = np.zeros(n_arms, dtype='int')
+        # the first step is not played
+        rewards = np.zeros(n_users)
+        for t in time_steps(t_horizon, 1):
+            next_rewards, collisions, occupancy = _mega_step(
+                users, arms, occupation, occupancy, t)
+            yield rewards, collisions
+            rewards = next_rewards
+        if t_horizon is not None and t_horizon > 0:
+            yield rewards, np.zeros(n_users, dtype=np.uint8)
+
+    return chunked(steps(), chunk_size)
+
+
+def _uniform_choice(mask):
+    '''
+    choose uniformly one True entry per row of *mask*
+    Args :
+           - mask (np array : n_users x n_arms) arms that can be chosen
+    Outputs : choices (np array : n_users) chosen arm, -1 for empty rows
+    '''
+    keys = np.random.random(mask.shape)
+    keys[~mask] = -1
+    choices = np.argmax(keys, axis=1)
+    choices[~mask.any(axis=1)] = -1
+    return choices
+
+
+def mega_array_routine(n_users, params, n_arms, t_horizon, arm_means,
+                       alg='ucb'):
+    '''
+    MEGA simulation where the whole population is stored as dense arrays
+    (persistence probabilities, arms availability, draws and rewards sums)
+    updated with masked vector operations, so that a step costs O(U * K)
+    instead of O(U^2) for mega_routine.
+    Args :
+           - n_users (int) number of secondary users
+           - params (dict) c, d, alpha, beta and persistence_proba_init
+           - n_arms (int) number of arms
+           - t_horizon (int) time steps
+           - arm_means (list) means of the Bernoulli arms
+           - alg (str) 'eps', 'ucb' or 'ts'
+    Outputs : rewards (np array : n_users x t_horizon) reward of each user
+              collisions (np array : n_users x t_horizon) collision flags
+    '''
+    check_alg('mega', alg)
+    arms = ArmBank.bernoulli(arm_means[:n_arms])
+    alpha = params['alpha']
+    p_init = params['persistence_proba_init']
+    user_ids = np.arange(n_users)
+    # users statistics
+    persistence_proba = np.full(n_users, p_init, dtype=float)
+    # an arm k is available for user i if t >= available_arms[i, k]
+    available_arms = np.zeros((n_users, n_arms))
+    arms_rew = np.zeros((n_users, n_arms))
+    draws = np.zeros((n_users, n_arms), dtype='int')
+    collided = np.zeros(n_users, dtype=bool)
+    # current arm of each user (-1 : no arm) and number of users on each arm
+    occupation = np.full(n_users, -1)
+    occupation_count = np.zeros(n_arms, dtype='int')
+    # global statistics
+    rewards = np.zeros((n_users, t_horizon))
+    collisions = np.zeros((n_users, t_horizon), dtype=np.uint8)
+    for t in range(1, t_horizon):
+        # update collision status. Users are processed in index order in
+        # mega_routine: when drops leave a single user on an arm, this user
+        # is released and, if it comes last, it is not even considered as
+        # collided. Both cases only depend on per arm counts.
+        persists = collided & (np.random.random(n_users) <
+                               persistence_proba)
+        if collided.any():
+            collided_ids = user_ids[collided]
+            collided_arms = occupation[collided]
+            group_size = np.bincount(collided_arms, minlength=n_arms)
+            last_user = np.full(n_arms, -1)
+            np.maximum.at(last_user, collided_arms, collided_ids)
+            is_last = np.zeros(n_users, dtype=bool)
+            is_last[last_user[group_size > 0]] = True
+            first_drops = np.bincount(
+                occupation[collided & ~persists & ~is_last],
+                minlength=n_arms)
+            n_persists = np.bincount(occupation[persists], minlength=n_arms)
+            # the last user sees every other user drop before its turn
+            released_early = is_last & (
+                first_drops[np.maximum(occupation, 0)] ==
+                group_size[np.maximum(occupation, 0)] - 1)
+            collided &= ~released_early
+            persists &= ~released_early
+            # a single user persisted on its arm, it is released afterwards
+            released_late = persists & (
+                n_persists[np.maximum(occupation, 0)] == 1)
+        else:
+            released_late = np.zeros(n_users, dtype=bool)
+        # increase the persistence probability of non collided users
+        persistence_proba[~collided] *= alpha
+        persistence_proba[~collided] += alpha
+        collisions[collided, t-1] = 1
+        # the users drop
+        drops = collided & ~persists
+        if drops.any():
+            persistence_proba[drops] = p_init
+            # mark arm as unavailable
+            available_arms[drops, occupation[drops]] = t + \
+                t**params['beta'] * np.random.random(drops.sum())
+            occupation_count -= arm_occupancy(occupation[drops], n_arms)
+            occupation[drops] = -1
+        collided &= persists & ~released_late
+
+        # non collided users make a move
+        movers = ~collided
+        available = available_arms[movers] < t
+        if alg == 'eps':
+            eps = min(1, params['c'] * (n_arms ** 2) / (
+                params['d']**2 * (n_arms - 1) * t))
+            explore = np.random.random(movers.sum()) <= eps
+            empirical_m = arms_rew[movers] / np.maximum(draws[movers], 1)
+            choices = np.where(explore, _uniform_choice(available),
+                               np.argmax(available * empirical_m, axis=1))
+        elif alg == 'ucb':
+            mover_draws = draws[movers]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                stats = arms_rew[movers] / mover_draws + np.sqrt(
+                    np.log(t) / (2 * mover_draws))
+            initializing = mover_draws.min(axis=1) == 0
+            choices = np.where(initializing,
+                               _uniform_choice(available & (mover_draws == 0)),
+                               np.argmax(available * stats, axis=1))
+        else:
+            # Bernoulli rewards : arms_rew already counts the successes
+            choices = thompson_choices(arms_rew[movers], draws[movers],
+                                       available=available)
+        # if an arm has changed reset persistence proba
+        previous = occupation[movers]
+        changed = movers.copy()
+        changed[movers] = choices != previous
+        persistence_proba[changed] = p_init
+        occupation_count -= arm_occupancy(previous, n_arms)
+        occupation_count += arm_occupancy(choices, n_arms)
+        occupation[movers] = choices
+
+        # reward and collisions
+        on_arm = occupation >= 0
+        collided = on_arm & (occupation_count[occupation] > 1)
+        winners = on_arm & ~collided
+        winner_arms = occupation[winners]
+        reward = arms.draw(winner_arms)
+        rewards[winners, t] = reward
+        arms_rew[winners, winner_arms] += reward
+        draws[winners, winner_arms] += 1
     return rewards, collisions
@@ -1,6 +1,8 @@
 import numpy as np
 import random
 
+from thompson import thompson_choices
+
 
 class SecondaryUser:
     """
@@ -63,9 +65,17 @@ class SecondaryUser:
         Outputs : reward (int) the actual reward
         '''
         reward = arm.draw()
+        self.update(reward)
+        return reward
+
+    def update(self, reward):
+        '''
+        updates the statistics of the user with the reward of its arm
+        Args :
+               - reward (float) the reward obtained
+        '''
         self.arms_rew[self.arm] += reward
         self.draws[self.arm] += 1
-        return reward
 
 
 class UCBUser(SecondaryUser):
@@ -130,9 +140,8 @@ class TSUser(SecondaryUser):
         available_arms = self.available_arms < t
 
         # thompson sampling stat
-        stats = np.random.beta(self.arms_rew_b + 1,
-                               self.draws - self.arms_rew_b + 1)
-        self.arm = np.argmax(available_arms * stats)
+        self.arm = thompson_choices(self.arms_rew_b, self.draws,
+                                    available=available_arms)
 
         # if an arm has changed reset persistence proba
         if self.arm != self.previous_arm:
@@ -147,7 +156,15 @@ class TSUser(SecondaryUser):
         Outputs : reward (float) the actual reward
         '''
         reward = arm.draw()
+        self.update(reward)
+        return reward
+
+    def update(self, reward):
+        '''
+        updates the statistics of the user with the reward of its arm
+        Args :
+               - reward (float) the reward obtained
+        '''
         self.arms_rew[self.arm] += reward
         self.arms_rew_b[self.arm] += (random.random() < reward)
         self.draws[self.arm] += 1
-        return reward
@@ -0,0 +1,346 @@
+import multiprocessing
+import random
+import statistics
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from profiling import without_profile
+from tapes import RewardTape
+
+# state of a worker process: the shared result array it writes into
+_worker = {}
+
+
+def replica_rewards(output):
+    '''Converts the output of a routine to the total reward at each time step.
+        Args:
+            - output: what tdfs_routine, rho_rand_routine, mc_routine
+            (total_rewards) or mega_routine ((rewards, collisions)) return,
+            possibly paired with a profile
+        Output:
+            - ndarray: (t_horizon,) total reward at each time step
+    '''
+    output = without_profile(output)
+    if isinstance(output, tuple):
+        return np.sum(output[0], axis=0)
+    if np.ndim(output) == 0:
+        raise ValueError("the routine only returned the sum of its rewards, "
+                         "e.g. mc_vectorized_routine with aggregate=True, "
+                         "the replicas need the reward at each time step")
+    return np.ravel(output)
+
+
+def seed_replica(seed_sequence):
+    '''Seeds the global random and np.random states used by the routines
+    from the stream of a replica.
+        Args:
+            - seed_sequence (np.random.SeedSequence): stream of the replica
+    '''
+    np.random.seed(seed_sequence.generate_state(4))
+    random.seed(int(seed_sequence.generate_state(1, dtype=np.uint64)[0]))
+
+
+def replica_seeds(seed, n_replicas):
+    '''Spawns one independent stream per replica from a master seed.
+        Args:
+            - seed (int or None): the master seed
+            - n_replicas (int): number of replicas
+        Output:
+            - list[np.random.SeedSequence]: the streams of the replicas
+    '''
+    return np.random.SeedSequence(seed).spawn(n_replicas)
+
+
+def _replica_child(seed_sequence, child):
+    # child of the stream of a replica, without spawning from it
+    return np.random.SeedSequence(
+        seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (child,))
+
+
+def replica_tape(seed_sequence, arm_means):
+    '''Reward tape of a replica, the same for every routine run on the
+    replica so that their results are paired (common random numbers).
+        Args:
+            - seed_sequence (np.random.SeedSequence): stream of the replica
+            - arm_means (list[float]): the means of the arms
+        Output:
+            - RewardTape: the rewards of the pulls of the arms
+    '''
+    return RewardTape(arm_means, _replica_child(seed_sequence, 0))
+
+
+def replica_decisions(seed_sequence):
+    '''Stream of the random decisions of the routines run on a replica with
+    common random numbers, apart from the rewards of its tape: every routine
+    seeds random and np.random from it, so that they draw the same offsets,
+    ranks and explorations for as long as their trajectories agree.
+        Args:
+            - seed_sequence (np.random.SeedSequence): stream of the replica
+        Output:
+            - np.random.SeedSequence: the stream to give to seed_replica
+    '''
+    return _replica_child(seed_sequence, 1)
+
+
+def paired_gap(regrets, reference):
+    '''Difference between the regrets of two algorithms run on the same
+    replicas.
+        Args:
+            - regrets (ndarray): (n_replicas,) final regret of each replica
+            - reference (ndarray): (n_replicas,) final regret of the
+            reference algorithm on the same replicas
+        Output:
+            - mean (float): mean of regrets - reference
+            - stderr (float): standard error of the mean, see
+            variance_reduction for what the pairing saves
+    '''
+    gaps = np.asarray(regrets, dtype=float) - np.asarray(reference,
+                                                         dtype=float)
+    if len(gaps) < 2:
+        return float(gaps.mean()), float('nan')
+    return float(gaps.mean()), float(gaps.std(ddof=1) / np.sqrt(len(gaps)))
+
+
+def variance_reduction(regrets, reference):
+    '''Share of the variance of the gap between two algorithms removed by
+    running them on common random numbers.
+        Args:
+            - regrets, reference (ndarray): (n_replicas,) final regrets of
+            the two algorithms on the same replicas
+        Output:
+            - float: 1 - var(regrets - reference) / (var(regrets) +
+            var(reference)), about 0 for independent replicas. The shared
+            rewards and decisions pair close variants of an algorithm, e.g.
+            about 60% for mega eps with c = 0.1 and 0.08, but different
+            algorithms soon draw the shared streams in another order: on the
+            scenarios of bench the reduction against tdfs ucb ranges from 0
+            to 55%, around 10% for most variants.
+    '''
+    regrets = np.asarray(regrets, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    if len(regrets) < 2:
+        return float('nan')
+    unpaired = regrets.var(ddof=1) + reference.var(ddof=1)
+    if unpaired == 0:
+        return 0.
+    return float(1 - (regrets - reference).var(ddof=1) / unpaired)
+
+
+def _attach(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker['shm'] = shm
+    _worker['results'] = np.ndarray(shape, dtype=float, buffer=shm.buf)
+
+
+def _run_replica(job, results):
+    routine, routine_args, replica, seed_sequence, common = job
+    if common:
+        seed_replica(replica_decisions(seed_sequence))
+        routine_args = dict(routine_args, tape=replica_tape(
+            seed_sequence, routine_args['arm_means']))
+    else:
+        seed_replica(seed_sequence)
+    results[replica] = replica_rewards(routine(**routine_args))
+    return replica
+
+
+def _run_shared_replica(job):
+    return _run_replica(job, _worker['results'])
+
+
+def _stream_replica(job):
+    results = {}
+    replica = _run_replica(job, results)
+    return replica, results[replica]
+
+
+def stream_replicas(routine, routine_args, n_replicas, seed=None,
+                    n_workers=None, common_random_numbers=False):
+    '''Runs the replicas of a routine like run_replicas but yields each
+    replica as soon as it finishes, so that it can be aggregated without
+    keeping all the replicas in memory.
+        Args:
+            - routine (function): tdfs_routine, rho_rand_routine,
+            mega_routine or mc_routine
+            - routine_args (dict): the keyword arguments of the routine
+            - n_replicas (int): number of replicas
+            - seed (int): the master seed, a random one is used if None
+            - n_workers (int): number of processes, all the cores if None
+            - common_random_numbers (bool): see run_replicas
+        Output:
+            - generator of (replica, rewards): the index of a replica and its
+            (t_horizon,) total reward at each time step
+    '''
+    seeds = replica_seeds(seed, n_replicas)
+    jobs = [(routine, routine_args, replica, seeds[replica],
+             common_random_numbers) for replica in range(n_replicas)]
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    n_workers = min(n_workers, n_replicas)
+    if n_workers <= 1:
+        for job in jobs:
+            yield _stream_replica(job)
+        return
+    with multiprocessing.Pool(n_workers) as pool:
+        for result in pool.imap_unordered(_stream_replica, jobs):
+            yield result
+
+
+def run_replicas(routine, routine_args, n_replicas, seed=None,
+                 n_workers=None, common_random_numbers=False):
+    '''Runs n_replicas independent replicas of a routine over a process pool.
+    Every replica is seeded from its own stream spawned from the master seed,
+    so the results do not depend on the number of workers.
+        Args:
+            - routine (function): tdfs_routine, rho_rand_routine,
+            mega_routine or mc_routine
+            - routine_args (dict): the keyword arguments of the routine, it
+            must contain t_horizon
+            - n_replicas (int): number of replicas
+            - seed (int): the master seed, a random one is used if None
+            - n_workers (int): number of processes, all the cores if None.
+            With 1 worker the replicas run in the current process.
+            - common_random_numbers (bool): the arms of each replica read a
+            RewardTape keyed by its stream and the decisions draw from
+            replica_decisions, so that the replica r of two routines run with
+            the same seed and arm means share their rewards and random
+            decisions, see paired_gap
+        Output:
+            - rewards (ndarray): (n_replicas, t_horizon) total reward at each
+            time step of each replica
+    '''
+    shape = (n_replicas, routine_args['t_horizon'])
+    seeds = replica_seeds(seed, n_replicas)
+    jobs = [(routine, routine_args, replica, seeds[replica],
+             common_random_numbers) for replica in range(n_replicas)]
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    n_workers = min(n_workers, n_replicas)
+    if n_workers <= 1:
+        rewards = np.zeros(shape)
+        for job in jobs:
+            _run_replica(job, rewards)
+        return rewards
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(int(np.prod(shape)), 1) * 8)
+    try:
+        with multiprocessing.Pool(n_workers, initializer=_attach,
+                                  initargs=(shm.name, shape)) as pool:
+            for _ in pool.imap_unordered(_run_shared_replica, jobs):
+                pass
+        rewards = np.ndarray(shape, dtype=float, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return rewards
+
+
+def final_regret(rewards, routine_args):
+    '''Args:
+            - rewards (ndarray): (t_horizon,) total reward at each time step
+            - routine_args (dict): the keyword arguments of the routine, with
+            n_users and arm_means
+        Output:
+            - float: the cumulative regret at the horizon
+    '''
+    best_arms_mean = np.sort(routine_args['arm_means'])[
+        -routine_args['n_users']:]
+    return float(len(rewards) * np.sum(best_arms_mean) - np.sum(rewards))
+
+
+def confidence_width(values, level=0.95):
+    '''Width of the normal confidence interval on the mean of values.
+        Args:
+            - values (ndarray): the observations, one per replica
+            - level (float): the confidence level
+        Output:
+            - float: the width of the interval, inf with less than 2 values
+    '''
+    if len(values) < 2:
+        return float('inf')
+    z = statistics.NormalDist().inv_cdf((1 + level) / 2)
+    return float(2 * z * np.std(values, ddof=1) / np.sqrt(len(values)))
+
+
+def _run_final_regret(job):
+    routine, routine_args, replica, seed_sequence, reference = job
+    results = {}
+    _run_replica((routine, routine_args, replica, seed_sequence,
+                  reference is not None), results)
+    regret = final_regret(results[replica], routine_args)
+    if reference is None:
+        return regret
+    # same stream and same reward tape as the routine
+    reference_routine, reference_args = reference
+    _run_replica((reference_routine, reference_args, replica, seed_sequence,
+                  True), results)
+    return regret - final_regret(results[replica], reference_args)
+
+
+def run_until(routine, routine_args, width, level=0.95, reference=None,
+              min_replicas=10, max_replicas=1000, batch_size=10, seed=None,
+              n_workers=None):
+    '''Runs replicas of a routine until the confidence interval on the mean
+    final regret, or on the mean gap to a reference routine, is narrower
+    than width, or until max_replicas replicas have run.
+    The replicas run by batches of batch_size and are seeded like the ones of
+    run_replicas, so the replicas used only depend on the seed and on the
+    batch size, not on the number of workers.
+        Args:
+            - routine (function): tdfs_routine, rho_rand_routine,
+            mega_routine or mc_routine
+            - routine_args (dict): the keyword arguments of the routine, with
+            n_users and arm_means
+            - width (float): the target width of the confidence interval
+            - level (float): the confidence level of the interval
+            - reference ((function, dict)): a routine and its keyword
+            arguments, the gap regret - reference regret is estimated
+            instead of the regret. Both run on the same reward tape in each
+            replica (common random numbers), see paired_gap.
+            - min_replicas (int): replicas run before the first check
+            - max_replicas (int): the budget of replicas
+            - batch_size (int): replicas run between two checks
+            - seed (int): the master seed, a random one is used if None
+            - n_workers (int): number of processes, all the cores if None
+        Output:
+            - dict: mean, lower and upper bounds of the interval, its width,
+            the number of replicas used, whether the target width was
+            reached and the final regret (or gap) of each replica
+    '''
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    n_workers = min(n_workers, max_replicas)
+    seeds = replica_seeds(seed, max_replicas)
+    values = []
+    pool = multiprocessing.Pool(n_workers) if n_workers > 1 else None
+    try:
+        while len(values) < max_replicas:
+            n_replicas = len(values)
+            n_new = max(min_replicas - n_replicas, batch_size, 1)
+            jobs = [(routine, routine_args, replica, seeds[replica],
+                     reference)
+                    for replica in range(n_replicas, min(
+                        n_replicas + n_new, max_replicas))]
+            values.extend(pool.map(_run_final_regret, jobs)
+                          if pool is not None else
+                          map(_run_final_regret, jobs))
+            if len(values) >= min_replicas and \
+                    confidence_width(values, level) <= width:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    values = np.array(values)
+    achieved = confidence_width(values, level)
+    mean = float(values.mean())
+    return {
+        'mean': mean,
+        'lower': mean - achieved / 2,
+        'upper': mean + achieved / 2,
+        'width': achieved,
+        'n_replicas': len(values),
+        'converged': achieved <= width,
+        'values': values,
+    }
@@ -0,0 +1,90 @@
+import numpy as np
+
+from jit import jit, best_arms
+
+
+@jit
+def _draw(arm_means, arms_rew, draws, i, arm):
+    reward = 0.
+    if np.random.random() < arm_means[arm]:
+        reward = 1.
+    draws[i, arm] += 1
+    arms_rew[i, arm] += reward
+    return reward
+
+
+@jit
+def mc_kernel(seed, arm_means, n_users, t_horizon, t0, t1):
+    ''' Time loop of mc_routine with the users stored as arrays.
+        Args:
+            - seed (int): seed of the random stream of the kernel.
+            - arm_means (ndarray): (n_arms) means of the Bernoulli arms.
+            - n_users (int): number of users.
+            - t_horizon (int): time steps.
+            - t0 (int): exploring phase.
+            - t1 (int): exploiting phase.
+        Output:
+            - total_rewards (ndarray): total reward at each time step.
+            - collisions (ndarray): (t_horizon, n_users) collision flags.
+    '''
+    np.random.seed(seed)
+    n_arms = arm_means.shape[0]
+    arms_rew = np.zeros((n_users, n_arms))
+    draws = np.zeros((n_users, n_arms))
+    top_arms = np.zeros((n_users, n_users), dtype=np.int64)
+    fixed_on_arm = np.zeros(n_users, dtype=np.bool_)
+    arm_id = np.full(n_users, -1, dtype=np.int64)
+    choices = np.zeros(n_users, dtype=np.int64)
+    occupancy = np.zeros(n_arms, dtype=np.int64)
+    stats = np.zeros(n_arms)
+    taken = np.zeros(n_arms, dtype=np.bool_)
+    total_rewards = np.zeros(t_horizon)
+    collisions = np.zeros((t_horizon, n_users), dtype=np.uint8)
+    t_temp = 0
+    for t in range(t_horizon):
+        # phase 1: exploring the arms in order to rank them.
+        if t_temp < t0:
+            occupancy[:] = 0
+            for i in range(n_users):
+                choices[i] = int(np.random.random() * n_arms)
+                occupancy[choices[i]] += 1
+            for i in range(n_users):
+                if occupancy[choices[i]] > 1:
+                    collisions[t, i] = 1
+                else:
+                    arm_id[i] = choices[i]
+                    total_rewards[t] += _draw(arm_means, arms_rew, draws, i,
+                                              choices[i])
+            t_temp += 1
+        # rank arms when we reach t0 steps, unexplored arms rank first
+        if t_temp == t0:
+            for i in range(n_users):
+                for k in range(n_arms):
+                    if draws[i, k] == 0:
+                        stats[k] = np.inf
+                    else:
+                        stats[k] = arms_rew[i, k] / draws[i, k]
+                best_arms(stats, n_users, top_arms[i], taken)
+        # phase 2 once all the players are fixed on an arm.
+        if t_temp < t1 and t_temp >= t0:
+            occupancy[:] = 0
+            for i in range(n_users):
+                if not fixed_on_arm[i]:
+                    choices[i] = top_arms[i, int(np.random.random() *
+                                                 n_users)]
+                else:
+                    choices[i] = arm_id[i]
+                occupancy[choices[i]] += 1
+            for i in range(n_users):
+                if occupancy[choices[i]] > 1:
+                    collisions[t, i] = 1
+                else:
+                    arm_id[i] = choices[i]
+                    fixed_on_arm[i] = True
+                    total_rewards[t] += _draw(arm_means, arms_rew, draws, i,
+                                              choices[i])
+            t_temp += 1
+        if t_temp == t1:
+            t_temp = 0
+            fixed_on_arm[:] = False
+    return total_rewards, collisions
@@ -1,13 +1,22 @@
 import numpy as np
 import random
-import collections
 import math
 
-from arms import ArmBernoulli
+from arms import ArmBernoulli, ArmBank
+from checkpoint import resize, routine_args
+from collisions import collided_users
+from jit import run_kernel, use_jit
+from profiling import NULL_PROFILE, as_profile, with_profile
+from ranking import top_m
+from streaming import chunked, time_steps
+from tapes import tape_arms
+from . import kernels
 from .users import SecondaryUser
 
 
-def mc_routine(n_users, params, n_arms, t_horizon, arm_means):
+def mc_routine(n_users, params, n_arms, t_horizon, arm_means,
+               checkpoint=None, backend='numpy', profile=False,
+               tape=None):
     ''' Apply muscial chairs algorithm to a pb with t_horizon time steps.
         Args:
             - n_users (int): number of users.
@@ -15,61 +24,269 @@ def mc_routine(n_users, params, n_arms, t_horizon, arm_means):
             - params (dict): t0 - exploring phase / t1 - exploiting phase
             - t_horizon (int): time steps.
             - arm_means (ndarray): means of the arms.
+            - checkpoint (Checkpoint): where the run is saved. If it exists
+            the run resumes from it, possibly up to a longer horizon.
+            - backend (str): 'numpy', or 'jit_distributional' to run the
+            time loop in a kernel compiled with numba, which only matches the
+            numpy routine in distribution, see jit.py.
+            - profile (bool or Profile): accumulate the wall time and calls
+            of the phases of the steps, see profiling.py.
+            - tape (RewardTape): rewards of the successive pulls of each
+            arm, shared with the other algorithms of a replica, see tapes.py.
+            A resumed run must be given the same tape.
         Output:
             - total_rewards (ndarray): total reward at each time step.
+            - profile (Profile): only if profile is enabled.
     '''
-    arms = list()
-    for i in range(n_arms):
-        arms.append(ArmBernoulli(arm_means[i]))
-    users = [SecondaryUser(n_arms, n_users, t_horizon) for i in range(n_users)]
-    total_rewards = np.zeros((t_horizon, 1))
     if t_horizon < params["t1"]:
         raise ValueError("horizon must be at least t1")
-    # t_sequence in [0;t0+t1]. if t_temp<t0 --> exploration phase.
-    # if t0<t_temp<t1 --> eploitation phase.
-    t_temp = 0
-    for t in range(t_horizon):
-        # phase 1: exploring the arms in order to rank them.
-        if t_temp < params["t0"]:
+    profile = as_profile(profile)
+    if use_jit(backend, checkpoint=checkpoint, tape=tape, n_users=n_users,
+               n_arms=n_arms):
+        with profile.phase('kernel'):
+            total_rewards, _ = run_kernel(
+                kernels.mc_kernel,
+                np.asarray(arm_means[:n_arms], dtype=float), n_users,
+                t_horizon, params["t0"], params["t1"])
+        return with_profile(total_rewards[:, None], profile)
+    args = routine_args(arm_means, n_users=n_users, n_arms=n_arms,
+                        params=dict(params))
+    state = checkpoint.load('musical_chairs', args) \
+        if checkpoint is not None else None
+    if state is None:
+        arms = list()
+        for i in range(n_arms):
+            arms.append(ArmBernoulli(arm_means[i]))
+        users = [SecondaryUser(n_arms, n_users, t_horizon)
+                 for i in range(n_users)]
+        t_start = 0
+        total_rewards = np.zeros((t_horizon, 1))
+        # t_sequence in [0;t0+t1]. if t_temp<t0 --> exploration phase.
+        # if t0<t_temp<t1 --> eploitation phase.
+        t_temp = 0
+        choices = None
+    else:
+        arms, users, t_start = state['arms'], state['users'], state['t']
+        total_rewards = resize(state['total_rewards'], t_horizon, axis=0)
+        t_temp, choices = state['t_temp'], state['choices']
+    if tape is not None:
+        arms = tape_arms(tape, arm_means, n_arms,
+                         None if state is None else arms)
+
+    def save(t):
+        checkpoint.save(dict(routine='musical_chairs', args=args, t=t,
+                             arms=arms, users=users, t_temp=t_temp,
+                             choices=choices,
+                             total_rewards=total_rewards[:t]))
+
+    for t in range(t_start, t_horizon):
+        total_rewards[t], _, t_temp, choices = _mc_step(
+            users, arms, params, t, t_temp, choices, profile)
+        if checkpoint is not None and checkpoint.due(t):
+            with profile.phase('checkpoint'):
+                save(t + 1)
+    if checkpoint is not None and t_horizon > t_start:
+        with profile.phase('checkpoint'):
+            save(t_horizon)
+    return with_profile(total_rewards, profile)
+
+
+def _mc_step(users, arms, params, t, t_temp, choices,
+             profile=NULL_PROFILE):
+    ''' Play the time step t of the musical chairs algorithm, the cost of its
+    phases being accumulated in profile.
+        Args:
+            - t_temp (int): position of t in the current t0 + t1 epoch.
+            - choices (list): arm chosen by each user at the last step.
+        Output:
+            - reward (float): total reward of the users.
+            - collided (ndarray): bool mask of the colliding users.
+            - t_temp (int): position of t + 1 in its epoch.
+            - choices (list): arm chosen by each user.
+    '''
+    n_users, n_arms = len(users), len(arms)
+    total_reward = 0
+    collisions = np.zeros(n_users, dtype=bool)
+    # phase 1: exploring the arms in order to rank them.
+    if t_temp < params["t0"]:
+        with profile.phase('decisions'):
             choices = [random.randrange(n_arms) for user in users]
-            choice_count = collections.Counter(choices)
-            arms_to_draw = [choice for choice
-                            in choices if choice_count[choice] == 1]
-            for (user_id, choice) in enumerate(choices):
-                if choice in arms_to_draw:
-                    arm = arms[choice]
-                    user = users[user_id]
-                    user.arm_id = choice
-                    reward = user.draw_from_arm(arm, t)
-                    total_rewards[t] += reward
-            t_temp += 1
-        # rank arms when we reach t0 steps
-        if t_temp == params["t0"]:
+        collided, reward = _mc_draws(users, arms, choices, t, profile)
+        total_reward += reward
+        collisions |= collided
+        t_temp += 1
+    # rank arms when we reach t0 steps
+    if t_temp == params["t0"]:
+        with profile.phase('ranking'):
             for user_id in range(n_users):
                 users[user_id].top_arms = users[user_id].rank_arms()
-        # phase 2 once all the players are fixed on an arm.
-        if t_temp < params["t1"] and t_temp >= params["t0"]:
+    # phase 2 once all the players are fixed on an arm.
+    if t_temp < params["t1"] and t_temp >= params["t0"]:
+        with profile.phase('decisions'):
             for (idx, user) in enumerate(users):
                 if user.fixed_on_arm == -1:
                     choices[idx] = user.top_arms[random.randrange(n_users)]
                 else:
                     choices[idx] = user.arm_id
-            # draw the arms that have to be drawn (selected only ones)
-            choice_count = collections.Counter(choices)
-            arms_to_draw = [choice for choice
-                            in choices if choice_count[choice] == 1]
-            for (user_id, choice) in enumerate(choices):
-                if choice in arms_to_draw:
-                    arm = arms[choice]
-                    user = users[user_id]
-                    user.arm_id = choice
-                    if user.fixed_on_arm == -1:
-                        user.fixed_on_arm = +1
-                    reward = user.draw_from_arm(arm, t)
-                    total_rewards[t] += reward
+        collided, reward = _mc_draws(users, arms, choices, t, profile,
+                                     sit=True)
+        total_reward += reward
+        collisions |= collided
+        t_temp += 1
+    if t_temp == params["t1"]:
+        t_temp = 0
+        for user in users:
+            user.fixed_on_arm = -1
+    return total_reward, collisions, t_temp, choices
+
+
+def _mc_draws(users, arms, choices, t, profile, sit=False):
+    ''' The users that do not collide draw their arm, and sit on it in phase
+    2.
+        Output:
+            - collided (ndarray): bool mask of the colliding users.
+            - reward (float): total reward of the users.
+    '''
+    with profile.phase('collisions'):
+        _, collided = collided_users(choices, len(arms))
+    # draw the arms that have to be drawn (selected only ones)
+    drawing = np.flatnonzero(~collided)
+    with profile.phase('draws'):
+        rewards = [arms[choices[user_id]].draw() for user_id in drawing]
+    with profile.phase('updates'):
+        for user_id, reward in zip(drawing, rewards):
+            user = users[user_id]
+            user.arm_id = choices[user_id]
+            if sit and user.fixed_on_arm == -1:
+                user.fixed_on_arm = +1
+            user.update(reward, t)
+    return collided, sum(rewards)
+
+
+def mc_stream(n_users, params, n_arms, arm_means, t_horizon=None,
+              chunk_size=1000):
+    ''' Apply muscial chairs algorithm step by step, the results being handed
+    out in chunks as the run goes instead of at the end of the horizon.
+        Args:
+            - n_users (int): number of users.
+            - params (dict): t0 - exploring phase / t1 - exploiting phase
+            - n_arms (int): number of arms.
+            - arm_means (ndarray): means of the arms.
+            - t_horizon (int): time steps, the run goes on until the consumer
+            stops if None.
+            - chunk_size (int): number of time steps per chunk.
+        Output:
+            - chunks (generator): yields (t_start, total_rewards, collisions)
+            with total_rewards (1, chunk_size) the total reward and
+            collisions (n_users, chunk_size) the collision flags of the users
+            at each time step of the chunk, see streaming.chunked.
+    '''
+    if t_horizon is not None and t_horizon < params["t1"]:
+        raise ValueError("horizon must be at least t1")
+    arms = [ArmBernoulli(arm_means[i]) for i in range(n_arms)]
+    users = [SecondaryUser(n_arms, n_users, t_horizon)
+             for i in range(n_users)]
+
+    def steps():
+        t_temp, choices = 0, None
+        for t in time_steps(t_horizon):
+            reward, collided, t_temp, choices = _mc_step(
+                users, arms, params, t, t_temp, choices)
+            yield [reward], collided
+
+    return chunked(steps(), chunk_size)
+
+
+def mc_vectorized_routine(n_users, params, n_arms, t_horizon, arm_means,
+                          aggregate=False):
+    ''' Apply muscial chairs algorithm to a pb with t_horizon time steps,
+        the users being stored as arrays. Once every user sits on a chair the
+        rest of the epoch is made of i.i.d. draws of fixed arms, which are
+        sampled in bulk instead of step by step.
+        Args:
+            - n_users (int): number of users.
+            - n_arms (int): number of arms.
+            - params (dict): t0 - exploring phase / t1 - exploiting phase
+            - t_horizon (int): time steps.
+            - arm_means (ndarray): means of the arms.
+            - aggregate (bool): only return the sum of the rewards, the
+            settled part of each epoch is then drawn from binomial dist. The
+            sum cannot be aggregated by montecarlo.run_replicas.
+        Output:
+            - total_rewards (ndarray): total reward at each time step, or
+            (float) the sum of the rewards over the horizon if aggregate.
+    '''
+    if t_horizon < params["t1"]:
+        raise ValueError("horizon must be at least t1")
+    arms = ArmBank.bernoulli(arm_means[:n_arms])
+    user_ids = np.arange(n_users)
+    # users statistics
+    rewards = np.zeros((n_users, n_arms))
+    draws = np.zeros((n_users, n_arms), dtype='int')
+    top_arms = np.zeros((n_users, n_users), dtype='int')
+    fixed_on_arm = np.zeros(n_users, dtype=bool)
+    arm_id = np.full(n_users, -1)
+    if aggregate:
+        total_rewards = 0.
+    else:
+        total_rewards = np.zeros((t_horizon, 1))
+    t_temp = 0
+    t = 0
+    while t < t_horizon:
+        n_steps = 1
+        reward = 0
+        # phase 1: exploring the arms in order to rank them.
+        if t_temp < params["t0"]:
+            choices = np.random.randint(0, n_arms, size=n_users)
+            drawn = ~collided_users(choices, n_arms)[1]
+            arm_id[drawn] = choices[drawn]
+            reward = arms.draw(arm_id[drawn])
+            draws[drawn, arm_id[drawn]] += 1
+            rewards[drawn, arm_id[drawn]] += reward
+            reward = reward.sum()
             t_temp += 1
+        # rank arms when we reach t0 steps
+        if t_temp == params["t0"]:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                user_stat = rewards / draws
+            top_arms = top_m(user_stat, n_users)
+        # phase 2 once all the players are fixed on an arm.
+        if t_temp < params["t1"] and t_temp >= params["t0"]:
+            if fixed_on_arm.all():
+                # every user sits on its own chair until the end of the epoch
+                n_steps = min(params["t1"] - t_temp, t_horizon - t)
+                if aggregate:
+                    fixed_rewards = np.random.binomial(n_steps,
+                                                       arms.p[arm_id])
+                    reward = fixed_rewards.sum()
+                else:
+                    step_rewards = arms.draw(
+                        np.broadcast_to(arm_id, (n_steps, n_users)))
+                    fixed_rewards = step_rewards.sum(axis=0)
+                    reward = step_rewards.sum(axis=1)[:, None]
+                draws[user_ids, arm_id] += n_steps
+                rewards[user_ids, arm_id] += fixed_rewards
+                t_temp += n_steps
+            else:
+                choices = np.where(
+                    fixed_on_arm, arm_id,
+                    top_arms[user_ids, np.random.randint(0, n_users,
+                                                         size=n_users)])
+                # draw the arms that have to be drawn (selected only ones)
+                drawn = ~collided_users(choices, n_arms)[1]
+                arm_id[drawn] = choices[drawn]
+                fixed_on_arm |= drawn
+                phase_reward = arms.draw(arm_id[drawn])
+                draws[drawn, arm_id[drawn]] += 1
+                rewards[drawn, arm_id[drawn]] += phase_reward
+                reward += phase_reward.sum()
+                t_temp += 1
         if t_temp == params["t1"]:
             t_temp = 0
-            for user in users:
-                user.fixed_on_arm = -1
+            fixed_on_arm[:] = False
+        if aggregate:
+            total_rewards += np.sum(reward)
+        else:
+            total_rewards[t:t + n_steps] += reward
+        t += n_steps
     return total_rewards
@@ -1,15 +1,20 @@
 import random
 import numpy as np
 
+from ranking import top_m
+
 
 class SecondaryUser:
     ''' class used for user behaviour
     '''
 
-    def __init__(self, n_arms, n_users, t_horizon):
+    def __init__(self, n_arms, n_users, t_horizon, recorder=None):
         self.n_arms = n_arms
         self.n_users = n_users
-        self.rewards = np.zeros((n_arms, t_horizon))
+        # sum of the rewards obtained on each arm
+        self.arms_rew = np.zeros(n_arms)
+        # optional RewardRecorder keeping the per-step rewards
+        self.recorder = recorder
         self.draws = np.zeros(n_arms, dtype='int')
         self.top_arms = np.zeros(n_users, dtype='int')
         self.fixed_on_arm = -1
@@ -22,15 +27,24 @@ class SecondaryUser:
                 Outputs : reward (int) the actual reward
         '''
         reward = arm.draw()
-        self.draws[self.arm_id] += 1
-        self.rewards[self.arm_id, t] = reward
+        self.update(reward, t)
         return reward
 
+    def update(self, reward, t):
+        ''' Updates the statistics of the user with the reward of its arm.
+                Args :
+                        - reward (float) the reward obtained
+                        - t (int) the time step
+        '''
+        self.draws[self.arm_id] += 1
+        self.arms_rew[self.arm_id] += reward
+        if self.recorder is not None:
+            self.recorder.record(self.arm_id, t, reward)
+
     def rank_arms(self):
         ''' Rank arms before phase 2.
             Output:
                 - ndarray: n_users top arms.
         '''
-        user_stat = np.sum(self.rewards, axis=1) / self.draws
-        arms_sorted = np.argsort(user_stat)[::-1][:self.n_users]
-        return arms_sorted
+        user_stat = self.arms_rew / self.draws
+        return top_m(user_stat, self.n_users)
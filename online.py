@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class Policy:
+    ''' Online policy of a single node, which owns its clock: select()
+    returns the arm to play now and update(reward, collided) reports the
+    outcome of that play. The state of the policy is one float array (its
+    scalars followed by its per-arm statistics), select and update only
+    write into it and into scratch arrays allocated once, and snapshot and
+    restore copy that array. Their time steps are compiled with numba when
+    it is installed, see jit.py, and their random draws come from np.random
+    (or from the random state of numba).
+    '''
+    # number of scalars at the start of the state
+    n_scalars = 0
+    # number of statistics of each arm after them
+    n_arm_stats = 0
+
+    def __init__(self, n_arms):
+        '''Args:
+            - n_arms (int): number of arms
+        '''
+        self.n_arms = n_arms
+        self.state = np.zeros(self.n_scalars + self.n_arm_stats * n_arms)
+        self.scalars = self.state[:self.n_scalars]
+        # one view per statistic, e.g. self.draws = self.arm_stats[1]
+        self.arm_stats = self.state[self.n_scalars:].reshape(
+            self.n_arm_stats, n_arms)
+        # scratch arrays of the decisions
+        self.stats = np.zeros(n_arms)
+        self.ranking = np.zeros(n_arms, dtype=np.int64)
+        self.taken = np.zeros(n_arms, dtype=np.bool_)
+
+    def select(self):
+        '''Output:
+            - int: the arm to play at the current time step, -1 to sit out
+        '''
+        raise NotImplementedError
+
+    def update(self, reward, collided):
+        '''Feedback of the arm played at the current time step, the policy
+        then moves to the next one.
+            Args:
+                - reward (float): the reward obtained, ignored on collision
+                - collided (bool): whether another node played the same arm
+        '''
+        raise NotImplementedError
+
+    def snapshot(self):
+        '''Output:
+            - ndarray: a copy of the state, see restore
+        '''
+        return self.state.copy()
+
+    def restore(self, snapshot):
+        '''Args:
+            - snapshot (ndarray): a state returned by snapshot, of a policy
+            with the same class and arguments
+        '''
+        np.copyto(self.state, snapshot)
@@ -1,21 +1,176 @@
-import matplotlib.pyplot as plt
+import statistics
+
 import numpy as np
 
+# matplotlib is only imported by the plotting functions, so that importing
+# this module (e.g. in workers) stays cheap
+
+# number of points drawn per curve by default
+N_POINTS = 2000
+
+
+def minmax_indices(y, n_points=N_POINTS):
+    '''
+    indices of the points kept by a min/max decimation: the curve is split in
+    n_points / 2 buckets and the lowest and highest points of each bucket are
+    kept, in time order, so that the envelope of the curve is preserved
+    Args :
+           - y (np array : t_horizon) the curve
+           - n_points (int) number of points to keep
+    Outputs : indices (np array : <= n_points) increasing indices of y
+    '''
+    n = len(y)
+    n_buckets = n_points // 2
+    if n <= n_points or n_buckets < 1:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    kept = [[0, n - 1]]
+    for reduce in (np.minimum, np.maximum):
+        extremum = reduce.reduceat(y, edges[:-1])
+        # first point of each bucket reaching its extremum
+        hits = np.flatnonzero(y == extremum[bucket])
+        kept.append(hits[np.unique(bucket[hits], return_index=True)[1]])
+    return np.unique(np.concatenate(kept))
+
+
+def lttb_indices(y, n_points=N_POINTS):
+    '''
+    indices of the points kept by the Largest-Triangle-Three-Buckets
+    decimation: in each bucket, the point forming the largest triangle with
+    the point kept in the previous bucket and the mean of the next bucket
+    Args :
+           - y (np array : t_horizon) the curve
+           - n_points (int) number of points to keep, at least 3
+    Outputs : indices (np array : <= n_points) increasing indices of y
+    '''
+    n = len(y)
+    if n <= n_points or n_points < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    # the first and last points are kept, the others are split in buckets
+    edges = np.linspace(1, n - 1, n_points - 1).astype(int)
+    indices = np.zeros(n_points, dtype=int)
+    indices[-1] = n - 1
+    for i in range(n_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        next_x = (next_start + next_end - 1) / 2
+        next_y = y[next_start:next_end].mean()
+        a = indices[i]
+        x = np.arange(start, end)
+        areas = np.abs((a - next_x) * (y[start:end] - y[a]) -
+                       (a - x) * (next_y - y[a]))
+        indices[i + 1] = start + np.argmax(areas)
+    return indices
+
+
+DECIMATIONS = {
+    'minmax': minmax_indices,
+    'lttb': lttb_indices,
+}
+
+
+def regret_band(best_arms_mean, rewards, level=0.95):
+    '''
+    mean cumulative regret with a normal confidence band
+    Args :
+           - best_arms_mean (list or vector) means of the best arms
+           - rewards (np array : t_horizon or n_replicas x t_horizon) total
+           rewards at every timestep, a StoredRun or a RegretAggregator
+           - level (float) confidence level of the band
+    Outputs : mean, lower, upper (np arrays : t_horizon), the band is None
+              for a single run
+    '''
+    if hasattr(rewards, 'regret_curve'):
+        return rewards.regret_curve(level)
+    if hasattr(rewards, 'total_rewards'):
+        rewards = rewards.total_rewards()
+    rewards = np.asarray(rewards, dtype=float)
+    if rewards.ndim == 2 and rewards.shape[1] == 1:
+        rewards = rewards[:, 0]
+    regret = np.cumsum(np.sum(best_arms_mean) - rewards, axis=-1)
+    if regret.ndim == 1 or regret.shape[0] == 1:
+        return regret.reshape(-1), None, None
+    mean = regret.mean(0)
+    z = statistics.NormalDist().inv_cdf((1 + level) / 2)
+    half_width = z * regret.std(0, ddof=1) / np.sqrt(regret.shape[0])
+    return mean, mean - half_width, mean + half_width
+
+
+def regret_plots(best_arms_mean, runs, level=0.95, n_points=N_POINTS,
+                 method='minmax', upper_bound=None, path=None, ax=None):
+    '''
+    plot the regret curves of several algorithms with their confidence bands,
+    each curve being decimated to about n_points points
+    Args :
+           - best_arms_mean (list or vector) means of the best arms
+           - runs (dict) label -> rewards of the algorithm, see regret_band
+           - level (float) confidence level of the bands
+           - n_points (int) number of points drawn per curve, None to draw
+           every time step
+           - method (str) decimation, 'minmax' or 'lttb'
+           - upper_bound (np array : t_horizon) upper bound for the regret
+           - path (str) image file the figure is rendered to without any
+           display, e.g. 'regret.png' or 'regret.pdf'
+           - ax (matplotlib Axes) axes to draw on
+    Outputs : ax (matplotlib Axes) the axes of the plot
+    '''
+    if method not in DECIMATIONS:
+        raise ValueError("method must be one of %s" % list(DECIMATIONS))
+    figure = None
+    if ax is None and path is not None:
+        # render without pyplot so that no display is needed
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=(8, 5))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(111)
+    elif ax is None:
+        import matplotlib.pyplot as plt
+        ax = plt.figure().gca()
+    from matplotlib import cm
+    cmap = cm.gist_ncar
+    for i, (label, rewards) in enumerate(runs.items()):
+        mean, lower, upper = regret_band(best_arms_mean, rewards, level)
+        indices = np.arange(len(mean)) if n_points is None else \
+            DECIMATIONS[method](mean, n_points)
+        color = cmap(float(i) / len(runs))
+        ax.plot(indices, mean[indices], linewidth=2, color=color,
+                label=label)
+        if lower is not None:
+            ax.fill_between(indices, lower[indices], upper[indices],
+                            color=color, alpha=0.2, linewidth=0)
+    if upper_bound is not None:
+        upper_bound = np.asarray(upper_bound)
+        indices = np.arange(len(upper_bound)) if n_points is None else \
+            DECIMATIONS[method](upper_bound, n_points)
+        ax.plot(indices, upper_bound[indices], "r--", label="Upper Bound")
+    ax.set_ylabel("Regret")
+    ax.set_xlabel("Time")
+    ax.legend(loc=2)
+    if figure is not None:
+        figure.savefig(path, bbox_inches='tight')
+    return ax
+
 
-def regret_plt(best_arms_mean, rewards, upper_bound=None):
+def regret_plt(best_arms_mean, rewards, upper_bound=None, path=None):
     '''
     plot the regret curve through iterations
     Args :
            - best_arms_mean (list or vector): means of the best arms considered
-           - rewards (np array : t_horizon): total rewards at every timestep
+           - rewards (np array : t_horizon): total rewards at every timestep,
+           or a StoredRun whose rewards are summed by chunks
            - upper_bound (np array : t_horizon): upper bound for the regret
            at every timestep
+           - path (str): image file the figure is saved to instead of being
+           shown
     '''
-    regret = np.cumsum(best_arms_mean.sum() - rewards)
-    plt.plot(regret, linewidth=2, label="Regret")
-    if upper_bound:
-        plt.plot(upper_bound, "r--", label="Upper Bound")
-    plt.ylabel("Regret")
-    plt.xlabel("Time")
-    plt.legend(loc=2)
-    plt.show()
+    regret_plots(best_arms_mean, {"Regret": rewards},
+                 upper_bound=upper_bound, path=path)
+    if path is None:
+        import matplotlib.pyplot as plt
+        plt.show()
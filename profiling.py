@@ -0,0 +1,178 @@
+import contextlib
+import time
+import tracemalloc
+
+
+class PhaseStats:
+    ''' Accumulated cost of one phase of a routine.
+    '''
+    __slots__ = ('calls', 'time', 'peak_memory')
+
+    def __init__(self):
+        self.calls = 0
+        # wall time in seconds
+        self.time = 0.
+        # largest memory allocated at once during a call, in bytes
+        self.peak_memory = 0
+
+    def as_dict(self):
+        return dict(calls=self.calls, time=self.time,
+                    peak_memory=self.peak_memory)
+
+
+class _Phase:
+    ''' Context manager timing a phase, reused by every call of the phase.
+    '''
+    __slots__ = ('stats', 'allocations', 'start', 'memory_start')
+
+    def __init__(self, stats, allocations):
+        self.stats = stats
+        self.allocations = allocations
+
+    def __enter__(self):
+        if self.allocations:
+            tracemalloc.reset_peak()
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stats = self.stats
+        stats.calls += 1
+        stats.time += elapsed
+        if self.allocations:
+            peak = tracemalloc.get_traced_memory()[1] - self.memory_start
+            stats.peak_memory = max(stats.peak_memory, peak)
+
+
+class Profile:
+    ''' Per phase wall time and call counts of a routine, e.g. decisions,
+    collisions, draws and updates. Phases must not be nested when
+    allocations are measured.
+    '''
+    def __init__(self, allocations=False):
+        '''Args:
+            - allocations (bool): also measure the peak memory allocated by
+            each phase with tracemalloc, which slows the run down.
+        '''
+        self.allocations = allocations
+        self.phases = {}
+        self._contexts = {}
+        self._tracing = False
+
+    def phase(self, name):
+        '''Args:
+            - name (str): the phase.
+        Output:
+            - context manager: accumulates the cost of its block to the phase.
+        '''
+        context = self._contexts.get(name)
+        if context is None:
+            self.phases[name] = PhaseStats()
+            context = _Phase(self.phases[name], self.allocations)
+            self._contexts[name] = context
+        return context
+
+    def start(self):
+        ''' Starts tracemalloc if allocations are measured.
+        '''
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self):
+        ''' Stops tracemalloc if it was started by this profile.
+        '''
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def merge(self, other):
+        ''' Adds the phases of another profile, e.g. of another replica.
+        '''
+        for name, stats in other.phases.items():
+            own = self.phase(name).stats
+            own.calls += stats.calls
+            own.time += stats.time
+            own.peak_memory = max(own.peak_memory, stats.peak_memory)
+
+    def as_dict(self):
+        '''Output:
+            - dict: calls, time and peak_memory of every phase.
+        '''
+        return {name: stats.as_dict() for name, stats in self.phases.items()}
+
+    def report(self):
+        '''Output:
+            - str: one line per phase, the most expensive first.
+        '''
+        total = sum(stats.time for stats in self.phases.values()) or 1.
+        lines = ['%-12s %10s %10s %7s %12s' % (
+            'phase', 'calls', 'time (s)', 'share', 'peak memory')]
+        for name, stats in sorted(self.phases.items(),
+                                  key=lambda item: -item[1].time):
+            lines.append('%-12s %10d %10.4f %6.1f%% %12d' % (
+                name, stats.calls, stats.time, 100 * stats.time / total,
+                stats.peak_memory))
+        return '\n'.join(lines)
+
+
+class NullProfile:
+    ''' Disabled profile: its phases are a shared no-op context manager.
+    '''
+    _context = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._context
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_PROFILE = NullProfile()
+
+
+def as_profile(profile):
+    '''Args:
+            - profile (bool or Profile): profile argument of a routine, a
+            given Profile accumulates the phases of several runs.
+        Output:
+            - Profile or NullProfile: the started profile to fill.
+    '''
+    if not profile:
+        return NULL_PROFILE
+    if profile is True:
+        profile = Profile()
+    profile.start()
+    return profile
+
+
+def with_profile(output, profile):
+    ''' Output of a routine, paired with its profile when it is enabled.
+        Args:
+            - output (ndarray or tuple): the output of the routine.
+            - profile (Profile or NullProfile): its profile.
+        Output:
+            - output, or (output, profile) with the Profile.
+    '''
+    if profile is NULL_PROFILE:
+        return output
+    profile.stop()
+    return output, profile
+
+
+def without_profile(output):
+    ''' Output of a routine, without the profile paired with it by
+    with_profile.
+        Args:
+            - output: what a routine returns, profiled or not.
+        Output:
+            - the output of the routine.
+    '''
+    if isinstance(output, tuple) and len(output) == 2 and \
+            isinstance(output[1], Profile):
+        return output[0]
+    return output
@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+
+# below this number of arms a full sort is cheaper than a partial selection
+PARTIAL_SELECTION_MIN_ARMS = 64
+# margin of the bound of UCBRanking, above the rounding errors of the indices
+BOUND_TOLERANCE = 1e-9
+
+
+def top_m(stats, m):
+    '''Indices of the m largest statistics in decreasing order, computed with
+    a partial selection in O(K + m log m) instead of a full sort of the K
+    arms. The order is the one of np.argsort(stats, kind='stable')[::-1]:
+    NaN statistics rank first and tied arms rank by decreasing index.
+        Args:
+            - stats (ndarray): (..., n_arms) the statistics of the arms
+            - m (int): the number of arms to rank
+        Output:
+            - ndarray: (..., m) the indices of the m best arms
+    '''
+    # reversed, so that a stable ascending order ranks the ties by
+    # decreasing index
+    keys = np.negative(np.asarray(stats)[..., ::-1], dtype=float)
+    nan = np.isnan(keys)
+    if nan.any():
+        keys[nan] = -np.inf
+    n_arms = keys.shape[-1]
+    m = min(m, n_arms)
+    order = None
+    if m < n_arms and n_arms >= PARTIAL_SELECTION_MIN_ARMS:
+        best = np.argpartition(keys, m - 1, axis=-1)[..., :m]
+        best_keys = np.take_along_axis(keys, best, axis=-1)
+        threshold = best_keys.max(axis=-1, keepdims=True)
+        # arms tied with the m-th one may have been left out by the
+        # partition, a full sort breaks these ties
+        if not np.any(np.sum(keys <= threshold, axis=-1) > m):
+            order = np.take_along_axis(
+                best, np.lexsort((best, best_keys), axis=-1), axis=-1)
+    if order is None:
+        order = np.argsort(keys, axis=-1, kind='stable')[..., :m]
+    return n_arms - 1 - order
+
+
+def ranked_choice(stats, ranks, m):
+    '''Arm at a given rank among the m best ones.
+        Args:
+            - stats (ndarray): (..., n_arms) the statistics of the arms
+            - ranks (int or ndarray): (...) the rank to pick, lower than m
+            - m (int): the number of arms to rank
+        Output:
+            - int or ndarray: (...) the index of the chosen arms
+    '''
+    best = top_m(stats, m)
+    if np.ndim(ranks) == 0:
+        return best[..., ranks][()]
+    return np.take_along_axis(best, np.asarray(ranks)[..., None],
+                              axis=-1)[..., 0]
+
+
+class UCBRanking:
+    ''' m best arms of a user for the UCB index
+    arms_rew / draws + sqrt(log(t) / draws), kept up to date across the time
+    steps instead of ranking the K arms at each decision.
+    The ranking tracks a set of candidate arms: the best ones when it was
+    last rebuilt and the arms drawn since. The index of any other arm only
+    grew with log(t), by at most (sqrt(log t) - sqrt(log t0)) / sqrt(draws),
+    so while the m-th candidate is above that bound the m best arms are
+    candidates and a decision costs O(number of candidates). Otherwise the
+    ranking is rebuilt in O(K). The result is exactly top_m of the indices.
+    '''
+    def __init__(self, n_arms, m, n_candidates=None):
+        '''Args:
+            - n_arms (int): number of arms
+            - m (int): number of arms to rank
+            - n_candidates (int): number of best arms kept as candidates by a
+            rebuild, max(4 * m, 32) if None
+        '''
+        self.n_arms = n_arms
+        self.m = min(m, n_arms)
+        if n_candidates is None:
+            n_candidates = max(4 * m, 32)
+        self.n_candidates = min(max(n_candidates, self.m), n_arms)
+        self.candidates = None
+        self.tracked = np.zeros(n_arms, dtype=bool)
+        # largest index and largest 1 / sqrt(draws) of the other arms
+        self.bound = -np.inf
+        self.slope = 0.
+        self.sqrt_log_t0 = 0.
+        self.n_rebuilds = 0
+
+    def changed(self, arm):
+        '''Args:
+            - arm (int): an arm whose statistics changed
+        '''
+        if self.candidates is None or self.tracked[arm]:
+            return
+        self.tracked[arm] = True
+        self.candidates.append(arm)
+        if len(self.candidates) > 2 * self.n_candidates:
+            # rebuilt at the next decision
+            self.candidates = None
+
+    def top(self, arms_rew, draws, t):
+        '''Args:
+            - arms_rew, draws (ndarray): (n_arms) statistics of the user,
+            every arm having been drawn
+            - t (int): the time step
+        Output:
+            - ndarray: (m) the indices of the m best arms in decreasing order
+            of their index, as top_m
+        '''
+        log_t = math.log(t)
+        if self.candidates is not None:
+            best, mth = self._rank(arms_rew, draws, log_t,
+                                   np.array(self.candidates))
+            growth = max(math.sqrt(log_t) - self.sqrt_log_t0, 0.)
+            if mth > self.bound + self.slope * growth + BOUND_TOLERANCE:
+                return best
+        stats = self._rebuild(arms_rew, draws, log_t)
+        best, mth = self._rank(arms_rew, draws, log_t,
+                               np.array(self.candidates))
+        if mth > self.bound + BOUND_TOLERANCE:
+            return best
+        # the m-th arm is tied with an arm left out of the candidates
+        return top_m(stats, self.m)
+
+    def _rank(self, arms_rew, draws, log_t, arms):
+        stats = arms_rew[arms] / draws[arms] + np.sqrt(log_t / draws[arms])
+        # decreasing index, ties by decreasing arm, as top_m
+        order = np.lexsort((-arms, -stats))[:self.m]
+        return arms[order], stats[order[-1]]
+
+    def _rebuild(self, arms_rew, draws, log_t):
+        self.n_rebuilds += 1
+        stats = arms_rew / draws + np.sqrt(log_t / draws)
+        if self.n_candidates < self.n_arms:
+            split = np.argpartition(-stats, self.n_candidates - 1)
+            candidates, others = split[:self.n_candidates], \
+                split[self.n_candidates:]
+            self.bound = stats[others].max()
+            self.slope = 1 / math.sqrt(draws[others].min())
+        else:
+            candidates = np.arange(self.n_arms)
+            self.bound, self.slope = -np.inf, 0.
+        self.sqrt_log_t0 = math.sqrt(log_t)
+        self.tracked[:] = False
+        self.tracked[candidates] = True
+        self.candidates = candidates.tolist()
+        return stats
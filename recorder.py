@@ -0,0 +1,23 @@
+import numpy as np
+
+
+class RewardRecorder:
+    ''' Opt-in per-step log of the rewards obtained by a user. Users only keep
+    per arm sufficient statistics, a recorder can be attached to them when the
+    full history is needed.
+    '''
+    def __init__(self, n_arms, t_horizon):
+        '''Args:
+            - n_arms (int): number of arms.
+            - t_horizon (int): time steps.
+        '''
+        self.rewards = np.zeros((n_arms, t_horizon))
+
+    def record(self, arm_id, t, reward):
+        ''' Stores the reward obtained on an arm at a given time step.
+            Args:
+                - arm_id (int): the index of the arm drawn.
+                - t (int): the time step.
+                - reward (float): the reward obtained.
+        '''
+        self.rewards[arm_id, t] = reward
@@ -0,0 +1,135 @@
+import importlib
+from functools import partial
+
+# implementations of every algorithm, as 'module:attribute' paths which are
+# only imported when they are used, and the decision algorithms they support
+ALGORITHMS = {
+    'tdfs': {
+        'algs': ('ucb', 'ts'),
+        'routine': 'tdfs.routines:tdfs_routine',
+        'batch': 'tdfs.routines:tdfs_batch_routine',
+        'stream': 'tdfs.routines:tdfs_stream',
+        'kernel': 'tdfs.kernels:tdfs_kernel',
+        'policy': 'tdfs.policies:TDFSPolicy',
+    },
+    'rho_rand': {
+        'algs': ('ucb', 'ts'),
+        'routine': 'rho_rand.routines:rho_rand_routine',
+        'batch': 'rho_rand.routines:rho_rand_batch_routine',
+        'stream': 'rho_rand.routines:rho_rand_stream',
+        'kernel': 'rho_rand.kernels:rho_rand_kernel',
+        'policy': 'rho_rand.policies:RhoRandPolicy',
+    },
+    'mega': {
+        'algs': ('eps', 'ucb', 'ts'),
+        'routine': 'mega.routines:mega_routine',
+        'array': 'mega.routines:mega_array_routine',
+        'stream': 'mega.routines:mega_stream',
+        'kernel': 'mega.kernels:mega_kernel',
+        'policy': 'mega.policies:MEGAPolicy',
+    },
+    'musical_chairs': {
+        'algs': (None,),
+        'routine': 'musical_chairs.routines:mc_routine',
+        'vectorized': 'musical_chairs.routines:mc_vectorized_routine',
+        'stream': 'musical_chairs.routines:mc_stream',
+        'kernel': 'musical_chairs.kernels:mc_kernel',
+    },
+}
+
+# user class of each (algorithm, decision algorithm)
+USERS = {
+    ('tdfs', 'ucb'): 'tdfs.users:SecondaryUser',
+    ('tdfs', 'ts'): 'tdfs.users:SecondaryUser',
+    ('rho_rand', 'ucb'): 'rho_rand.users:SecondaryUser',
+    ('rho_rand', 'ts'): 'rho_rand.users:SecondaryUser',
+    ('mega', 'eps'): 'mega.users:SecondaryUser',
+    ('mega', 'ucb'): 'mega.users:UCBUser',
+    ('mega', 'ts'): 'mega.users:TSUser',
+    ('musical_chairs', None): 'musical_chairs.users:SecondaryUser',
+}
+
+
+def load(path):
+    '''Imports an implementation.
+        Args:
+            - path (str): 'module:attribute'
+        Output:
+            - the attribute of the module
+    '''
+    module, attribute = path.split(':')
+    return getattr(importlib.import_module(module), attribute)
+
+
+def _algorithm(name):
+    if name not in ALGORITHMS:
+        raise ValueError("unknown algorithm %r, expected one of %s" %
+                         (name, sorted(ALGORITHMS)))
+    return ALGORITHMS[name]
+
+
+def check_alg(name, alg):
+    '''Raises a ValueError if the decision algorithm alg is not supported by
+    the algorithm name.
+        Args:
+            - name (str): the algorithm, a key of ALGORITHMS
+            - alg (str): the decision algorithm
+    '''
+    algs = _algorithm(name)['algs']
+    if alg not in algs:
+        raise ValueError("alg of %s must be one of %s" % (name, algs))
+
+
+def implementation(name, kind='routine'):
+    '''Args:
+            - name (str): the algorithm, a key of ALGORITHMS
+            - kind (str): 'routine', 'stream', 'kernel', the online 'policy'
+            class of a node, or the vectorized 'batch', 'array' or
+            'vectorized' routine of the algorithm
+        Output:
+            - function: the imported implementation
+    '''
+    algorithm = _algorithm(name)
+    if kind == 'algs' or kind not in algorithm:
+        raise ValueError("%s has no %s implementation" % (name, kind))
+    return load(algorithm[kind])
+
+
+def get(name, alg=None, kind='routine'):
+    '''Implementation of an algorithm with its decision algorithm bound.
+        Args:
+            - name (str): the algorithm, a key of ALGORITHMS
+            - alg (str): the decision algorithm, its default if None
+            - kind (str): the implementation, see implementation
+        Output:
+            - function: the implementation, alg being passed to it
+    '''
+    if alg is None:
+        alg = _algorithm(name)['algs'][0]
+    check_alg(name, alg)
+    function = implementation(name, kind)
+    if alg is None or kind == 'kernel':
+        return function
+    return partial(function, alg=alg)
+
+
+def user_class(name, alg):
+    '''Args:
+            - name (str): the algorithm, a key of ALGORITHMS
+            - alg (str): the decision algorithm
+        Output:
+            - class: the users of the algorithm with this decision algorithm
+    '''
+    check_alg(name, alg)
+    return load(USERS[name, alg])
+
+
+def variants():
+    '''Output:
+            - list[(str, str, str)]: label, algorithm and decision algorithm
+            of every supported combination, e.g. ('mega ucb', 'mega', 'ucb')
+    '''
+    return [(name.replace('_', ' ') if alg is None else name + ' ' + alg,
+             name, alg)
+            for name, algorithm in ALGORITHMS.items()
+            for alg in algorithm['algs']]
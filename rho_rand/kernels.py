@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+
+from jit import jit, best_arms
+
+# algorithm codes of the kernel
+ALGS = {'ucb': 0, 'ts': 1}
+
+
+@jit
+def rho_rand_kernel(seed, arm_means, n_users, t_horizon, alg):
+    ''' Time loop of rho_rand_routine with the users stored as arrays.
+        Args:
+            - seed (int): seed of the random stream of the kernel.
+            - arm_means (ndarray): (n_arms) means of the Bernoulli arms.
+            - n_users (int): number of users.
+            - t_horizon (int): time steps.
+            - alg (int): ALGS code of the algorithm decision.
+        Output:
+            - total_rewards (ndarray): total reward at each time step.
+            - collisions (ndarray): (t_horizon, n_users) collision flags.
+    '''
+    np.random.seed(seed)
+    n_arms = arm_means.shape[0]
+    arms_rew = np.zeros((n_users, n_arms))
+    draws = np.zeros((n_users, n_arms))
+    rank_to_consider = np.zeros(n_users, dtype=np.int64)
+    choices = np.zeros(n_users, dtype=np.int64)
+    occupancy = np.zeros(n_arms, dtype=np.int64)
+    stats = np.zeros(n_arms)
+    ranking = np.zeros(n_users, dtype=np.int64)
+    taken = np.zeros(n_arms, dtype=np.bool_)
+    total_rewards = np.zeros(t_horizon)
+    collisions = np.zeros((t_horizon, n_users), dtype=np.uint8)
+    for t in range(t_horizon):
+        for i in range(n_users):
+            rank = rank_to_consider[i]
+            if alg == 0:
+                initialization = False
+                for k in range(n_arms):
+                    if draws[i, k] == 0:
+                        initialization = True
+                if initialization:
+                    choices[i] = t
+                    continue
+                for k in range(n_arms):
+                    stats[k] = arms_rew[i, k] / draws[i, k] + \
+                        math.sqrt(math.log(t) / draws[i, k])
+            else:
+                for k in range(n_arms):
+                    stats[k] = np.random.beta(
+                        arms_rew[i, k] + 1, draws[i, k] - arms_rew[i, k] + 1)
+            best_arms(stats, rank + 1, ranking, taken)
+            choices[i] = ranking[rank]
+        # initialization, the users draw without collisions
+        if t < n_arms:
+            for i in range(n_users):
+                arm = choices[i]
+                draws[i, arm] += 1
+                if np.random.random() < arm_means[arm]:
+                    arms_rew[i, arm] += 1
+            continue
+        occupancy[:] = 0
+        for i in range(n_users):
+            occupancy[choices[i]] += 1
+        for i in range(n_users):
+            arm = choices[i]
+            if occupancy[arm] > 1:
+                rank_to_consider[i] = int(np.random.random() * n_users)
+                collisions[t, i] = 1
+            else:
+                reward = 0.
+                if np.random.random() < arm_means[arm]:
+                    reward = 1.
+                draws[i, arm] += 1
+                arms_rew[i, arm] += reward
+                total_rewards[t] += reward
+    return total_rewards, collisions
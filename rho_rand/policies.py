@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+
+from jit import jit, best_arms
+from online import Policy
+from registry import check_alg
+from .kernels import ALGS
+
+# positions of the scalars in the state of a RhoRandPolicy
+T, ARM, RANK = range(3)
+
+
+@jit
+def rho_rand_select(scalars, arms_rew, draws, n_users, alg, stats, ranking,
+                    taken):
+    '''Arm of a rho_rand user at its current time step, as in
+    SecondaryUser.decision.
+        Args:
+            - scalars (ndarray): the scalars of the state, see T
+            - arms_rew, draws (ndarray): (n_arms) statistics of the user
+            - n_users (int): number of users
+            - alg (int): ALGS code of the algorithm decision
+            - stats, ranking, taken (ndarray): (n_arms) scratch arrays
+        Output:
+            - int: the arm to play
+    '''
+    t = int(scalars[T])
+    rank = int(scalars[RANK])
+    n_arms = draws.shape[0]
+    if alg == 0:
+        for k in range(n_arms):
+            if draws[k] == 0:
+                # initialization: every arm is drawn once, shifted by the
+                # rank so that colliding nodes split up
+                arm = (t + rank) % n_arms
+                scalars[ARM] = arm
+                return arm
+        for k in range(n_arms):
+            stats[k] = arms_rew[k] / draws[k] + \
+                math.sqrt(math.log(t) / draws[k])
+    else:
+        for k in range(n_arms):
+            stats[k] = np.random.beta(arms_rew[k] + 1,
+                                      draws[k] - arms_rew[k] + 1)
+    best_arms(stats, rank + 1, ranking, taken)
+    arm = ranking[rank]
+    scalars[ARM] = arm
+    return arm
+
+
+@jit
+def rho_rand_update(scalars, arms_rew, draws, n_users, reward, collided):
+    '''Feedback of the arm played at the current time step, a colliding user
+    draws a new rank, as in rho_rand_routine.
+    '''
+    arm = int(scalars[ARM])
+    if collided:
+        scalars[RANK] = int(np.random.random() * n_users)
+    else:
+        draws[arm] += 1
+        arms_rew[arm] += reward
+    scalars[T] += 1
+
+
+class RhoRandPolicy(Policy):
+    ''' rho_rand policy of one node: the node plays its rank-th best arm and
+    draws a new rank uniformly when it collides.
+    '''
+    n_scalars = 3
+    n_arm_stats = 2
+
+    def __init__(self, n_arms, n_users, alg='ucb'):
+        '''Args:
+            - n_arms (int): number of arms
+            - n_users (int): number of nodes sharing the arms, at most n_arms
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+        '''
+        check_alg('rho_rand', alg)
+        if n_users > n_arms:
+            raise ValueError("rho_rand needs n_users <= n_arms")
+        super().__init__(n_arms)
+        self.n_users = n_users
+        self.alg = ALGS[alg]
+        self.arms_rew, self.draws = self.arm_stats
+
+    def select(self):
+        return rho_rand_select(self.scalars, self.arms_rew, self.draws,
+                               self.n_users, self.alg, self.stats,
+                               self.ranking, self.taken)
+
+    def update(self, reward, collided):
+        rho_rand_update(self.scalars, self.arms_rew, self.draws,
+                        self.n_users, reward, collided)
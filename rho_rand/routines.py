@@ -1,13 +1,24 @@
+import math
 import numpy as np
 import random
-import matplotlib.pyplot as plt
-import collections
 
-from arms import ArmBernoulli
-from .users import SecondaryUser
+from arms import ArmBernoulli, ArmBank
+from checkpoint import resize, routine_args
+from collisions import collided_users
+from jit import run_kernel, use_jit
+from profiling import NULL_PROFILE, as_profile, with_profile
+from ranking import ranked_choice
+from registry import check_alg
+from streaming import chunked, time_steps
+from tapes import tape_arms
+from thompson import thompson_choices
+from . import kernels
+from .users import SecondaryUser, decisions
 
 
-def rho_rand_routine(n_users, n_arms, t_horizon, arm_means, alg='ucb'):
+def rho_rand_routine(n_users, n_arms, t_horizon, arm_means, alg='ucb',
+                     checkpoint=None, backend='numpy', profile=False,
+                     tape=None):
     ''' Apply rho_rand avoidance strategy to a pb with t_horizon time steps.
         Args:
             - n_users (int): number of users.
@@ -16,41 +27,181 @@ def rho_rand_routine(n_users, n_arms, t_horizon, arm_means, alg='ucb'):
             - alg (str): algorithm decision. 'ucb' or 'ts'
             - arm_means (list): the list of arm means to be used in this
             routine.
+            - checkpoint (Checkpoint): where the run is saved. If it exists
+            the run resumes from it, possibly up to a longer horizon.
+            - backend (str): 'numpy', or 'jit_distributional' to run the
+            time loop in a kernel compiled with numba, which only matches the
+            numpy routine in distribution, see jit.py.
+            - profile (bool or Profile): accumulate the wall time and calls
+            of the phases of the steps, see profiling.py.
+            - tape (RewardTape): rewards of the successive pulls of each
+            arm, shared with the other algorithms of a replica, see tapes.py.
+            A resumed run must be given the same tape.
         Output:
             - total_rewards (ndarray): total reward at each time step.
+            - profile (Profile): only if profile is enabled.
     '''
-    arms = list()
-    for i in range(n_arms):
-        arms.append(ArmBernoulli(arm_means[i]))
-    users = [SecondaryUser(n_arms, n_users, t_horizon) for i in range(n_users)]
-    total_rewards = np.zeros((t_horizon, 1))
+    check_alg('rho_rand', alg)
+    profile = as_profile(profile)
+    if use_jit(backend, checkpoint=checkpoint, tape=tape, n_users=n_users,
+               n_arms=n_arms):
+        with profile.phase('kernel'):
+            total_rewards, _ = run_kernel(
+                kernels.rho_rand_kernel,
+                np.asarray(arm_means[:n_arms], dtype=float), n_users,
+                t_horizon, kernels.ALGS[alg])
+        return with_profile(total_rewards[:, None], profile)
+    args = routine_args(arm_means, n_users=n_users, n_arms=n_arms, alg=alg)
+    state = checkpoint.load('rho_rand', args) if checkpoint is not None \
+        else None
+    if state is None:
+        arms = list()
+        for i in range(n_arms):
+            arms.append(ArmBernoulli(arm_means[i]))
+        users = [SecondaryUser(n_arms, n_users, t_horizon)
+                 for i in range(n_users)]
+        t_start = 0
+        total_rewards = np.zeros((t_horizon, 1))
+    else:
+        arms, users, t_start = state['arms'], state['users'], state['t']
+        total_rewards = resize(state['total_rewards'], t_horizon, axis=0)
+    if tape is not None:
+        arms = tape_arms(tape, arm_means, n_arms,
+                         None if state is None else arms)
+
+    def save(t):
+        checkpoint.save(dict(routine='rho_rand', args=args, t=t, arms=arms,
+                             users=users, total_rewards=total_rewards[:t]))
+
+    for t in range(t_start, t_horizon):
+        total_rewards[t], _ = _rho_rand_step(users, arms, t, alg, profile)
+        if checkpoint is not None and checkpoint.due(t):
+            with profile.phase('checkpoint'):
+                save(t + 1)
+    if checkpoint is not None and t_horizon > t_start:
+        with profile.phase('checkpoint'):
+            save(t_horizon)
+    return with_profile(total_rewards, profile)
+
+
+def _rho_rand_step(users, arms, t, alg, profile=NULL_PROFILE):
+    ''' Play the time step t of the rho_rand avoidance strategy, the cost of
+    its phases being accumulated in profile.
+        Output:
+            - reward (float): total reward of the users.
+            - collided (ndarray): bool mask of the colliding users.
+    '''
+    n_arms = len(arms)
+    with profile.phase('decisions'):
+        choices = decisions(users, t, alg=alg)
+    # initialization
+    if t < n_arms:
+        collided = np.zeros(len(users), dtype=bool)
+    # main loop
+    else:
+        with profile.phase('collisions'):
+            _, collided = collided_users(choices, n_arms)
+            # watch for collisions and update 'rank_to_consider'
+            for user_id in np.flatnonzero(collided):
+                users[user_id].rank_to_consider = random.randrange(
+                    len(users))
+    # draw the arms that have to be drawn (selected only ones)
+    drawing = np.flatnonzero(~collided)
+    with profile.phase('draws'):
+        rewards = [arms[choices[user_id]].draw() for user_id in drawing]
+    with profile.phase('updates'):
+        for user_id, reward in zip(drawing, rewards):
+            user = users[user_id]
+            user.arm_id = choices[user_id]
+            user.update(reward, t)
+    if t < n_arms:
+        # the rewards of the initialization are not counted
+        return 0, collided
+    return sum(rewards), collided
+
+
+def rho_rand_stream(n_users, n_arms, arm_means, t_horizon=None, alg='ucb',
+                    chunk_size=1000):
+    ''' Apply rho_rand avoidance strategy step by step, the results being
+    handed out in chunks as the run goes instead of at the end of the horizon.
+        Args:
+            - n_users (int): number of users.
+            - n_arms (int): number of arms.
+            - arm_means (list): the list of arm means to be used in this
+            routine.
+            - t_horizon (int): time steps, the run goes on until the consumer
+            stops if None.
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+            - chunk_size (int): number of time steps per chunk.
+        Output:
+            - chunks (generator): yields (t_start, total_rewards, collisions)
+            with total_rewards (1, chunk_size) the total reward and
+            collisions (n_users, chunk_size) the collision flags of the users
+            at each time step of the chunk, see streaming.chunked.
+    '''
+    check_alg('rho_rand', alg)
+    arms = [ArmBernoulli(arm_means[i]) for i in range(n_arms)]
+    users = [SecondaryUser(n_arms, n_users, t_horizon)
+             for i in range(n_users)]
+    steps = (_rho_rand_step(users, arms, t, alg)
+             for t in time_steps(t_horizon))
+    return chunked((([reward], collided) for reward, collided in steps),
+                   chunk_size)
+
+
+def rho_rand_batch_routine(n_replicas, n_users, n_arms, t_horizon, arm_means,
+                           alg='ucb'):
+    ''' Apply rho_rand avoidance strategy to n_replicas independent pbs with
+    t_horizon time steps at once. The users of every replica are stored as
+    (n_replicas, n_users, n_arms) arrays so that decisions, collisions and
+    reward draws are vectorized across the replica axis.
+        Args:
+            - n_replicas (int): number of independent simulations.
+            - n_users (int): number of users.
+            - n_arms (int): number of arms.
+            - t_horizon (int): time steps.
+            - arm_means (list): the list of arm means to be used in this
+            routine.
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+        Output:
+            - total_rewards (ndarray): (n_replicas, t_horizon, 1) total reward
+            at each time step, total_rewards[r] is distributed like the output
+            of rho_rand_routine.
+    '''
+    check_alg('rho_rand', alg)
+    arms = ArmBank.bernoulli(arm_means[:n_arms])
+    rank_to_consider = np.zeros((n_replicas, n_users), dtype='int')
+    rewards = np.zeros((n_replicas, n_users, n_arms))
+    draws = np.zeros((n_replicas, n_users, n_arms), dtype='int')
+    total_rewards = np.zeros((n_replicas, t_horizon, 1))
+    replica_ids = np.arange(n_replicas)[:, None]
+    user_ids = np.arange(n_users)[None, :]
     for t in range(t_horizon):
-        # initialization
+        if alg == 'ucb':
+            choices = np.full((n_replicas, n_users), t)
+            initializing = np.sum(draws > 0, axis=2) < n_arms
+            if not initializing.all():
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    stat = rewards / draws + np.sqrt(math.log(t) / draws)
+                choices = np.where(initializing, choices, ranked_choice(
+                    stat, rank_to_consider, n_users))
+        else:
+            choices = thompson_choices(rewards, draws, rank_to_consider,
+                                       n_users)
+        reward = arms.draw(choices)
+        # initialization: every user draws its arm whatever the collisions
         if t < n_arms:
-            choices = [user.decision(t) for user in users]
-            for (user_id, choice) in enumerate(choices):
-                arm = arms[choice]
-                user = users[user_id]
-                user.arm_id = choice
-                user.draw_from_arm(arm, t)
+            draws[replica_ids, user_ids, choices] += 1
+            rewards[replica_ids, user_ids, choices] += reward
+            continue
         # main loop
-        else:
-            choices = [user.decision(t) for user in users]
-            choice_count = collections.Counter(choices)
-            # watch for collisions and update 'rank_to_consider'
-            collisioned_users_id = (user_id for (user_id, choice)
-                                    in enumerate(choices)
-                                    if choice_count[choice] > 1)
-            for user_id in collisioned_users_id:
-                users[user_id].rank_to_consider = random.randrange(n_users)
-            # draw the arms that have to be drawn (selected only ones)
-            arms_to_draw = [choice for choice
-                            in choices if choice_count[choice] == 1]
-            for (user_id, choice) in enumerate(choices):
-                if choice in arms_to_draw:
-                    arm = arms[choice]
-                    user = users[user_id]
-                    user.arm_id = choice
-                    reward = user.draw_from_arm(arm, t)
-                    total_rewards[t] += reward
+        _, collided = collided_users(choices, n_arms)
+        # watch for collisions and update 'rank_to_consider'
+        new_ranks = np.random.randint(0, n_users, size=(n_replicas, n_users))
+        rank_to_consider = np.where(collided, new_ranks, rank_to_consider)
+        drawn = ~collided
+        reward *= drawn
+        draws[replica_ids, user_ids, choices] += drawn
+        rewards[replica_ids, user_ids, choices] += reward
+        total_rewards[:, t, 0] = reward.sum(axis=1)
     return total_rewards
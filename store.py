@@ -0,0 +1,299 @@
+import json
+
+import numpy as np
+
+MAGIC = b'MPBRUN01'
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+BIT = 'bit'
+
+
+def compact_dtype(values):
+    ''' Narrowest storage able to hold values exactly: single bits for
+    Bernoulli draws and flags, the smallest integer type for counts, float32
+    otherwise.
+        Args:
+            - values (ndarray): the values to be stored.
+        Output:
+            - dtype (str): 'bit' or the name of a numpy dtype.
+    '''
+    values = np.asarray(values)
+    if values.size == 0 or np.isin(values, (0, 1)).all():
+        return BIT
+    if np.array_equal(values, np.round(values)):
+        low, high = values.min(), values.max()
+        for dtype in ('uint8', 'int8', 'uint16', 'int16', 'uint32', 'int32'):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return dtype
+    return 'float32'
+
+
+def _block_nbytes(shape, dtype):
+    n_rows, t_horizon = shape
+    if dtype == BIT:
+        return n_rows * -(-t_horizon // 8)
+    return n_rows * t_horizon * np.dtype(dtype).itemsize
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _read_header(file):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a stored run")
+    return json.loads(file.read(HEADER_SIZE - len(MAGIC)).decode())
+
+
+def _map_block(path, block, t_horizon, mode):
+    n_rows = block['rows']
+    if block['dtype'] == BIT:
+        shape = (n_rows, -(-t_horizon // 8))
+        dtype = np.uint8
+    else:
+        shape = (n_rows, t_horizon)
+        dtype = np.dtype(block['dtype'])
+    if n_rows == 0 or t_horizon == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=block['offset'],
+                     shape=shape)
+
+
+class PackedBits:
+    ''' Read-only (n_rows, t_horizon) view of a bit packed block. Slicing
+    only unpacks the bytes covering the requested time steps.
+    '''
+    def __init__(self, packed, t_horizon):
+        self.packed = packed
+        self.shape = (packed.shape[0], t_horizon)
+        self.dtype = np.dtype(np.uint8)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:, :], dtype=dtype)
+
+    def __getitem__(self, key):
+        rows, times = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(times, slice):
+            steps = range(*times.indices(self.shape[1]))
+        else:
+            t = range(self.shape[1])[times]
+            steps = range(t, t + 1)
+        if len(steps) == 0:
+            block = np.zeros((self.shape[0], 0), dtype=np.uint8)[rows]
+        else:
+            t_min, t_max = min(steps[0], steps[-1]), max(steps[0], steps[-1])
+            first_byte = t_min // 8
+            block = np.unpackbits(
+                self.packed[rows, first_byte:t_max // 8 + 1], axis=-1,
+                bitorder='little')
+            if steps.step == 1:
+                block = block[..., t_min - 8 * first_byte:
+                              t_max + 1 - 8 * first_byte]
+            else:
+                block = block[..., np.asarray(steps) - 8 * first_byte]
+        if not isinstance(times, slice):
+            block = block[..., 0]
+        return block
+
+
+class StoredRun:
+    ''' Lazy access to a run saved by RunWriter. The rewards and collisions
+    are memory-mapped and only read when sliced, e.g.
+    run.rewards[user_id, t_start:t_end].
+    '''
+    def __init__(self, path):
+        '''Args:
+            - path (str): the run file.
+        '''
+        self.path = path
+        with open(path, 'rb') as file:
+            header = _read_header(file)
+        self.metadata = header['metadata']
+        self.n_users = header['n_users']
+        self.t_horizon = header['t_written']
+        self.rewards = self._block(header['rewards'], header['t_horizon'])
+        self.collisions = None
+        if header['collisions'] is not None:
+            self.collisions = self._block(header['collisions'],
+                                          header['t_horizon'])
+
+    def _block(self, block, t_capacity):
+        mapped = _map_block(self.path, block, t_capacity, 'r')
+        if block['dtype'] == BIT:
+            return PackedBits(mapped, self.t_horizon)
+        return mapped[:, :self.t_horizon]
+
+    def total_rewards(self, chunk_size=1 << 16):
+        ''' Sum of the rewards of the users at each time step, computed by
+        chunks of time steps.
+            Output:
+                - total_rewards (ndarray): total reward at each time step.
+        '''
+        total = np.zeros(self.t_horizon)
+        for t_start in range(0, self.t_horizon, chunk_size):
+            t_end = min(t_start + chunk_size, self.t_horizon)
+            total[t_start:t_end] = self.rewards[:, t_start:t_end].sum(0)
+        return total
+
+
+class RunWriter:
+    ''' Writes a run to a single memory-mapped file: a fixed-size json header
+    followed by the rewards block and the collisions block, each stored as
+    one row of t_horizon steps per user. Bernoulli rewards and collision
+    flags are bit packed, other rewards use a narrow dtype. Chunks must be
+    written in order and have one column per time step, which is the layout
+    of the chunks of the *_stream generators, see streaming.chunked.
+    '''
+    def __init__(self, path, n_users, t_horizon, reward_dtype=BIT,
+                 reward_rows=None, collisions=True, metadata=None):
+        '''Args:
+            - path (str): the run file, overwritten if it exists.
+            - n_users (int): number of users.
+            - t_horizon (int): time steps.
+            - reward_dtype (str): 'bit' for Bernoulli rewards, else a numpy
+            dtype name, see compact_dtype.
+            - reward_rows (int): number of rows of the rewards, n_users by
+            default and 1 for the total rewards of a routine.
+            - collisions (bool): whether the collision flags are stored.
+            - metadata (dict): json serializable description of the run.
+        '''
+        self.path = path
+        self.t_horizon = t_horizon
+        self.t_written = 0
+        reward_rows = n_users if reward_rows is None else reward_rows
+        self.header = dict(n_users=n_users, t_horizon=t_horizon, t_written=0,
+                           metadata=metadata or {})
+        offset = HEADER_SIZE
+        self.header['rewards'] = dict(dtype=str(reward_dtype),
+                                      rows=reward_rows, offset=offset)
+        offset = _aligned(offset + _block_nbytes((reward_rows, t_horizon),
+                                                 str(reward_dtype)))
+        self.header['collisions'] = None
+        if collisions:
+            self.header['collisions'] = dict(dtype=BIT, rows=n_users,
+                                             offset=offset)
+            offset += _block_nbytes((n_users, t_horizon), BIT)
+        with open(path, 'wb') as file:
+            file.truncate(offset)
+        self._write_header()
+        self.blocks = {name: _map_block(path, self.header[name], t_horizon,
+                                        'r+')
+                       for name in ('rewards', 'collisions')
+                       if self.header[name] is not None}
+        # time steps received but not yet written, bits are written by bytes
+        self.tails = dict.fromkeys(self.blocks)
+        self.packed_steps = dict.fromkeys(self.blocks, 0)
+
+    def _write_header(self):
+        header = json.dumps(self.header).encode()
+        if len(MAGIC) + len(header) > HEADER_SIZE:
+            raise ValueError("metadata is too large")
+        with open(self.path, 'r+b') as file:
+            file.write(MAGIC + header.ljust(HEADER_SIZE - len(MAGIC)))
+
+    def write(self, t_start, rewards, collisions=None):
+        ''' Appends the time steps t_start to t_start + n of the run.
+            Args:
+                - t_start (int): first time step of the chunk.
+                - rewards (ndarray): (reward_rows, n) rewards.
+                - collisions (ndarray): (n_users, n) collision flags.
+        '''
+        if t_start != self.t_written:
+            raise ValueError("expected time step %d, got %d" %
+                             (self.t_written, t_start))
+        rewards = np.asarray(rewards)
+        self._check_rows('rewards', rewards)
+        n_steps = rewards.shape[1]
+        if self.t_written + n_steps > self.t_horizon:
+            raise ValueError("the run is longer than t_horizon")
+        if 'collisions' in self.blocks:
+            if collisions is None:
+                raise ValueError("the collisions must be written")
+            collisions = np.asarray(collisions)
+            self._check_rows('collisions', collisions)
+            if collisions.shape[1] != n_steps:
+                raise ValueError("expected %d time steps of collisions, got "
+                                 "%d" % (n_steps, collisions.shape[1]))
+        self._append('rewards', rewards)
+        if 'collisions' in self.blocks:
+            self._append('collisions', collisions)
+        self.t_written += n_steps
+
+    def _check_rows(self, name, values):
+        n_rows = self.header[name]['rows']
+        if values.ndim != 2 or values.shape[0] != n_rows:
+            raise ValueError("expected %s of shape (%d, n_steps), got %s" %
+                             (name, n_rows, values.shape))
+
+    def _append(self, name, values):
+        block = self.blocks[name]
+        if self.header[name]['dtype'] != BIT:
+            block[:, self.t_written:self.t_written + values.shape[1]] = values
+            return
+        if not np.isin(values, (0, 1)).all():
+            raise ValueError("%s are not binary" % name)
+        if self.tails[name] is not None:
+            values = np.concatenate((self.tails[name], values), axis=1)
+        first_byte = self.packed_steps[name] // 8
+        n_full = values.shape[1] // 8 * 8
+        block[:, first_byte:first_byte + n_full // 8] = np.packbits(
+            values[:, :n_full].astype(np.uint8), axis=1, bitorder='little')
+        self.packed_steps[name] += n_full
+        self.tails[name] = values[:, n_full:] if values.shape[1] > n_full \
+            else None
+
+    def flush(self):
+        ''' Writes the pending time steps and the header to the file, the run
+        can then be opened with StoredRun while it is being written.
+        '''
+        for name, tail in self.tails.items():
+            if tail is not None:
+                # the last byte is padded, it is written again by _append
+                first_byte = self.packed_steps[name] // 8
+                self.blocks[name][:, first_byte] = np.packbits(
+                    tail.astype(np.uint8), axis=1, bitorder='little')[:, 0]
+        for block in self.blocks.values():
+            if isinstance(block, np.memmap):
+                block.flush()
+        self.header['t_written'] = self.t_written
+        self._write_header()
+
+    def close(self):
+        self.flush()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save_run(path, rewards, collisions=None, metadata=None,
+             reward_dtype=None):
+    ''' Saves the outputs of a routine in compact form.
+        Args:
+            - path (str): the run file.
+            - rewards (ndarray): (n_users, t_horizon) rewards of each user,
+            e.g. from mega_routine, or (1, t_horizon) total rewards.
+            - collisions (ndarray): (n_users, t_horizon) collision flags.
+            - metadata (dict): json serializable description of the run.
+            - reward_dtype (str): storage of the rewards, inferred from the
+            values if None.
+        Output:
+            - run (StoredRun): the saved run.
+    '''
+    rewards = np.asarray(rewards)
+    if reward_dtype is None:
+        reward_dtype = compact_dtype(rewards)
+    n_users = rewards.shape[0] if collisions is None else len(collisions)
+    with RunWriter(path, n_users, rewards.shape[1],
+                   reward_dtype=reward_dtype, reward_rows=rewards.shape[0],
+                   collisions=collisions is not None,
+                   metadata=metadata) as writer:
+        writer.write(0, rewards, collisions)
+    return StoredRun(path)
@@ -0,0 +1,51 @@
+import itertools
+
+import numpy as np
+
+
+def time_steps(t_horizon, t_start=0):
+    '''Args:
+            - t_horizon (int): time steps, None for an endless run.
+            - t_start (int): first time step.
+        Output:
+            - steps (iterable): the time steps of the run.
+    '''
+    if t_horizon is None:
+        return itertools.count(t_start)
+    return range(t_start, t_horizon)
+
+
+def chunked(steps, chunk_size):
+    '''Groups the rows produced step by step by a routine into fixed-size
+    chunks, so that a run can be consumed in bounded memory. Every *_stream
+    generator hands out its chunks with this layout: one row per user (or a
+    single row for a total reward) and one column per time step, as the
+    outputs of mega_routine and the blocks of a stored run, see
+    store.RunWriter.
+        Args:
+            - steps (iterable): yields, for each time step, a (rewards,
+            collisions) pair of rows (list or ndarray).
+            - chunk_size (int): number of time steps per chunk, the last chunk
+            may be shorter.
+        Output:
+            - chunks (generator): yields (t_start, rewards, collisions) where
+            rewards and collisions stack the rows of time steps t_start to
+            t_start + rewards.shape[1] along the last axis.
+    '''
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    t_start, n_columns = 0, 0
+    for reward_row, collision_row in steps:
+        if n_columns == 0:
+            rewards = np.zeros(np.shape(reward_row) + (chunk_size,))
+            collisions = np.zeros(np.shape(collision_row) + (chunk_size,),
+                                  dtype=np.uint8)
+        rewards[:, n_columns] = reward_row
+        collisions[:, n_columns] = collision_row
+        n_columns += 1
+        if n_columns == chunk_size:
+            yield t_start, rewards, collisions
+            t_start += n_columns
+            n_columns = 0
+    if n_columns:
+        yield t_start, rewards[:, :n_columns], collisions[:, :n_columns]
@@ -0,0 +1,243 @@
+import functools
+import hashlib
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from montecarlo import replica_rewards, seed_replica
+
+
+class ResultCache:
+    ''' On-disk cache of the results of sweep cells, addressed by the hash of
+    their content. The least recently used results are evicted when the cache
+    grows beyond max_bytes, down to low_water times max_bytes so that the
+    directory is only scanned once every few puts. The size is tracked
+    incrementally from a first scan; results written by other processes are
+    only counted at the next scan.
+    '''
+    # fraction of max_bytes kept by an eviction
+    low_water = 0.9
+
+    def __init__(self, directory, max_bytes=2**30):
+        '''Args:
+            - directory (str): where the results are stored
+            - max_bytes (int): maximal size of the cache on disk
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # size of the results on disk, scanned at the first use
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        '''Args:
+            - key (str): the hash of the cell
+        Output:
+            - ndarray: the stored result, None if it is not in the cache
+        '''
+        path = self._path(key)
+        try:
+            result = np.load(path)
+        except (OSError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(path)
+        return result
+
+    def put(self, key, result):
+        '''Args:
+            - key (str): the hash of the cell
+            - result (ndarray): the result to store
+        '''
+        size = self.size()
+        path = self._path(key)
+        if os.path.exists(path):
+            size -= os.path.getsize(path)
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            np.save(f, result)
+        os.replace(tmp_path, path)
+        self._size = size + os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def size(self):
+        '''Output:
+            - int: the size of the results in the cache, in bytes
+        '''
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def evict(self):
+        '''Removes the least recently used results until the cache fits in
+        low_water times max_bytes.
+        '''
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, name in sorted(entries):
+                if total <= self.low_water * self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._size = total
+
+
+def cell_key(routine, routine_args, seed):
+    '''Content hash of a sweep cell.
+        Args:
+            - routine (function): the routine of the cell
+            - routine_args (dict): all the keyword arguments of the routine
+            (scenario and parameters)
+            - seed (int): the seed of the cell
+        Output:
+            - str: the hex digest identifying the cell
+    '''
+    function, bound_args, bound_kwargs = _unwrap(routine)
+    content = json.dumps({
+        'routine': function.__module__ + '.' + function.__name__,
+        'bound_args': bound_args,
+        # the arguments of the call override the ones bound by a partial
+        'args': dict(bound_kwargs, **routine_args),
+        'seed': seed,
+    }, sort_keys=True, default=_to_json)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _unwrap(routine):
+    '''Function of a routine and the arguments bound to it by partials, e.g.
+    the routines of registry.get.
+        Output:
+            - function, list, dict: the function, its bound positional and
+            keyword arguments
+    '''
+    args, kwargs = [], {}
+    while isinstance(routine, functools.partial):
+        args = list(routine.args) + args
+        kwargs = dict(routine.keywords, **kwargs)
+        routine = routine.func
+    return routine, args, kwargs
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("cannot hash {!r}".format(value))
+
+
+def expand_grid(grid):
+    '''Args:
+            - grid (dict): the values taken by each parameter
+        Output:
+            - list[dict]: every combination of the parameter values
+    '''
+    names = sorted(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+def routine_arguments(routine, scenario, point):
+    '''Builds the keyword arguments of a routine for a grid point. The point
+    entries named after an argument of the routine (e.g. alg) are passed
+    as is, the others (e.g. c, beta, t0) update the params dict.
+        Args:
+            - routine (function): the routine
+            - scenario (dict): n_users, n_arms, t_horizon, arm_means and the
+            base params of the routine if it takes some
+            - point (dict): the swept parameter values
+        Output:
+            - dict: the keyword arguments of the routine
+    '''
+    arguments = inspect.signature(routine).parameters
+    routine_args = {name: value for name, value in scenario.items()
+                    if name in arguments}
+    params = dict(scenario.get('params', {}))
+    for name, value in point.items():
+        if name in arguments:
+            routine_args[name] = value
+        elif 'params' in arguments:
+            params[name] = value
+        else:
+            raise ValueError("{} takes no parameter {}".format(
+                _unwrap(routine)[0].__name__, name))
+    if 'params' in arguments:
+        routine_args['params'] = params
+    return routine_args
+
+
+def _run_cell(job):
+    routine, routine_args, seed = job
+    seed_replica(np.random.SeedSequence(seed))
+    return replica_rewards(routine(**routine_args))
+
+
+def sweep(routine, scenario, grid, seeds, cache=None, n_workers=1):
+    '''Runs a routine over a parameter grid, computing only the cells which
+    are not in the cache.
+        Args:
+            - routine (function): tdfs_routine, rho_rand_routine,
+            mega_routine or mc_routine
+            - scenario (dict): n_users, n_arms, t_horizon, arm_means and the
+            base params of the routine
+            - grid (dict): the values taken by each swept parameter
+            - seeds (list[int]): one replica is run per seed
+            - cache (ResultCache): where the cells are looked for and stored
+            - n_workers (int): number of processes for the missing cells
+        Output:
+            - list of (point, rewards): each grid point with its
+            (len(seeds), t_horizon) total rewards
+    '''
+    points = expand_grid(grid)
+    results = [np.zeros((len(seeds), scenario['t_horizon']))
+               for _ in points]
+    missing = []
+    for i, point in enumerate(points):
+        routine_args = routine_arguments(routine, scenario, point)
+        for j, seed in enumerate(seeds):
+            key = cell_key(routine, routine_args, seed)
+            cached = cache.get(key) if cache is not None else None
+            if cached is None:
+                missing.append((i, j, key, (routine, routine_args, seed)))
+            else:
+                results[i][j] = cached
+    jobs = [job for _, _, _, job in missing]
+    if n_workers > 1 and len(jobs) > 1:
+        with multiprocessing.Pool(n_workers) as pool:
+            computed = pool.map(_run_cell, jobs)
+    else:
+        computed = map(_run_cell, jobs)
+    for (i, j, key, _), rewards in zip(missing, computed):
+        results[i][j] = rewards
+        if cache is not None:
+            cache.put(key, rewards)
+    return list(zip(points, results))
@@ -0,0 +1,154 @@
+import numpy as np
+
+
+class RewardTape:
+    ''' Rewards of every Bernoulli arm of a replica, shared by the algorithms
+    compared on it (common random numbers): the n-th pull of the arm k pays
+    u[k, n] < arm_means[k], whichever algorithm pulls it and at whichever
+    time step, so that two algorithms pulling an arm as often see the same
+    rewards and their difference is not blurred by the luck of their draws.
+    The uniforms u come from a counter-based Philox stream and are generated
+    lazily by blocks of block_size pulls : any pull can be read without
+    generating the previous ones and the memory does not grow with the
+    horizon. The tape itself is immutable, the arms it hands out count
+    their pulls.
+    '''
+    def __init__(self, arm_means, seed=None, block_size=4096):
+        '''Args:
+            - arm_means (list of float): the means of the Bernoulli arms
+            - seed (int or np.random.SeedSequence): key of the tape, two
+                tapes with the same seed are identical
+            - block_size (int): number of pulls of an arm generated at once
+        '''
+        self.arm_means = np.array(arm_means, dtype=float)
+        if np.any((self.arm_means < 0) | (self.arm_means > 1)):
+            raise ValueError("the means of Bernoulli arms must be between 0 "
+                             "and 1")
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.key = seed.generate_state(2, dtype=np.uint64)
+        self.block_size = block_size
+
+    @property
+    def n_arms(self):
+        return len(self.arm_means)
+
+    def same_as(self, other):
+        '''Args:
+            - other (RewardTape): another tape, e.g. unpickled
+            Output:
+                - bool: whether both tapes hold the same rewards
+        '''
+        return np.array_equal(self.key, other.key) and \
+            self.block_size == other.block_size and \
+            np.array_equal(self.arm_means, other.arm_means)
+
+    def block(self, arm_id, block_id):
+        '''Args:
+            - arm_id (int): the arm
+            - block_id (int): the block, of the pulls
+                [block_id * block_size, (block_id + 1) * block_size)
+            Output:
+                - ndarray: (block_size,) bool rewards of the block
+        '''
+        # the arm and the block id are the two high words of the 256 bits
+        # counter, so that the blocks never overlap
+        generator = np.random.Generator(np.random.Philox(
+            key=self.key, counter=(arm_id << 192) | (block_id << 128)))
+        return generator.random(self.block_size) < self.arm_means[arm_id]
+
+    def reward(self, arm_id, pull):
+        '''Args:
+            - arm_id (int): the arm
+            - pull (int): the pull of the arm, from 0
+            Output:
+                - int: 1 or 0, the reward of the pull
+        '''
+        block_id, index = divmod(pull, self.block_size)
+        return int(self.block(arm_id, block_id)[index])
+
+    def rewards(self, arm_id, pull_start, pull_end):
+        '''Args:
+            - arm_id (int): the arm
+            - pull_start, pull_end (int): the pulls [pull_start, pull_end)
+            Output:
+                - ndarray: (pull_end - pull_start,) rewards of the pulls
+        '''
+        first, last = pull_start // self.block_size, \
+            (pull_end - 1) // self.block_size
+        blocks = [self.block(arm_id, block_id)
+                  for block_id in range(first, last + 1)]
+        offset = pull_start - first * self.block_size
+        return np.concatenate(blocks)[offset:offset + pull_end - pull_start] \
+            .astype(float)
+
+    def arms(self, n_arms=None):
+        '''Args:
+            - n_arms (int): number of arms, all the arms of the tape if None
+            Output:
+                - list of TapeArm: new arms reading the tape from their first
+                pull
+        '''
+        if n_arms is None:
+            n_arms = self.n_arms
+        if n_arms > self.n_arms:
+            raise ValueError("the tape only has %d arms" % self.n_arms)
+        return [TapeArm(self, arm_id) for arm_id in range(n_arms)]
+
+
+class TapeArm:
+    ''' Bernoulli arm whose rewards are read from a RewardTape, its n-th draw
+    paying the n-th pull of the arm on the tape. The number of pulls is
+    pickled with the arm, so that a checkpointed run resumes on the tape
+    where it stopped.
+    '''
+    def __init__(self, tape, arm_id):
+        '''Args:
+            - tape (RewardTape): the rewards of the arm
+            - arm_id (int): the arm in the tape
+        '''
+        self.tape = tape
+        self.arm_id = arm_id
+        self.p = tape.arm_means[arm_id]
+        self.pulls = 0
+        self._block_id = -1
+        self._block = None
+
+    def __getstate__(self):
+        # the cached block is generated again after unpickling
+        return dict(self.__dict__, _block_id=-1, _block=None)
+
+    def draw(self, size=None):
+        if size is not None:
+            raise ValueError("a tape arm is pulled one reward at a time")
+        block_id, index = divmod(self.pulls, self.tape.block_size)
+        if block_id != self._block_id:
+            self._block = self.tape.block(self.arm_id, block_id)
+            self._block_id = block_id
+        self.pulls += 1
+        return int(self._block[index])
+
+    def mean(self):
+        return self.p
+
+
+def tape_arms(tape, arm_means, n_arms, resumed=None):
+    '''Arms of a routine reading a tape.
+        Args:
+            - tape (RewardTape): the rewards of the arms
+            - arm_means (list of float): the means of the arms of the routine
+            - n_arms (int): number of arms
+            - resumed (list of TapeArm): the arms of a resumed run, which go
+            on from their pulls
+        Output:
+            - list of TapeArm: the first n_arms arms of the tape
+    '''
+    if not np.array_equal(tape.arm_means[:n_arms],
+                          np.asarray(arm_means[:n_arms], dtype=float)):
+        raise ValueError("the tape has other arm means than the routine")
+    if resumed is None:
+        return tape.arms(n_arms)
+    if not all(isinstance(arm, TapeArm) and arm.tape.same_as(tape)
+               for arm in resumed):
+        raise ValueError("the resumed run was not played on this tape")
+    return resumed
@@ -0,0 +1,74 @@
+import functools
+
+import numpy as np
+
+
+def kl_divergence_matrix(arm_means):
+    '''Calculates the Kullback-Leibler divergences D(p||q) between every pair
+    of Bernoulli distributions. Means of exactly 0 or 1 are handled with the
+    convention 0 * log(0) = 0, which gives an infinite divergence when q is 0
+    or 1 and p is not.
+        Args:
+            - arm_means (ndarray): the parameters (means) of the Bernoulli dist
+        Output:
+            - ndarray: kl[i, j] is the KL divergence D(arm_means[i] ||
+            arm_means[j])
+    '''
+    p = np.asarray(arm_means, dtype=float)[:, None]
+    q = np.asarray(arm_means, dtype=float)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        success = np.where(p > 0, p * np.log(p / q), 0.)
+        failure = np.where(p < 1, (1 - p) * np.log((1 - p) / (1 - q)), 0.)
+    return success + failure
+
+
+def inverse_kl_sums(arm_means):
+    '''Calculates for every arm the sum of 1 / D(mu' || mu) over the arms of
+    smaller means mu'.
+        Args:
+            - arm_means (ndarray): the means of all the arms
+        Output:
+            - ndarray: the sum for every arm
+    '''
+    arm_means = np.asarray(arm_means, dtype=float)
+    kl = kl_divergence_matrix(arm_means)
+    smaller = arm_means[:, None] < arm_means[None, :]
+    with np.errstate(divide='ignore'):
+        inverse_kl = np.where(smaller, 1 / kl, 0.)
+    return inverse_kl.sum(axis=0)
+
+
+@functools.lru_cache(maxsize=4096)
+def _log_upper_bound(n_users, arm_means):
+    arm_means = np.array(arm_means)
+    ordered = np.argsort(arm_means)[::-1]
+    ordered_arm_means = arm_means[ordered]
+    # x_k is the sum of the inverse KL sums of the k best arms
+    sums = inverse_kl_sums(arm_means)[ordered]
+    x = np.concatenate(([0.], np.cumsum(sums)))[:n_users]
+    first_sum = x.sum() * ordered_arm_means[:n_users].sum()
+    second_sum = 0.
+    if n_users < len(arm_means):
+        threshold = ordered_arm_means[n_users]
+        worse = arm_means[arm_means < threshold]
+        with np.errstate(divide='ignore'):
+            inverse_kl = 1 / kl_divergence_matrix(
+                np.append(worse, threshold))[:-1, -1]
+        second_sum = np.sum(worse * np.maximum(inverse_kl, 0))
+    return float(n_users * (first_sum - second_sum))
+
+
+def tdfs_log_upper_bound(n_users, arm_means):
+    '''Calculates the upper bound constant of the expected regret for a given
+    multi-player and multi-arm bandit problem, as defined in
+    https://arxiv.org/pdf/0910.2065.pdf (Theorem 2). The pairwise KL
+    divergences are computed once and the results are cached.
+        Args:
+            - n_users (int): the number of players in the pb
+            - arm_means (list[float]): the means of the arms considered in the
+            pb
+        Output:
+            - float: the constant for the logarithmic upper bound of the pb
+    '''
+    return _log_upper_bound(int(n_users),
+                            tuple(float(mean) for mean in arm_means))
@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+
+from jit import jit, best_arms
+
+# algorithm codes of the kernel
+ALGS = {'ucb': 0, 'ts': 1}
+
+
+@jit
+def tdfs_kernel(seed, arm_means, n_users, t_horizon, alg):
+    '''Time loop of tdfs_routine with the users stored as arrays.
+        Args:
+            - seed (int): seed of the random stream of the kernel.
+            - arm_means (ndarray): (n_arms) means of the Bernoulli arms.
+            - n_users (int): number of users.
+            - t_horizon (int): time steps.
+            - alg (int): ALGS code of the algorithm decision.
+        Output:
+            - total_rewards (ndarray): total reward at each time step.
+            - collisions (ndarray): (t_horizon, n_users) collision flags.
+    '''
+    np.random.seed(seed)
+    n_arms = arm_means.shape[0]
+    offset = np.zeros(n_users, dtype=np.int64)
+    for i in range(n_users):
+        offset[i] = int(np.random.random() * n_users)
+    arms_rew = np.zeros((n_users, n_arms))
+    draws = np.zeros((n_users, n_arms))
+    collided_in_subsequence = np.zeros(n_users, dtype=np.bool_)
+    choices = np.zeros(n_users, dtype=np.int64)
+    occupancy = np.zeros(n_arms, dtype=np.int64)
+    stats = np.zeros(n_arms)
+    ranking = np.zeros(n_users, dtype=np.int64)
+    taken = np.zeros(n_arms, dtype=np.bool_)
+    total_rewards = np.zeros(t_horizon)
+    collisions = np.zeros((t_horizon, n_users), dtype=np.uint8)
+    for t in range(t_horizon):
+        for i in range(n_users):
+            if alg == 0:
+                initialization = False
+                for k in range(n_arms):
+                    if draws[i, k] == 0:
+                        initialization = True
+                if initialization:
+                    choices[i] = (t + offset[i]) % n_arms
+                    continue
+                rank = (t - n_arms + offset[i]) % n_users
+                for k in range(n_arms):
+                    stats[k] = arms_rew[i, k] / draws[i, k] + \
+                        math.sqrt(math.log(t) / draws[i, k])
+            else:
+                rank = (t + offset[i]) % n_users
+                for k in range(n_arms):
+                    stats[k] = np.random.beta(
+                        arms_rew[i, k] + 1, draws[i, k] - arms_rew[i, k] + 1)
+            best_arms(stats, rank + 1, ranking, taken)
+            choices[i] = ranking[rank]
+        occupancy[:] = 0
+        for i in range(n_users):
+            occupancy[choices[i]] += 1
+        for i in range(n_users):
+            arm = choices[i]
+            if occupancy[arm] > 1:
+                collided_in_subsequence[i] = True
+                collisions[t, i] = 1
+            else:
+                reward = 0.
+                if np.random.random() < arm_means[arm]:
+                    reward = 1.
+                draws[i, arm] += 1
+                arms_rew[i, arm] += reward
+                total_rewards[t] += reward
+        if (t == n_arms) or ((t > n_arms) and ((t - n_arms) % n_users == 0)):
+            # end of a subsequence, the users that collided change offset
+            for i in range(n_users):
+                if collided_in_subsequence[i]:
+                    offset[i] = int(np.random.random() * n_users)
+                    collided_in_subsequence[i] = False
+    return total_rewards, collisions
@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+
+from jit import jit, best_arms
+from online import Policy
+from registry import check_alg
+from .kernels import ALGS
+
+# positions of the scalars in the state of a TDFSPolicy
+T, ARM, OFFSET, COLLIDED_IN_SUBSEQUENCE = range(4)
+
+
+@jit
+def tdfs_select(scalars, arms_rew, draws, n_users, alg, stats, ranking,
+                taken):
+    '''Arm of a TDFS user at its current time step, as in
+    SecondaryUser.decision.
+        Args:
+            - scalars (ndarray): the scalars of the state, see T
+            - arms_rew, draws (ndarray): (n_arms) statistics of the user
+            - n_users (int): number of users
+            - alg (int): ALGS code of the algorithm decision
+            - stats, ranking, taken (ndarray): (n_arms) scratch arrays
+        Output:
+            - int: the arm to play
+    '''
+    t = int(scalars[T])
+    offset = int(scalars[OFFSET])
+    n_arms = draws.shape[0]
+    if alg == 0:
+        for k in range(n_arms):
+            if draws[k] == 0:
+                # initialization: every arm is drawn once
+                arm = (t + offset) % n_arms
+                scalars[ARM] = arm
+                return arm
+        rank = (t - n_arms + offset) % n_users
+        for k in range(n_arms):
+            stats[k] = arms_rew[k] / draws[k] + \
+                math.sqrt(math.log(t) / draws[k])
+    else:
+        rank = (t + offset) % n_users
+        for k in range(n_arms):
+            stats[k] = np.random.beta(arms_rew[k] + 1,
+                                      draws[k] - arms_rew[k] + 1)
+    best_arms(stats, rank + 1, ranking, taken)
+    arm = ranking[rank]
+    scalars[ARM] = arm
+    return arm
+
+
+@jit
+def tdfs_update(scalars, arms_rew, draws, n_users, reward, collided):
+    '''Feedback of the arm played at the current time step, the offset is
+    drawn again at the end of a subsequence with collisions, as in
+    tdfs_routine.
+    '''
+    t = int(scalars[T])
+    n_arms = draws.shape[0]
+    arm = int(scalars[ARM])
+    if collided:
+        scalars[COLLIDED_IN_SUBSEQUENCE] = 1.
+    else:
+        draws[arm] += 1
+        arms_rew[arm] += reward
+    if (t == n_arms) or ((t > n_arms) and ((t - n_arms) % n_users == 0)):
+        if scalars[COLLIDED_IN_SUBSEQUENCE]:
+            scalars[OFFSET] = int(np.random.random() * n_users)
+            scalars[COLLIDED_IN_SUBSEQUENCE] = 0.
+    scalars[T] = t + 1
+
+
+class TDFSPolicy(Policy):
+    ''' TDFS policy of one node: each node explores the arms in turn and then
+    plays its (t + offset)-th best arm, the offset changing after the
+    subsequences in which it collided.
+    '''
+    n_scalars = 4
+    n_arm_stats = 2
+
+    def __init__(self, n_arms, n_users, alg='ucb'):
+        '''Args:
+            - n_arms (int): number of arms
+            - n_users (int): number of nodes sharing the arms, at most n_arms
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+        '''
+        check_alg('tdfs', alg)
+        if n_users > n_arms:
+            raise ValueError("TDFS needs n_users <= n_arms")
+        super().__init__(n_arms)
+        self.n_users = n_users
+        self.alg = ALGS[alg]
+        self.arms_rew, self.draws = self.arm_stats
+        self.scalars[OFFSET] = np.random.randint(n_users)
+
+    def select(self):
+        return tdfs_select(self.scalars, self.arms_rew, self.draws,
+                           self.n_users, self.alg, self.stats, self.ranking,
+                           self.taken)
+
+    def update(self, reward, collided):
+        tdfs_update(self.scalars, self.arms_rew, self.draws, self.n_users,
+                    reward, collided)
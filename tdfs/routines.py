@@ -1,14 +1,25 @@
-import collections
 import math
 import random
 
 import numpy as np
 
-from arms import ArmBernoulli
-from .users import SecondaryUser
+from arms import ArmBernoulli, ArmBank
+from checkpoint import resize, routine_args
+from collisions import collided_users
+from jit import run_kernel, use_jit
+from profiling import NULL_PROFILE, as_profile, with_profile
+from ranking import ranked_choice
+from registry import check_alg
+from streaming import chunked, time_steps
+from tapes import tape_arms
+from thompson import thompson_choices
+from . import bounds, kernels
+from .users import SecondaryUser, decisions
 
 
-def tdfs_routine(n_users, n_arms, t_horizon, arm_means, alg='ucb'):
+def tdfs_routine(n_users, n_arms, t_horizon, arm_means, alg='ucb',
+                 checkpoint=None, backend='numpy', profile=False,
+                 tape=None):
     '''Apply TDFS avoidance strategy to a pb with t_horizon time steps.
         Args:
             - n_users (int): number of users.
@@ -17,40 +28,184 @@ def tdfs_routine(n_users, n_arms, t_horizon, arm_means, alg='ucb'):
             - alg (str): algorithm decision. 'ucb' or 'ts'
             - arm_means (list[float]): the list of arm means to be used in this
             routine.
+            - checkpoint (Checkpoint): where the run is saved. If it exists
+            the run resumes from it, possibly up to a longer horizon.
+            - backend (str): 'numpy', or 'jit_distributional' to run the
+            time loop in a kernel compiled with numba, which only matches the
+            numpy routine in distribution, see jit.py.
+            - profile (bool or Profile): accumulate the wall time and calls
+            of the phases of the steps, see profiling.py.
+            - tape (RewardTape): rewards of the successive pulls of each
+            arm, shared with the other algorithms of a replica, see tapes.py.
+            A resumed run must be given the same tape.
         Output:
             - total_rewards (ndarray): total reward at each time step.
+            - profile (Profile): only if profile is enabled.
     '''
-    arms = list()
-    for i in range(n_arms):
-        arms.append(ArmBernoulli(arm_means[i]))
-    users = [SecondaryUser(n_arms, n_users, t_horizon) for i in range(n_users)]
-    total_rewards = np.zeros((t_horizon, 1))
-    for t in range(t_horizon):
-        choices = [user.decision(t, alg=alg) for user in users]
-        choice_count = collections.Counter(choices)
-        collisioned_users_id = (user_id for (user_id, choice)
-                                in enumerate(choices)
-                                if choice_count[choice] > 1)
-        for user_id in collisioned_users_id:
+    check_alg('tdfs', alg)
+    profile = as_profile(profile)
+    if use_jit(backend, checkpoint=checkpoint, tape=tape, n_users=n_users,
+               n_arms=n_arms):
+        with profile.phase('kernel'):
+            total_rewards, _ = run_kernel(
+                kernels.tdfs_kernel,
+                np.asarray(arm_means[:n_arms], dtype=float), n_users,
+                t_horizon, kernels.ALGS[alg])
+        return with_profile(total_rewards[:, None], profile)
+    args = routine_args(arm_means, n_users=n_users, n_arms=n_arms, alg=alg)
+    state = checkpoint.load('tdfs', args) if checkpoint is not None else None
+    if state is None:
+        arms = list()
+        for i in range(n_arms):
+            arms.append(ArmBernoulli(arm_means[i]))
+        users = [SecondaryUser(n_arms, n_users, t_horizon)
+                 for i in range(n_users)]
+        t_start = 0
+        total_rewards = np.zeros((t_horizon, 1))
+    else:
+        arms, users, t_start = state['arms'], state['users'], state['t']
+        total_rewards = resize(state['total_rewards'], t_horizon, axis=0)
+    if tape is not None:
+        arms = tape_arms(tape, arm_means, n_arms,
+                         None if state is None else arms)
+
+    def save(t):
+        checkpoint.save(dict(routine='tdfs', args=args, t=t, arms=arms,
+                             users=users, total_rewards=total_rewards[:t]))
+
+    for t in range(t_start, t_horizon):
+        total_rewards[t], _ = _tdfs_step(users, arms, t, alg, profile)
+        if checkpoint is not None and checkpoint.due(t):
+            with profile.phase('checkpoint'):
+                save(t + 1)
+    if checkpoint is not None and t_horizon > t_start:
+        with profile.phase('checkpoint'):
+            save(t_horizon)
+    return with_profile(total_rewards, profile)
+
+
+def _tdfs_step(users, arms, t, alg, profile=NULL_PROFILE):
+    '''Play the time step t of the TDFS avoidance strategy, the cost of its
+    phases being accumulated in profile.
+        Output:
+            - reward (float): total reward of the users.
+            - collided (ndarray): bool mask of the colliding users.
+    '''
+    n_arms = len(arms)
+    with profile.phase('decisions'):
+        choices = decisions(users, t, alg=alg)
+    with profile.phase('collisions'):
+        _, collided = collided_users(choices, n_arms)
+        for user_id in np.flatnonzero(collided):
             users[user_id].collided_in_subsequence = True
-        arms_to_draw = [choice for choice in choices
-                        if choice_count[choice] == 1]
-        for (user_id, choice) in enumerate(choices):
-            if choice in arms_to_draw:
-                arm = arms[choice]
-                user = users[user_id]
-                reward = arm.draw()
-                user.draws[choice] += 1
-                user.rewards[choice, t] = reward
-                total_rewards[t] += reward
-        if (t == n_arms) or ((t > n_arms) and ((t - n_arms) % n_users == 0)):
-            # We are at the end of a subsequence corresponding to
-            # initialization or classic.
-            # Therefore, we must correct the offsets.
+    # draw the arms that have to be drawn (selected only ones)
+    drawing = np.flatnonzero(~collided)
+    with profile.phase('draws'):
+        rewards = [arms[choices[user_id]].draw() for user_id in drawing]
+    with profile.phase('updates'):
+        for user_id, reward in zip(drawing, rewards):
+            user = users[user_id]
+            user.arm_id = choices[user_id]
+            user.update(reward, t)
+    if (t == n_arms) or ((t > n_arms) and ((t - n_arms) % len(users) == 0)):
+        # We are at the end of a subsequence corresponding to
+        # initialization or classic.
+        # Therefore, we must correct the offsets.
+        with profile.phase('offsets'):
             for user in users:
                 if user.collided_in_subsequence:
                     user.offset = random.randint(0, user.n_users - 1)
                     user.collided_in_subsequence = False
+    return sum(rewards), collided
+
+
+def tdfs_stream(n_users, n_arms, arm_means, t_horizon=None, alg='ucb',
+                chunk_size=1000):
+    '''Apply TDFS avoidance strategy step by step, the results being handed
+    out in chunks as the run goes instead of at the end of the horizon.
+        Args:
+            - n_users (int): number of users.
+            - n_arms (int): number of arms.
+            - arm_means (list[float]): the list of arm means to be used in this
+            routine.
+            - t_horizon (int): time steps, the run goes on until the consumer
+            stops if None.
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+            - chunk_size (int): number of time steps per chunk.
+        Output:
+            - chunks (generator): yields (t_start, total_rewards, collisions)
+            with total_rewards (1, chunk_size) the total reward and
+            collisions (n_users, chunk_size) the collision flags of the users
+            at each time step of the chunk, see streaming.chunked.
+    '''
+    check_alg('tdfs', alg)
+    arms = [ArmBernoulli(arm_means[i]) for i in range(n_arms)]
+    users = [SecondaryUser(n_arms, n_users, t_horizon)
+             for i in range(n_users)]
+    steps = (_tdfs_step(users, arms, t, alg) for t in time_steps(t_horizon))
+    return chunked((([reward], collided) for reward, collided in steps),
+                   chunk_size)
+
+
+def tdfs_batch_routine(n_replicas, n_users, n_arms, t_horizon, arm_means,
+                       alg='ucb'):
+    '''Apply TDFS avoidance strategy to n_replicas independent pbs with
+    t_horizon time steps at once. The users of every replica are stored as
+    (n_replicas, n_users, n_arms) arrays so that decisions, collisions and
+    reward draws are vectorized across the replica axis.
+        Args:
+            - n_replicas (int): number of independent simulations.
+            - n_users (int): number of users.
+            - n_arms (int): number of arms.
+            - t_horizon (int): time steps.
+            - arm_means (list[float]): the list of arm means to be used in this
+            routine.
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+        Output:
+            - total_rewards (ndarray): (n_replicas, t_horizon, 1) total reward
+            at each time step, total_rewards[r] is distributed like the output
+            of tdfs_routine.
+    '''
+    check_alg('tdfs', alg)
+    arms = ArmBank.bernoulli(arm_means[:n_arms])
+    offsets = np.random.randint(0, n_users, size=(n_replicas, n_users))
+    rewards = np.zeros((n_replicas, n_users, n_arms))
+    draws = np.zeros((n_replicas, n_users, n_arms))
+    collided_in_subsequence = np.zeros((n_replicas, n_users), dtype=bool)
+    total_rewards = np.zeros((n_replicas, t_horizon, 1))
+    replica_ids = np.arange(n_replicas)[:, None]
+    user_ids = np.arange(n_users)[None, :]
+    for t in range(t_horizon):
+        if alg == 'ucb':
+            choices = (t + offsets) % n_arms
+            initializing = np.sum(draws > 0, axis=2) < n_arms
+            if not initializing.all():
+                # same statistic as SecondaryUser.decision_ucb, the users
+                # still in initialization are masked out below.
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ucb_stat = rewards / draws +\
+                        np.sqrt(math.log(t) / draws)
+                top_arm_to_consider = (t - n_arms + offsets) % n_users
+                choices = np.where(initializing, choices, ranked_choice(
+                    ucb_stat, top_arm_to_consider, n_users))
+        else:
+            top_arm_to_consider = (t + offsets) % n_users
+            choices = thompson_choices(rewards, draws, top_arm_to_consider,
+                                       n_users)
+        _, collided = collided_users(choices, n_arms)
+        collided_in_subsequence |= collided
+        drawn = ~collided
+        reward = drawn * arms.draw(choices)
+        draws[replica_ids, user_ids, choices] += drawn
+        rewards[replica_ids, user_ids, choices] += reward
+        total_rewards[:, t, 0] = reward.sum(axis=1)
+        if (t == n_arms) or ((t > n_arms) and ((t - n_arms) % n_users == 0)):
+            # We are at the end of a subsequence: correct the offsets of the
+            # users that collided during it.
+            new_offsets = np.random.randint(0, n_users,
+                                            size=(n_replicas, n_users))
+            offsets = np.where(collided_in_subsequence, new_offsets, offsets)
+            collided_in_subsequence[:] = False
     return total_rewards
 
 
@@ -96,16 +251,6 @@ def tdfs_log_upper_bound(n_users, arm_means):
             pb
         Output:
             - float: the constant for the logarithmic upper bound of the pb
+    The computation is vectorized and cached in tdfs.bounds.
     '''
-    ordered_arm_means = np.sort(arm_means)
-    ordered_arm_means = ordered_arm_means[::-1]
-    first_sum = sum(
-        (sum(
-            (x_k(arm_means, k) * ordered_arm_means[i]
-             for k in range(n_users)))
-         for i in range(n_users)))
-    second_sum = sum(
-        (arm_mean * max(1/kl_divergence_bernoulli(
-            arm_mean, ordered_arm_means[n_users]), 0)
-         for arm_mean in arm_means if arm_mean < ordered_arm_means[n_users]))
-    return n_users * (first_sum-second_sum)
+    return bounds.tdfs_log_upper_bound(n_users, arm_means)
@@ -1,25 +1,33 @@
-import math
 import numpy as np
 import random
 
+from ranking import UCBRanking
+from thompson import thompson_choices
+
 
 class SecondaryUser:
     ''' class used for user behaviour
     '''
 
-    def __init__(self, n_arms, n_users, t_horizon):
+    def __init__(self, n_arms, n_users, t_horizon, recorder=None):
         self.n_arms = n_arms
         self.n_users = n_users
         self.offset = random.randint(0, n_users - 1)
-        self.rewards = np.zeros((n_arms, t_horizon))
+        # sum of the rewards obtained on each arm
+        self.arms_rew = np.zeros(n_arms)
+        # optional RewardRecorder keeping the per-step rewards
+        self.recorder = recorder
         self.draws = np.zeros(n_arms)
+        self.arm_id = -1
+        # number of arms drawn at least once, the initialization ends when
+        # it reaches n_arms
+        self.n_drawn_arms = 0
+        # best UCB arms, updated with the drawn arms only
+        self.ucb_ranking = UCBRanking(n_arms, n_users)
         self.collided_in_subsequence = False
 
     def decision(self, t, alg='ucb'):
-        if alg == 'ucb':
-            return self.decision_ucb(t)
-        elif alg == 'ts':
-            return self.decision_ts(t)
+        return getattr(self, 'decision_' + alg)(t)
 
     def decision_ucb(self, t):
         ''' Choses the arm to draw at each time step t, following UCB.
@@ -28,7 +36,7 @@ class SecondaryUser:
             Output:
                 - int: the index of the arm chosen by this user.
         '''
-        if np.sum(self.draws > 0) < self.n_arms:
+        if self.n_drawn_arms < self.n_arms:
             # in this case we are still in initialization: we want all arms to
             # have been drawn at least once.
             return (t + self.offset) % self.n_arms
@@ -36,11 +44,8 @@ class SecondaryUser:
             # in this case we are in the main loop
             top_arm_to_consider = (t - self.n_arms + self.offset) %\
                 self.n_users
-            ucb_stat = np.sum(self.rewards, axis=1) / self.draws +\
-                np.sqrt(math.log(t) / self.draws)
-            arms_sorted = np.argsort(ucb_stat)
-            arms_sorted = arms_sorted[::-1]
-            return arms_sorted[top_arm_to_consider]
+            return self.ucb_ranking.top(self.arms_rew, self.draws,
+                                        t)[top_arm_to_consider]
 
     def decision_ts(self, t):
         ''' Choses the arm to draw at each time step t, following TS.
@@ -49,12 +54,50 @@ class SecondaryUser:
             Output:
                 - int: the index of the arm chosen by this user.
         '''
-        betas = np.zeros(self.n_arms)
         top_arm_to_consider = (t + self.offset) % self.n_users
-        for arm_id in range(self.n_arms):
-            betas[arm_id] = np.random.beta(
-                np.sum(self.rewards[arm_id, :]) + 1,
-                self.draws[arm_id] - np.sum(self.rewards[arm_id, :]) + 1)
-        arms_sorted = np.argsort(betas)
-        arms_sorted = arms_sorted[::-1]
-        return arms_sorted[top_arm_to_consider]
+        return thompson_choices(self.arms_rew, self.draws,
+                                top_arm_to_consider, self.n_users)
+
+    def draw_from_arm(self, arm, t):
+        ''' The user draws from the chosen arm and updates its statistics
+                Args :
+                        - arm (object) arm to draw from
+                Outputs : reward (int) the actual reward
+        '''
+        reward = arm.draw()
+        self.update(reward, t)
+        return reward
+
+    def update(self, reward, t):
+        ''' Updates the statistics of the user with the reward of its arm.
+                Args :
+                        - reward (float) the reward obtained
+                        - t (int) the time step
+        '''
+        if self.draws[self.arm_id] == 0:
+            self.n_drawn_arms += 1
+        self.draws[self.arm_id] += 1
+        self.arms_rew[self.arm_id] += reward
+        self.ucb_ranking.changed(self.arm_id)
+        if self.recorder is not None:
+            self.recorder.record(self.arm_id, t, reward)
+
+
+def decisions(users, t, alg='ucb'):
+    ''' Choses the arms of all the users at time step t. With TS the posterior
+    samples of all users x arms are drawn in one call.
+        Args:
+            - users (list[SecondaryUser]): the users.
+            - t (int): the time step.
+            - alg (str): algorithm decision. 'ucb' or 'ts'
+        Output:
+            - list[int]: the index of the arm chosen by each user.
+    '''
+    if alg == 'ts':
+        top_arms_to_consider = [(t + user.offset) % user.n_users
+                                for user in users]
+        return thompson_choices(
+            np.array([user.arms_rew for user in users]),
+            np.array([user.draws for user in users]),
+            np.array(top_arms_to_consider), users[0].n_users).tolist()
+    return [user.decision(t, alg=alg) for user in users]
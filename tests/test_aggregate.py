@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from aggregate import CurveReservoir, RegretAggregator, RunningMoments
+
+BEST_ARMS_MEAN = [0.9, 0.8]
+
+
+def replicas(n_replicas, seed=0):
+    rng = np.random.RandomState(seed)
+    return rng.randint(0, 3, (n_replicas, 50)).astype(float)
+
+
+def test_running_moments_match_numpy():
+    curves = replicas(30)
+    moments = RunningMoments(50)
+    for curve in curves[:10]:
+        moments.add(curve)
+    moments.add_batch(curves[10:])
+    assert moments.count == 30
+    np.testing.assert_allclose(moments.mean, curves.mean(0))
+    np.testing.assert_allclose(moments.variance(), curves.var(0, ddof=1))
+
+
+def test_merged_aggregators_match_a_single_one():
+    rewards = replicas(40)
+    single = RegretAggregator(BEST_ARMS_MEAN, 50)
+    single.add_batch(rewards)
+    parts = [RegretAggregator(BEST_ARMS_MEAN, 50) for _ in range(3)]
+    for i, curve in enumerate(rewards):
+        parts[i % 3].add(curve)
+    merged = RegretAggregator(BEST_ARMS_MEAN, 50)
+    for part in parts:
+        merged.merge(part)
+    assert merged.count == 40
+    regret = np.cumsum(1.7 - rewards, axis=1)
+    for aggregator in (single, merged):
+        np.testing.assert_allclose(aggregator.rewards.mean, rewards.mean(0))
+        np.testing.assert_allclose(aggregator.regret.mean, regret.mean(0))
+        np.testing.assert_allclose(aggregator.regret.variance(),
+                                   regret.var(0, ddof=1))
+    mean, lower, upper = merged.regret_curve()
+    assert np.all(lower <= mean) and np.all(mean <= upper)
+
+
+def test_merge_an_empty_aggregator():
+    aggregator = RegretAggregator(BEST_ARMS_MEAN, 50)
+    aggregator.add_batch(replicas(5))
+    mean = aggregator.regret.mean.copy()
+    aggregator.merge(RegretAggregator(BEST_ARMS_MEAN, 50))
+    np.testing.assert_array_equal(aggregator.regret.mean, mean)
+    assert aggregator.count == 5
+
+
+def test_reservoir_merge_keeps_at_most_size_curves():
+    first, second = CurveReservoir(50, 10, seed=0), \
+        CurveReservoir(50, 10, seed=1)
+    for curve in replicas(25, seed=1):
+        first.add(curve)
+    for curve in replicas(4, seed=2):
+        second.add(curve)
+    first.merge(second)
+    assert first.count == 29
+    assert first.curves.shape == (10, 50)
+
+
+def test_quantile_band():
+    aggregator = RegretAggregator(BEST_ARMS_MEAN, 50, quantile_sketch=20,
+                                  seed=0)
+    aggregator.add_batch(replicas(40))
+    lower, upper = aggregator.quantile_band()
+    assert np.all(lower <= upper)
+    with pytest.raises(ValueError):
+        RegretAggregator(BEST_ARMS_MEAN, 50).quantile_band()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from arms import (ArmBank, ArmBernoulli, ArmBeta, ArmMultinomial, ArmUniform,
+                  alias_table)
+
+
+class ScaledBernoulli(ArmBernoulli):
+    pass
+
+
+class ThreePoints(ArmMultinomial):
+    pass
+
+
+def test_subclasses_are_drawn_like_their_base():
+    bank = ArmBank([ScaledBernoulli(0.3), ArmBernoulli(0.8)])
+    assert bank.bernoulli_only
+    np.random.seed(0)
+    rewards = bank.draw(np.repeat([[0, 1]], 20000, axis=0))
+    np.testing.assert_allclose(rewards.mean(0), [0.3, 0.8], atol=0.02)
+
+
+def test_mixed_bank():
+    arms = [ArmBernoulli(0.2), ArmUniform(), ThreePoints([0, 0.5, 1],
+                                                         [0.5, 0.25, 0.25]),
+            ArmBeta(2, 6)]
+    bank = ArmBank(arms)
+    assert not bank.bernoulli_only
+    np.random.seed(0)
+    rewards = bank.draw(np.repeat([[0, 1, 2, 3]], 40000, axis=0))
+    np.testing.assert_allclose(rewards.mean(0), bank.means(), atol=0.02)
+    assert set(np.unique(rewards[:, 2])) == {0., 0.5, 1.}
+
+
+def test_unknown_arms_are_rejected():
+    class Constant:
+        p = 1.
+
+        def mean(self):
+            return 1.
+
+    with pytest.raises(ValueError):
+        ArmBank([Constant()])
+
+
+def test_alias_table():
+    probabilities = [0.1, 0.6, 0.3]
+    alias_probabilities, alias = alias_table(probabilities)
+    # probability of each point over the uniform choice of an index
+    mass = np.zeros(3)
+    for i in range(3):
+        mass[i] += alias_probabilities[i] / 3
+        mass[alias[i]] += (1 - alias_probabilities[i]) / 3
+    np.testing.assert_allclose(mass, probabilities)
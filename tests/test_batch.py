@@ -0,0 +1,47 @@
+import random
+
+import numpy as np
+import pytest
+
+from rho_rand.routines import rho_rand_batch_routine, rho_rand_routine
+from tdfs.routines import tdfs_batch_routine, tdfs_routine
+
+ARM_MEANS = [0.9, 0.8, 0.6, 0.5, 0.3, 0.1]
+N_USERS, N_ARMS, T_HORIZON, N_REPLICAS = 3, 6, 200, 100
+BEST_REWARD = sum(sorted(ARM_MEANS)[-N_USERS:])
+
+
+def final_regrets(total_rewards):
+    # total_rewards: (n_replicas, t_horizon, 1)
+    return BEST_REWARD * T_HORIZON - total_rewards.sum(axis=(1, 2))
+
+
+def assert_same_mean(first, second, n_stderr=4):
+    stderr = np.sqrt(first.var(ddof=1) / len(first) +
+                     second.var(ddof=1) / len(second))
+    assert abs(first.mean() - second.mean()) < n_stderr * stderr
+
+
+@pytest.mark.parametrize('alg', ['ucb', 'ts'])
+@pytest.mark.parametrize('batch, routine', [
+    (tdfs_batch_routine, tdfs_routine),
+    (rho_rand_batch_routine, rho_rand_routine)])
+def test_batch_matches_the_routine_in_distribution(batch, routine, alg):
+    random.seed(0)
+    np.random.seed(0)
+    batched = batch(N_REPLICAS, N_USERS, N_ARMS, T_HORIZON, ARM_MEANS,
+                    alg=alg)
+    assert batched.shape == (N_REPLICAS, T_HORIZON, 1)
+    replicas = np.array([routine(N_USERS, N_ARMS, T_HORIZON, ARM_MEANS,
+                                 alg=alg) for _ in range(N_REPLICAS)])
+    assert_same_mean(final_regrets(batched), final_regrets(replicas))
+    # the regret of the first steps, dominated by the initialization
+    assert_same_mean(batched[:, :50].sum(axis=(1, 2)),
+                     replicas[:, :50].sum(axis=(1, 2)))
+
+
+def test_batch_replicas_are_independent():
+    np.random.seed(0)
+    batched = tdfs_batch_routine(50, N_USERS, N_ARMS, T_HORIZON, ARM_MEANS)
+    totals = batched.sum(axis=(1, 2))
+    assert len(np.unique(totals)) > 10
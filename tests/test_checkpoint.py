@@ -0,0 +1,87 @@
+import random
+
+import numpy as np
+import pytest
+
+from checkpoint import Checkpoint, resize, routine_args
+from mega.routines import mega_routine
+from musical_chairs.routines import mc_routine
+from rho_rand.routines import rho_rand_routine
+from tdfs.routines import tdfs_routine
+
+ARM_MEANS = [0.9, 0.8, 0.7, 0.5, 0.3, 0.1]
+MEGA_PARAMS = {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+               'persistence_proba_init': 0.6}
+ROUTINES = {
+    'tdfs': lambda t_horizon, **kwargs: tdfs_routine(
+        3, 6, t_horizon, ARM_MEANS, **kwargs),
+    'rho_rand': lambda t_horizon, **kwargs: rho_rand_routine(
+        3, 6, t_horizon, ARM_MEANS, alg='ts', **kwargs),
+    'mega': lambda t_horizon, **kwargs: mega_routine(
+        3, MEGA_PARAMS, 6, t_horizon, ARM_MEANS, **kwargs),
+    'musical_chairs': lambda t_horizon, **kwargs: mc_routine(
+        3, {'t0': 50, 't1': 200}, 6, t_horizon, ARM_MEANS, **kwargs),
+}
+
+
+def seeded(run, *args, **kwargs):
+    random.seed(1)
+    np.random.seed(1)
+    return np.asarray(run(*args, **kwargs))
+
+
+@pytest.mark.parametrize('name', sorted(ROUTINES))
+def test_extending_the_horizon_is_bit_identical(tmp_path, name):
+    run = ROUTINES[name]
+    expected = seeded(run, 900)
+    checkpoint = Checkpoint(str(tmp_path / 'run.pkl'))
+    seeded(run, 400, checkpoint=checkpoint)
+    assert checkpoint.exists()
+    # the random states are restored from the checkpoint
+    np.testing.assert_array_equal(seeded(run, 900, checkpoint=checkpoint),
+                                  expected)
+
+
+@pytest.mark.parametrize('name', sorted(ROUTINES))
+def test_resume_after_an_interruption(tmp_path, name, monkeypatch):
+    run = ROUTINES[name]
+    expected = seeded(run, 700)
+    checkpoint = Checkpoint(str(tmp_path / 'run.pkl'), every=150)
+    saves = []
+    save = Checkpoint.save
+
+    def interrupted_save(self, state):
+        save(self, state)
+        saves.append(state['t'])
+        if len(saves) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(Checkpoint, 'save', interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        seeded(run, 700, checkpoint=checkpoint)
+    monkeypatch.setattr(Checkpoint, 'save', save)
+    np.testing.assert_array_equal(run(700, checkpoint=checkpoint), expected)
+
+
+def test_checkpoint_of_another_run(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'run.pkl'))
+    ROUTINES['tdfs'](100, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        rho_rand_routine(3, 6, 200, ARM_MEANS, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        tdfs_routine(3, 6, 200, ARM_MEANS[::-1], checkpoint=checkpoint)
+
+
+def test_due():
+    checkpoint = Checkpoint('unused', every=10)
+    assert [t for t in range(30) if checkpoint.due(t)] == [9, 19, 29]
+    assert not Checkpoint('unused').due(9)
+
+
+def test_resize():
+    array = np.arange(6).reshape(2, 3)
+    np.testing.assert_array_equal(resize(array, 5),
+                                  [[0, 1, 2, 0, 0], [3, 4, 5, 0, 0]])
+    np.testing.assert_array_equal(resize(array, 1, axis=0), [[0, 1, 2]])
+    assert routine_args(np.array([0.5]), alg='ucb') == \
+        routine_args([0.5], alg='ucb')
@@ -0,0 +1,79 @@
+import random
+import warnings
+
+import numpy as np
+import pytest
+
+import jit
+from checkpoint import Checkpoint
+from jit import JIT_BACKEND, best_arms, run_kernel, use_jit
+from musical_chairs.routines import mc_routine
+from tapes import RewardTape
+from tdfs import kernels
+from tdfs.routines import tdfs_routine
+
+ARM_MEANS = [0.9, 0.8, 0.7, 0.5, 0.4, 0.3, 0.2, 0.1]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        use_jit('cuda')
+    # the kernels only agree with the routines in distribution, the backend
+    # has to be asked for by its explicit name
+    with pytest.raises(ValueError):
+        use_jit('jit')
+
+
+@pytest.mark.skipif(jit.numba is not None, reason="numba is installed")
+def test_jit_falls_back_to_the_numpy_routine():
+    random.seed(0)
+    np.random.seed(0)
+    expected = tdfs_routine(3, 8, 200, ARM_MEANS)
+    random.seed(0)
+    np.random.seed(0)
+    with pytest.warns(RuntimeWarning):
+        total_rewards = tdfs_routine(3, 8, 200, ARM_MEANS,
+                                     backend=JIT_BACKEND)
+    np.testing.assert_array_equal(total_rewards, expected)
+
+
+@pytest.mark.parametrize('routine, args', [
+    (tdfs_routine, {'n_users': 3, 'n_arms': 8, 't_horizon': 200,
+                    'arm_means': ARM_MEANS}),
+    (mc_routine, {'n_users': 3, 'params': {'t0': 50, 't1': 100},
+                  'n_arms': 8, 't_horizon': 200, 'arm_means': ARM_MEANS}),
+])
+@pytest.mark.parametrize('unsupported', ['checkpoint', 'tape'])
+def test_unsupported_runs_fall_back_to_the_numpy_routine(
+        tmp_path, routine, args, unsupported):
+    def run(name, **kwargs):
+        if unsupported == 'checkpoint':
+            kwargs['checkpoint'] = Checkpoint(str(tmp_path / name))
+        else:
+            kwargs['tape'] = RewardTape(ARM_MEANS, seed=1)
+        random.seed(0)
+        np.random.seed(0)
+        return routine(**args, **kwargs)
+
+    expected = run('numpy.pkl')
+    with pytest.warns(RuntimeWarning, match=unsupported):
+        total_rewards = run('jit.pkl', backend=JIT_BACKEND)
+    np.testing.assert_array_equal(total_rewards, expected)
+
+
+def test_kernel_is_fixed_by_the_seed():
+    args = (kernels.tdfs_kernel, np.asarray(ARM_MEANS), 3, 200,
+            kernels.ALGS['ucb'])
+    np.random.seed(0)
+    first = run_kernel(*args)[0]
+    after_first = np.random.random()
+    np.random.seed(0)
+    np.testing.assert_array_equal(run_kernel(*args)[0], first)
+    assert np.random.random() == after_first
+
+
+def test_best_arms():
+    stats = np.array([0.2, 0.9, 0.5, 0.9, 0.1])
+    out = np.zeros(5, dtype=np.int64)
+    best_arms(stats, 3, out, np.zeros(5, dtype=np.bool_))
+    np.testing.assert_array_equal(out[:3], [1, 3, 2])
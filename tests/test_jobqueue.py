@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import pytest
+
+import jobqueue
+from aggregate import RegretAggregator
+from jobqueue import JobQueue, pack_result, unpack_result, work
+from montecarlo import final_regret, run_replicas
+from tdfs.routines import tdfs_routine
+
+SCENARIO = {
+    'name': '2 users 4 arms', 'n_users': 2, 'n_arms': 4, 't_horizon': 100,
+    'arm_means': [0.2, 0.5, 0.75, 0.9], 'mc_horizon': 5,
+    'mega_params': {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+                    'persistence_proba_init': 0.6},
+    'mc_params': {'t0': 20, 't1': 60},
+}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'queue.db'), lease=60.)
+
+
+def test_submit_splits_in_units(queue):
+    assert queue.submit('exp', [SCENARIO], ['tdfs ucb', 'mega ts'],
+                        unit_size=2) == 6
+    progress = queue.progress('exp')
+    assert progress['pending'] == dict(units=6, replicas=10)
+    assert queue.progress('other')['pending']['units'] == 0
+    with pytest.raises(ValueError):
+        queue.submit('exp', [SCENARIO], ['tdfs kl'])
+    with pytest.raises(ValueError):
+        queue.submit('exp', [SCENARIO], ['tdfs ucb'], grid={'beta': [1]})
+
+
+def test_results_match_run_replicas(queue):
+    queue.submit('exp', [SCENARIO], ['tdfs ucb'], seed=3, unit_size=2)
+    assert work(queue, 'worker', exit_when_empty=True) == 3
+    entry, = queue.results('exp')
+    assert entry['missing'] == 0
+    routine_args = {name: SCENARIO[name] for name in
+                    ('n_users', 'n_arms', 't_horizon', 'arm_means')}
+    rewards = run_replicas(tdfs_routine, dict(routine_args, alg='ucb'), 5,
+                           seed=3, n_workers=1)
+    assert entry['final_regrets'] == {
+        replica: final_regret(rewards[replica], routine_args)
+        for replica in range(5)}
+    np.testing.assert_allclose(entry['aggregator'].rewards.mean,
+                               rewards.mean(0))
+    row, = jobqueue.summary(queue, 'exp')
+    assert row['n_replicas'] == 5
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'), lease=0.05,
+                     max_attempts=2)
+    queue.submit('exp', [SCENARIO], ['tdfs ucb'], n_replicas=1)
+    unit = queue.claim('lost')
+    assert queue.claim('other') is None
+    assert queue.progress()['workers'] == ['lost']
+    time.sleep(0.1)
+    assert queue.claim('other')['id'] == unit['id']
+    # the lost worker no longer holds the unit
+    assert not queue.renew(unit['id'], 'lost')
+    assert queue.renew(unit['id'], 'other')
+    time.sleep(0.1)
+    # the unit expired after its last attempt
+    assert queue.claim('third') is None
+    assert queue.progress()['failed']['units'] == 1
+    assert queue.errors()[0][2] == 'lease expired'
+
+
+def test_failed_units_are_retried(queue, monkeypatch):
+    def broken_unit(unit):
+        raise RuntimeError("broken")
+
+    queue.max_attempts = 2
+    queue.submit('exp', [SCENARIO], ['tdfs ucb'], n_replicas=1)
+    monkeypatch.setattr(jobqueue, 'run_unit', broken_unit)
+    assert work(queue, 'worker', exit_when_empty=True) == 2
+    progress = queue.progress()
+    assert progress['failed']['units'] == 1
+    assert progress['pending']['units'] == 0
+    unit_id, status, error = queue.errors()[0]
+    assert status == 'failed' and 'RuntimeError: broken' in error
+    assert queue.results('exp')[0]['missing'] == 1
+    monkeypatch.undo()
+    assert queue.retry_failed('exp') == 1
+    assert work(queue, 'worker', exit_when_empty=True) == 1
+    assert queue.progress()['done']['units'] == 1
+    assert queue.errors() == []
+
+
+def test_a_done_unit_keeps_its_first_result(queue):
+    queue.submit('exp', [SCENARIO], ['tdfs ucb'], n_replicas=1)
+    unit = queue.claim('worker')
+    aggregator = RegretAggregator([0.9, 0.75], 100)
+    aggregator.add(np.ones(100))
+    queue.complete(unit['id'], 'worker', pack_result(aggregator, [1.]))
+    queue.complete(unit['id'], 'late', pack_result(aggregator, [2.]))
+    assert queue.results('exp')[0]['final_regrets'] == {0: 1.}
+
+
+def test_pack_result_round_trip():
+    aggregator = RegretAggregator([0.9, 0.75], 20)
+    for seed in range(3):
+        aggregator.add(np.random.RandomState(seed).randint(0, 2, 20))
+    unpacked, final_regrets = unpack_result(pack_result(aggregator,
+                                                        [1., 2., 3.]))
+    assert unpacked.count == 3
+    np.testing.assert_array_equal(unpacked.regret.m2, aggregator.regret.m2)
+    np.testing.assert_array_equal(final_regrets, [1., 2., 3.])
@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+from mega.routines import mega_routine
+from montecarlo import (confidence_width, replica_rewards, run_replicas,
+                        stream_replicas)
+from musical_chairs.routines import mc_routine
+from profiling import Profile, with_profile, without_profile
+from rho_rand.routines import rho_rand_routine
+from tdfs.routines import tdfs_routine
+
+ARM_MEANS = [0.9, 0.8, 0.7, 0.5, 0.4, 0.3, 0.2, 0.1]
+MEGA_PARAMS = {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+               'persistence_proba_init': 0.6}
+ROUTINES = [
+    (tdfs_routine, dict(n_users=3, n_arms=8, t_horizon=120,
+                        arm_means=ARM_MEANS)),
+    (rho_rand_routine, dict(n_users=3, n_arms=8, t_horizon=120,
+                            arm_means=ARM_MEANS)),
+    (mega_routine, dict(n_users=3, params=MEGA_PARAMS, n_arms=8,
+                        t_horizon=120, arm_means=ARM_MEANS)),
+    (mc_routine, dict(n_users=3, params={'t0': 20, 't1': 60}, n_arms=8,
+                      t_horizon=120, arm_means=ARM_MEANS)),
+]
+
+
+@pytest.mark.parametrize('routine, routine_args', ROUTINES)
+def test_replica_rewards_ignores_the_profile(routine, routine_args):
+    random.seed(0)
+    np.random.seed(0)
+    expected = replica_rewards(routine(**routine_args))
+    random.seed(0)
+    np.random.seed(0)
+    output = routine(profile=True, **routine_args)
+    assert isinstance(output[1], Profile)
+    assert expected.shape == (120,)
+    np.testing.assert_array_equal(replica_rewards(output), expected)
+
+
+def test_with_profile_pairs_the_output():
+    profile = Profile()
+    profile.start()
+    output = (np.zeros((2, 3)), np.ones((2, 3)))
+    assert with_profile(output, profile)[0] is output
+    assert without_profile(with_profile(output, profile)) is output
+    assert without_profile(output) is output
+
+
+@pytest.mark.parametrize('routine, routine_args', ROUTINES[::2])
+def test_replicas_do_not_depend_on_the_workers(routine, routine_args):
+    one = run_replicas(routine, routine_args, 4, seed=7, n_workers=1)
+    two = run_replicas(routine, routine_args, 4, seed=7, n_workers=2)
+    np.testing.assert_array_equal(one, two)
+    streamed = dict(stream_replicas(routine, routine_args, 4, seed=7,
+                                    n_workers=1))
+    np.testing.assert_array_equal(np.array([streamed[r] for r in range(4)]),
+                                  one)
+
+
+def test_confidence_width():
+    assert confidence_width([1.]) == float('inf')
+    assert confidence_width([1., 1., 1.]) == 0
+    assert confidence_width([0., 2.], level=0.9) > 0
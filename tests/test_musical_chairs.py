@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+import pytest
+
+from montecarlo import replica_rewards, run_replicas
+from musical_chairs.routines import mc_routine, mc_vectorized_routine
+
+ARM_MEANS = [0.9, 0.8, 0.6, 0.5, 0.3, 0.1]
+PARAMS = {'t0': 30, 't1': 150}
+N_USERS, N_ARMS, T_HORIZON, N_REPLICAS = 3, 6, 400, 120
+
+
+def assert_same_mean(first, second, n_stderr=4):
+    stderr = np.sqrt(first.var(ddof=1) / len(first) +
+                     second.var(ddof=1) / len(second))
+    assert abs(first.mean() - second.mean()) < n_stderr * stderr
+
+
+@pytest.fixture(scope='module')
+def replicas():
+    random.seed(0)
+    np.random.seed(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.array([
+            mc_routine(N_USERS, PARAMS, N_ARMS, T_HORIZON, ARM_MEANS)[:, 0]
+            for _ in range(N_REPLICAS)])
+
+
+def test_vectorized_matches_the_routine_in_distribution(replicas):
+    np.random.seed(1)
+    vectorized = np.array([
+        mc_vectorized_routine(N_USERS, PARAMS, N_ARMS, T_HORIZON,
+                              ARM_MEANS)[:, 0] for _ in range(N_REPLICAS)])
+    assert_same_mean(vectorized.sum(1), replicas.sum(1))
+    # exploration, then the settled part of an epoch, fast-forwarded
+    for start, stop in [(0, PARAMS['t0']), (PARAMS['t0'], PARAMS['t1']),
+                        (PARAMS['t1'] + PARAMS['t0'], 2 * PARAMS['t1'])]:
+        assert_same_mean(vectorized[:, start:stop].sum(1),
+                         replicas[:, start:stop].sum(1))
+
+
+def test_aggregated_sum_matches_the_routine_in_distribution(replicas):
+    np.random.seed(2)
+    sums = np.array([
+        mc_vectorized_routine(N_USERS, PARAMS, N_ARMS, T_HORIZON, ARM_MEANS,
+                              aggregate=True) for _ in range(N_REPLICAS)])
+    assert_same_mean(sums, replicas.sum(1))
+
+
+def test_aggregated_sum_is_rejected_by_the_replicas():
+    routine_args = dict(n_users=N_USERS, params=PARAMS, n_arms=N_ARMS,
+                        t_horizon=T_HORIZON, arm_means=ARM_MEANS,
+                        aggregate=True)
+    with pytest.raises(ValueError, match='aggregate'):
+        run_replicas(mc_vectorized_routine, routine_args, 2, n_workers=1)
+    with pytest.raises(ValueError):
+        replica_rewards(12.)
+
+
+def test_horizon_shorter_than_an_epoch():
+    with pytest.raises(ValueError):
+        mc_vectorized_routine(N_USERS, PARAMS, N_ARMS, 100, ARM_MEANS)
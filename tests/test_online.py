@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+import registry
+from bench.latency import make_policy
+from mega.policies import COLLIDED, PERSISTENCE, MEGAPolicy
+from rho_rand.policies import RhoRandPolicy
+from tdfs.policies import TDFSPolicy
+
+MEGA_PARAMS = {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+               'persistence_proba_init': 0.6}
+POLICY_VARIANTS = [(name, alg) for _, name, alg in registry.variants()
+                   if 'policy' in registry.ALGORITHMS[name]]
+
+
+def play(policy, n_steps, seed):
+    rng = np.random.RandomState(seed)
+    arms = []
+    for _ in range(n_steps):
+        arm = policy.select()
+        arms.append(arm)
+        policy.update(float(rng.random_sample() < 0.5),
+                      bool(rng.random_sample() < 0.2))
+    return arms
+
+
+@pytest.mark.parametrize('name, alg', POLICY_VARIANTS)
+def test_restore_replays_the_same_decisions(name, alg):
+    np.random.seed(0)
+    policy = make_policy(name, alg, 5, 3, MEGA_PARAMS)
+    play(policy, 50, seed=1)
+    snapshot = policy.snapshot()
+    random_state = np.random.get_state()
+    arms = play(policy, 50, seed=2)
+    state = policy.snapshot()
+    policy.restore(snapshot)
+    np.random.set_state(random_state)
+    assert play(policy, 50, seed=2) == arms
+    np.testing.assert_array_equal(policy.state, state)
+
+
+@pytest.mark.parametrize('name, alg', POLICY_VARIANTS)
+def test_decisions_are_valid_arms(name, alg):
+    np.random.seed(0)
+    policy = make_policy(name, alg, 5, 3, MEGA_PARAMS)
+    arms = play(policy, 200, seed=0)
+    assert all(-1 <= arm < 5 for arm in arms)
+    assert policy.state.shape == (policy.n_scalars +
+                                  policy.n_arm_stats * 5,)
+
+
+@pytest.mark.parametrize('policy', [TDFSPolicy, RhoRandPolicy])
+def test_more_users_than_arms(policy):
+    with pytest.raises(ValueError):
+        policy(2, 3)
+
+
+def test_unknown_alg():
+    with pytest.raises(ValueError):
+        MEGAPolicy(3, MEGA_PARAMS, alg='kl')
+
+
+def test_mega_persistence_rises_after_a_collision():
+    # a single arm, so that the decisions never reset the persistence
+    np.random.seed(0)
+    policy = MEGAPolicy(1, MEGA_PARAMS)
+    assert policy.select() == 0
+    policy.update(1., True)
+    assert policy.scalars[COLLIDED] == 1
+    # the first draw of seed 0 is 0.55, below this persistence
+    policy.scalars[PERSISTENCE] = 0.9
+    np.random.seed(0)
+    assert policy.select() == 0
+    assert policy.scalars[PERSISTENCE] == 0.9
+    persistence = [policy.scalars[PERSISTENCE]]
+    for _ in range(3):
+        policy.update(1., False)
+        assert policy.scalars[COLLIDED] == 0
+        assert policy.select() == 0
+        persistence.append(policy.scalars[PERSISTENCE])
+    assert np.all(np.diff(persistence) > 0)
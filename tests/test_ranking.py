@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+
+from ranking import UCBRanking, ranked_choice, top_m
+
+
+def reference(stats, m):
+    # the full sort of the original decisions
+    return np.argsort(stats, axis=-1, kind='stable')[..., ::-1][..., :m]
+
+
+@pytest.mark.parametrize('n_arms', [5, 63, 64, 500])
+@pytest.mark.parametrize('m', [1, 3, 5])
+def test_top_m_matches_argsort_on_ties(n_arms, m):
+    rng = np.random.RandomState(n_arms)
+    # few distinct values, so that most arms are tied
+    stats = rng.randint(0, 4, (20, n_arms)) / 4
+    np.testing.assert_array_equal(top_m(stats, m), reference(stats, m))
+    for row in stats:
+        np.testing.assert_array_equal(top_m(row, m), reference(row, m))
+
+
+@pytest.mark.parametrize('n_arms', [8, 200])
+def test_top_m_distinct_and_nan(n_arms):
+    rng = np.random.RandomState(0)
+    stats = rng.random_sample((10, n_arms))
+    np.testing.assert_array_equal(top_m(stats, 4), reference(stats, 4))
+    stats[:, [1, 5]] = np.nan
+    np.testing.assert_array_equal(top_m(stats, 4), reference(stats, 4))
+    assert top_m(stats[0], 2).tolist() == [5, 1]
+
+
+def test_ranked_choice():
+    stats = np.array([[0.2, 0.9, 0.9, 0.1], [0.5, 0.5, 0.5, 0.5]])
+    assert ranked_choice(stats[0], 1, 3) == 1
+    np.testing.assert_array_equal(ranked_choice(stats, [0, 2], 3), [2, 1])
+
+
+def play(ranking, means, draws, arms_rew, rng, n_steps=3000):
+    for t in range(100, 100 + n_steps):
+        best = ranking.top(arms_rew, draws, t)
+        stats = arms_rew / draws + np.sqrt(math.log(t) / draws)
+        np.testing.assert_array_equal(best, reference(stats, 3))
+        arm = best[t % len(best)]
+        draws[arm] += 1
+        arms_rew[arm] += rng.random_sample() < means[arm]
+        ranking.changed(arm)
+
+
+@pytest.mark.parametrize('n_arms', [4, 50, 2000])
+def test_ucb_ranking_is_exact_on_ties(n_arms):
+    rng = np.random.RandomState(n_arms)
+    means = np.round(rng.random_sample(n_arms), 1)
+    draws = rng.randint(1, 30, n_arms).astype(float)
+    play(UCBRanking(n_arms, 3), means, draws, np.round(draws * means), rng)
+
+
+def test_ucb_ranking_rarely_ranks_every_arm():
+    rng = np.random.RandomState(0)
+    means = rng.random_sample(2000)
+    draws = rng.randint(1, 30, 2000).astype(float)
+    ranking = UCBRanking(2000, 3)
+    play(ranking, means, draws, draws * means, rng)
+    assert ranking.n_rebuilds < 300
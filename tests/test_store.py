@@ -0,0 +1,96 @@
+import random
+
+import numpy as np
+import pytest
+
+from mega.routines import mega_routine, mega_stream
+from musical_chairs.routines import mc_stream
+from rho_rand.routines import rho_rand_stream
+from store import RunWriter, StoredRun, compact_dtype, save_run
+from tdfs.routines import tdfs_stream
+
+ARM_MEANS = [0.9, 0.8, 0.7, 0.5, 0.4, 0.3, 0.2, 0.1]
+MEGA_PARAMS = {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+               'persistence_proba_init': 0.6}
+MC_PARAMS = {'t0': 50, 't1': 200}
+N_USERS, T_HORIZON = 3, 501
+
+STREAMS = {
+    'tdfs': (lambda: tdfs_stream(N_USERS, 8, ARM_MEANS, T_HORIZON,
+                                 chunk_size=37), 1),
+    'rho_rand': (lambda: rho_rand_stream(N_USERS, 8, ARM_MEANS, T_HORIZON,
+                                         chunk_size=37), 1),
+    'mega': (lambda: mega_stream(N_USERS, MEGA_PARAMS, 8, ARM_MEANS,
+                                 T_HORIZON, alg='ts', chunk_size=37),
+             N_USERS),
+    'musical_chairs': (lambda: mc_stream(N_USERS, MC_PARAMS, 8, ARM_MEANS,
+                                         T_HORIZON, chunk_size=37), 1),
+}
+
+
+@pytest.mark.parametrize('name', sorted(STREAMS))
+def test_stream_round_trip(tmp_path, name):
+    stream, reward_rows = STREAMS[name]
+    random.seed(0)
+    np.random.seed(0)
+    chunks = list(stream())
+    rewards = np.concatenate([chunk[1] for chunk in chunks], axis=1)
+    collisions = np.concatenate([chunk[2] for chunk in chunks], axis=1)
+    path = str(tmp_path / 'run')
+    with RunWriter(path, N_USERS, T_HORIZON, reward_dtype='uint8',
+                   reward_rows=reward_rows,
+                   metadata={'routine': name}) as writer:
+        for t_start, chunk_rewards, chunk_collisions in chunks:
+            writer.write(t_start, chunk_rewards, chunk_collisions)
+    run = StoredRun(path)
+    assert run.metadata == {'routine': name}
+    assert run.t_horizon == T_HORIZON
+    np.testing.assert_array_equal(np.asarray(run.rewards), rewards)
+    np.testing.assert_array_equal(np.asarray(run.collisions), collisions)
+    np.testing.assert_array_equal(run.total_rewards(chunk_size=100),
+                                  rewards.sum(0))
+
+
+def test_partial_run_can_be_read(tmp_path):
+    path = str(tmp_path / 'run')
+    rewards = np.random.RandomState(0).randint(0, 2, (2, 100))
+    with RunWriter(path, 2, 100, collisions=False) as writer:
+        writer.write(0, rewards[:, :43])
+        writer.flush()
+        run = StoredRun(path)
+        assert run.t_horizon == 43
+        np.testing.assert_array_equal(run.rewards[:, :], rewards[:, :43])
+        writer.write(43, rewards[:, 43:])
+    np.testing.assert_array_equal(np.asarray(StoredRun(path).rewards),
+                                  rewards)
+
+
+def test_save_run_slices(tmp_path):
+    random.seed(1)
+    np.random.seed(1)
+    rewards, collisions = mega_routine(5, MEGA_PARAMS, 8, 237, ARM_MEANS)
+    run = save_run(str(tmp_path / 'run'), rewards, collisions)
+    for key in [(2, slice(5, 77)), (slice(None), slice(3, 200, 7)),
+                (slice(1, 3), slice(None, None, -3)), ([0, 4], 100),
+                (3, -1)]:
+        np.testing.assert_array_equal(run.rewards[key], rewards[key])
+        np.testing.assert_array_equal(run.collisions[key], collisions[key])
+
+
+def test_compact_dtype():
+    assert compact_dtype([0, 1, 1]) == 'bit'
+    assert compact_dtype([0, 2, 3]) == 'uint8'
+    assert compact_dtype([-1, 300]) == 'int16'
+    assert compact_dtype([0.5]) == 'float32'
+
+
+def test_write_checks_the_chunks(tmp_path):
+    with RunWriter(str(tmp_path / 'run'), 3, 10, reward_rows=1) as writer:
+        with pytest.raises(ValueError):
+            # time-major chunk
+            writer.write(0, np.zeros((10, 1)), np.zeros((3, 10)))
+        with pytest.raises(ValueError):
+            writer.write(5, np.zeros((1, 5)), np.zeros((3, 5)))
+        writer.write(0, np.zeros((1, 10)), np.zeros((3, 10)))
+        with pytest.raises(ValueError):
+            writer.write(10, np.zeros((1, 1)), np.zeros((3, 1)))
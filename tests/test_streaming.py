@@ -0,0 +1,81 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from mega.routines import mega_routine, mega_stream
+from musical_chairs.routines import mc_routine, mc_stream
+from rho_rand.routines import rho_rand_routine, rho_rand_stream
+from streaming import chunked
+from tdfs.routines import tdfs_routine, tdfs_stream
+
+ARM_MEANS = [0.9, 0.8, 0.7, 0.5, 0.4, 0.3, 0.2, 0.1]
+MEGA_PARAMS = {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+               'persistence_proba_init': 0.6}
+MC_PARAMS = {'t0': 50, 't1': 200}
+T_HORIZON = 345
+
+
+def seeded(function, *args, **kwargs):
+    random.seed(3)
+    np.random.seed(3)
+    return function(*args, **kwargs)
+
+
+def concatenate(chunks):
+    chunks = list(chunks)
+    t_starts = [t_start for t_start, _, _ in chunks]
+    assert t_starts == list(range(0, T_HORIZON, 100))
+    for _, rewards, collisions in chunks:
+        assert rewards.shape[1] == collisions.shape[1]
+    return (np.concatenate([rewards for _, rewards, _ in chunks], axis=1),
+            np.concatenate([collisions for _, _, collisions in chunks],
+                           axis=1))
+
+
+@pytest.mark.parametrize('alg', ['ucb', 'ts'])
+@pytest.mark.parametrize('routine, stream', [
+    (tdfs_routine, tdfs_stream), (rho_rand_routine, rho_rand_stream)])
+def test_stream_matches_routine(routine, stream, alg):
+    total_rewards = seeded(routine, 3, 8, T_HORIZON, ARM_MEANS, alg=alg)
+    rewards, collisions = concatenate(seeded(
+        stream, 3, 8, ARM_MEANS, T_HORIZON, alg=alg, chunk_size=100))
+    np.testing.assert_array_equal(rewards, total_rewards.T)
+    assert collisions.shape == (3, T_HORIZON)
+
+
+@pytest.mark.parametrize('alg', ['eps', 'ucb', 'ts'])
+def test_mega_stream_matches_routine(alg):
+    expected = seeded(mega_routine, 3, MEGA_PARAMS, 8, T_HORIZON, ARM_MEANS,
+                      alg=alg)
+    rewards, collisions = concatenate(seeded(
+        mega_stream, 3, MEGA_PARAMS, 8, ARM_MEANS, T_HORIZON, alg=alg,
+        chunk_size=100))
+    np.testing.assert_array_equal(rewards, expected[0])
+    np.testing.assert_array_equal(collisions, expected[1])
+
+
+def test_mc_stream_matches_routine():
+    total_rewards = seeded(mc_routine, 3, MC_PARAMS, 8, T_HORIZON, ARM_MEANS)
+    rewards, collisions = concatenate(seeded(
+        mc_stream, 3, MC_PARAMS, 8, ARM_MEANS, T_HORIZON, chunk_size=100))
+    np.testing.assert_array_equal(rewards, total_rewards.T)
+    assert collisions.shape == (3, T_HORIZON)
+
+
+def test_endless_stream():
+    chunks = tdfs_stream(3, 8, ARM_MEANS, chunk_size=50)
+    shapes = [rewards.shape for _, rewards, _ in itertools.islice(chunks, 3)]
+    chunks.close()
+    assert shapes == [(1, 50)] * 3
+
+
+def test_chunked_layout():
+    steps = (([t], [t % 2, 1 - t % 2]) for t in range(5))
+    chunks = list(chunked(steps, 2))
+    assert [t_start for t_start, _, _ in chunks] == [0, 2, 4]
+    np.testing.assert_array_equal(chunks[1][1], [[2, 3]])
+    np.testing.assert_array_equal(chunks[1][2], [[0, 1], [1, 0]])
+    with pytest.raises(ValueError):
+        list(chunked(steps, 0))
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+
+import registry
+import sweep
+from sweep import ResultCache, expand_grid, routine_arguments
+from tdfs.routines import tdfs_routine
+
+SCENARIO = dict(n_users=2, n_arms=4, t_horizon=60,
+                arm_means=[0.9, 0.6, 0.4, 0.1])
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.get('a') is None
+    cache.put('a', np.arange(10.))
+    assert 'a' in cache
+    np.testing.assert_array_equal(cache.get('a'), np.arange(10.))
+    size = cache.size()
+    cache.put('a', np.arange(10.))
+    assert cache.size() == size
+    assert ResultCache(str(tmp_path)).size() == size
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    result = np.zeros(100)
+    cache = ResultCache(str(tmp_path))
+    cache.put('probe', result)
+    entry = cache.size()
+    cache = ResultCache(str(tmp_path / 'lru'), max_bytes=4 * entry)
+    for i, key in enumerate('abcd'):
+        cache.put(key, result)
+        os.utime(cache._path(key), (i, i))
+    cache.get('a')
+    cache.put('e', result)
+    # down to 90% of max_bytes, i.e. 3 results
+    assert [key in cache for key in 'abcde'] == \
+        [True, False, False, True, True]
+    assert cache.size() == 3 * entry
+
+
+def test_put_does_not_scan_the_directory(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path), max_bytes=2 ** 20)
+    cache.put('first', np.zeros(10))
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(sweep.os, 'listdir',
+                        lambda path: scans.append(path) or listdir(path))
+    for i in range(50):
+        cache.put(str(i), np.zeros(10))
+    assert scans == []
+
+
+def test_sweep_uses_the_cache(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    grid = {'alg': ['ucb', 'ts']}
+    first = sweep.sweep(tdfs_routine, SCENARIO, grid, [0, 1], cache)
+    assert len(os.listdir(str(tmp_path))) == 4
+    second = sweep.sweep(tdfs_routine, SCENARIO, grid, [0, 1], cache)
+    for (point, rewards), (same_point, same) in zip(first, second):
+        assert point == same_point
+        np.testing.assert_array_equal(rewards, same)
+
+
+def test_routine_arguments():
+    assert expand_grid({'b': [1, 2], 'a': [0]}) == [
+        {'a': 0, 'b': 1}, {'a': 0, 'b': 2}]
+    assert routine_arguments(tdfs_routine, SCENARIO, {'alg': 'ts'}) == \
+        dict(SCENARIO, alg='ts')
+    with pytest.raises(ValueError):
+        routine_arguments(tdfs_routine, SCENARIO, {'beta': 0.5})
+
+
+def test_sweep_a_registry_routine(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    routine = registry.get('tdfs', 'ucb')
+    key = sweep.cell_key(routine, SCENARIO, 0)
+    assert key == sweep.cell_key(tdfs_routine, dict(SCENARIO, alg='ucb'), 0)
+    assert key != sweep.cell_key(registry.get('tdfs', 'ts'), SCENARIO, 0)
+    # the alg of the grid overrides the bound one
+    assert sweep.cell_key(routine, dict(SCENARIO, alg='ts'), 0) == \
+        sweep.cell_key(registry.get('tdfs', 'ts'), SCENARIO, 0)
+    (point, rewards), = sweep.sweep(routine, SCENARIO, {}, [0, 1], cache)
+    assert rewards.shape == (2, 60)
+    (_, cached), = sweep.sweep(tdfs_routine, SCENARIO, {'alg': ['ucb']},
+                               [0, 1], cache)
+    np.testing.assert_array_equal(cached, rewards)
+    with pytest.raises(ValueError, match='tdfs_routine'):
+        routine_arguments(routine, SCENARIO, {'beta': 0.5})
@@ -0,0 +1,116 @@
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+from checkpoint import Checkpoint
+from mega.routines import mega_routine
+from montecarlo import run_replicas, variance_reduction
+from tapes import RewardTape, tape_arms
+from tdfs.routines import tdfs_routine
+
+ARM_MEANS = [0.9, 0.8, 0.7, 0.5, 0.3, 0.1]
+MEGA_PARAMS = {'c': 0.1, 'd': 0.05, 'alpha': 0.5, 'beta': 0.8,
+               'persistence_proba_init': 0.6}
+
+
+def test_arms_read_the_pulls_in_order():
+    tape = RewardTape(ARM_MEANS, 3, block_size=100)
+    expected = tape.rewards(2, 0, 250)
+    arm = tape.arms()[2]
+    np.testing.assert_array_equal([arm.draw() for _ in range(250)], expected)
+    assert arm.pulls == 250
+    assert tape.reward(2, 137) == expected[137]
+    # every run starts from the first pull
+    assert tape.arms()[2].draw() == expected[0]
+
+
+def test_tapes_are_keyed_by_their_seed():
+    tape = RewardTape(ARM_MEANS, 3, block_size=100)
+    same = RewardTape(ARM_MEANS, 3, block_size=100)
+    other = RewardTape(ARM_MEANS, 4, block_size=100)
+    np.testing.assert_array_equal(tape.rewards(0, 50, 350),
+                                  same.rewards(0, 50, 350))
+    assert not np.array_equal(tape.rewards(0, 0, 300),
+                              other.rewards(0, 0, 300))
+    # the arms do not share their uniforms
+    assert not np.array_equal(tape.rewards(0, 0, 300) < 0.5,
+                              tape.rewards(1, 0, 300) < 0.5)
+
+
+def test_tape_means():
+    tape = RewardTape(ARM_MEANS, 0)
+    means = [tape.rewards(k, 0, 20000).mean() for k in range(6)]
+    np.testing.assert_allclose(means, ARM_MEANS, atol=0.02)
+    with pytest.raises(ValueError):
+        RewardTape([1.5])
+
+
+def test_pickled_arm_goes_on_from_its_pulls():
+    arm = RewardTape(ARM_MEANS, 3, block_size=64).arms()[0]
+    for _ in range(100):
+        arm.draw()
+    copy = pickle.loads(pickle.dumps(arm))
+    assert [copy.draw() for _ in range(100)] == \
+        [arm.draw() for _ in range(100)]
+
+
+def test_tape_arms_checks_the_run():
+    tape = RewardTape(ARM_MEANS, 3)
+    with pytest.raises(ValueError):
+        tape_arms(tape, [0.1] * 6, 6)
+    with pytest.raises(ValueError):
+        tape_arms(tape, ARM_MEANS, 6, RewardTape(ARM_MEANS, 4).arms())
+
+
+@pytest.mark.parametrize('routine, args', [
+    (tdfs_routine, (3, 6)), (mega_routine, (3, MEGA_PARAMS, 6))])
+def test_resume_on_a_tape(tmp_path, routine, args):
+    random.seed(1)
+    np.random.seed(1)
+    expected = routine(*args, 900, ARM_MEANS, tape=RewardTape(ARM_MEANS, 7))
+    checkpoint = Checkpoint(str(tmp_path / 'run.pkl'), every=200)
+    random.seed(1)
+    np.random.seed(1)
+    routine(*args, 500, ARM_MEANS, tape=RewardTape(ARM_MEANS, 7),
+            checkpoint=checkpoint)
+    resumed = routine(*args, 900, ARM_MEANS, tape=RewardTape(ARM_MEANS, 7),
+                      checkpoint=checkpoint)
+    np.testing.assert_array_equal(np.asarray(resumed),
+                                  np.asarray(expected))
+    with pytest.raises(ValueError):
+        routine(*args, 1000, ARM_MEANS, tape=RewardTape(ARM_MEANS, 8),
+                checkpoint=checkpoint)
+
+
+def test_common_random_numbers_do_not_depend_on_the_workers():
+    routine_args = dict(n_users=3, n_arms=6, t_horizon=200,
+                        arm_means=ARM_MEANS)
+    one = run_replicas(tdfs_routine, routine_args, 3, seed=2, n_workers=1,
+                       common_random_numbers=True)
+    two = run_replicas(tdfs_routine, routine_args, 3, seed=2, n_workers=2,
+                       common_random_numbers=True)
+    np.testing.assert_array_equal(one, two)
+
+
+def test_common_random_numbers_reduce_the_variance_of_a_gap():
+    # two close variants of mega: with shared rewards and decisions their
+    # gap varies much less than between independent replicas
+    arm_means = [0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2]
+
+    def final_regrets(c, seed, common_random_numbers):
+        routine_args = dict(n_users=3, n_arms=8, t_horizon=1000,
+                            arm_means=arm_means, alg='eps',
+                            params=dict(MEGA_PARAMS, c=c))
+        rewards = run_replicas(
+            mega_routine, routine_args, 20, seed=seed, n_workers=1,
+            common_random_numbers=common_random_numbers)
+        return np.sum(np.sort(arm_means)[-3:].sum() - rewards, axis=1)
+
+    paired = variance_reduction(final_regrets(0.1, 0, True),
+                                final_regrets(0.08, 0, True))
+    unpaired = variance_reduction(final_regrets(0.1, 0, False),
+                                  final_regrets(0.08, 100, False))
+    assert paired > 0.4
+    assert paired > unpaired + 0.3
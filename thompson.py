@@ -0,0 +1,38 @@
+import numpy as np
+
+from ranking import ranked_choice
+
+
+def posterior_samples(successes, draws):
+    '''Draws one sample of the Beta posterior of every Bernoulli arm, with a
+    uniform prior.
+        Args:
+            - successes (ndarray): (..., n_arms) the sum of the rewards
+            - draws (ndarray): (..., n_arms) the number of draws
+        Output:
+            - ndarray: (..., n_arms) the posterior samples
+    '''
+    return np.random.beta(successes + 1, draws - successes + 1)
+
+
+def thompson_choices(successes, draws, ranks=None, m=1, available=None):
+    '''Thompson sampling decisions of many users at once: the posterior
+    samples of all users x arms are drawn in a single call.
+        Args:
+            - successes (ndarray): (..., n_users, n_arms) the sum of the
+            rewards of every user on every arm
+            - draws (ndarray): (..., n_users, n_arms) the number of draws
+            - ranks (ndarray): (..., n_users) the rank of the arm each user
+            picks among its m best samples, the best one if None
+            - m (int): the number of arms ranked when ranks are given
+            - available (ndarray): (..., n_users, n_arms) mask of the arms a
+            user can choose, the samples of the others are zeroed
+        Output:
+            - ndarray: (..., n_users) the arm chosen by each user
+    '''
+    samples = posterior_samples(successes, draws)
+    if available is not None:
+        samples = available * samples
+    if ranks is None:
+        return np.argmax(samples, axis=-1)
+    return ranked_choice(samples, ranks, m)